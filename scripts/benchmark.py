@@ -0,0 +1,202 @@
+"""
+转换流程的吞吐量测试
+
+每个测试项在独立子进程中运行, 互不影响峰值内存, 输出 blocks/s, MB/s 与峰值 RSS, 结果写入 JSON 文件,
+可在不同提交之间对比:
+
+    python scripts/make_synthetic_corpus.py -o /tmp/corpus
+    python scripts/benchmark.py --corpus /tmp/corpus -o bench.json
+    python scripts/benchmark.py --corpus /tmp/corpus -o bench.json --only batch_to_parquet from_json
+
+未提供 --corpus 时在临时目录中生成默认规模的数据
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _input_files(corpus: Path):
+    return [corpus / name for name in (corpus / "list.txt").read_text().splitlines()]
+
+
+def _block_bytes(block) -> int:
+    """块中二进制与文本内容的字节数"""
+    total = 0
+    for name in ("图片", "视频", "音频"):
+        value = getattr(block, name)
+        if value is not None:
+            total += len(value)
+    for name in ("文本", "OCR文本", "STT文本"):
+        value = getattr(block, name)
+        if value is not None:
+            total += len(value.encode("utf-8"))
+    return total
+
+
+def bench_image_text_pair_blocks(corpus: Path, work_dir: Path):
+    from src.mm_data.core.models.chinaxiv_block import chinaxiv_to_image_text_pair_blocks
+    blocks = nbytes = 0
+    start = time.perf_counter()
+    for input_file in _input_files(corpus):
+        for block in chinaxiv_to_image_text_pair_blocks(input_file):
+            blocks += 1
+            nbytes += _block_bytes(block)
+    return blocks, nbytes, time.perf_counter() - start
+
+
+def bench_pdf_blocks(corpus: Path, work_dir: Path):
+    from src.mm_data.core.models.chinaxiv_block import chinaxiv_to_pdf_blocks
+    blocks = nbytes = 0
+    start = time.perf_counter()
+    for input_file in _input_files(corpus):
+        for block in chinaxiv_to_pdf_blocks(input_file):
+            blocks += 1
+            nbytes += _block_bytes(block)
+    return blocks, nbytes, time.perf_counter() - start
+
+
+def bench_batch_to_parquet(corpus: Path, work_dir: Path):
+    """只计写入时间, 块在计时前读入内存"""
+    from src.mm_data.core.models.chinaxiv_block import chinaxiv_to_image_text_pair_blocks
+    from src.mm_data.core.processor import batch_to_parquet
+    batchs = [chinaxiv_to_image_text_pair_blocks(input_file) for input_file in _input_files(corpus)]
+    blocks = sum(len(batch) for batch in batchs)
+    nbytes = sum(_block_bytes(block) for batch in batchs for block in batch)
+    start = time.perf_counter()
+    batch_to_parquet(work_dir / "bench.parquet", 10, batchs)
+    return blocks, nbytes, time.perf_counter() - start
+
+
+def bench_file_to_blocks(corpus: Path, work_dir: Path):
+    from src.mm_data.core.processor import file_to_blocks
+    jsonl_file = corpus / "blocks.jsonl"
+    start = time.perf_counter()
+    blocks = file_to_blocks(jsonl_file)
+    return len(blocks), jsonl_file.stat().st_size, time.perf_counter() - start
+
+
+def bench_to_json(corpus: Path, work_dir: Path):
+    from src.mm_data.core.processor import file_to_blocks
+    blocks = file_to_blocks(corpus / "blocks.jsonl")
+    nbytes = 0
+    start = time.perf_counter()
+    for block in blocks:
+        nbytes += len(block.to_json())
+    return len(blocks), nbytes, time.perf_counter() - start
+
+
+def bench_from_json(corpus: Path, work_dir: Path):
+    from src.mm_data.core.models.mmdata_block import mmDataBlock
+    lines = (corpus / "blocks.jsonl").read_text(encoding="utf-8").splitlines()
+    nbytes = sum(len(line) for line in lines)
+    start = time.perf_counter()
+    for line in lines:
+        mmDataBlock.from_json(line)
+    return len(lines), nbytes, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "image_text_pair_blocks": bench_image_text_pair_blocks,
+    "pdf_blocks": bench_pdf_blocks,
+    "batch_to_parquet": bench_batch_to_parquet,
+    "file_to_blocks": bench_file_to_blocks,
+    "to_json": bench_to_json,
+    "from_json": bench_from_json,
+}
+
+
+def run_child(name: str, corpus: Path) -> None:
+    """子进程: 运行单个测试项, 结果以一行 JSON 打印到 stdout"""
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    with tempfile.TemporaryDirectory() as work_dir:
+        blocks, nbytes, seconds = BENCHMARKS[name](corpus, Path(work_dir))
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"blocks": blocks, "bytes": nbytes, "seconds": seconds, "peak_rss": peak_rss}))
+
+
+def run_benchmark(name: str, corpus: Path, repeat: int) -> dict:
+    """在子进程中运行 repeat 次, 取耗时最短的一次"""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, __file__, "--child", name, "--corpus", str(corpus)],
+                                check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    seconds = max(best["seconds"], 1e-9)
+    return {
+        "blocks": best["blocks"],
+        "bytes": best["bytes"],
+        "seconds": round(best["seconds"], 4),
+        "blocks_per_s": round(best["blocks"] / seconds, 2),
+        "mb_per_s": round(best["bytes"] / seconds / (1 << 20), 2),
+        "peak_rss_mb": round(max(run["peak_rss"] for run in runs) / (1 << 20), 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conversion throughput")
+    parser.add_argument("--corpus", "-c", type=Path, default=None,
+                        help="Corpus generated by make_synthetic_corpus.py, generated in a temp dir if omitted")
+    parser.add_argument("--output", "-o", type=Path, default=Path("benchmark.json"), help="Result JSON file")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="Benchmarks to run")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="Runs per benchmark, the fastest is kept")
+    parser.add_argument("--child", choices=list(BENCHMARKS), default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.corpus)
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = args.corpus
+        if corpus is None:
+            from make_synthetic_corpus import make_corpus
+            corpus = Path(temp_dir) / "corpus"
+            make_corpus(corpus)
+        corpus = corpus.resolve()
+
+        results = {}
+        for name in args.only or BENCHMARKS:
+            results[name] = run_benchmark(name, corpus, args.repeat)
+            print(f"{name:<24} {results[name]['blocks_per_s']:>12} blocks/s "
+                  f"{results[name]['mb_per_s']:>10} MB/s {results[name]['peak_rss_mb']:>8} MB peak RSS")
+
+    report = {
+        "commit": _git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": str(args.corpus) if args.corpus else "generated",
+        "repeat": args.repeat,
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
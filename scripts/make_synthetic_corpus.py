@@ -0,0 +1,123 @@
+"""
+生成合成测试数据, 用于性能测试
+
+输出目录结构与 docling 输出一致:
+    {output_dir}/list.txt
+    {output_dir}/doc{i}.pdf
+    {output_dir}/doc{i}_docling_output/doc{i}.json
+    {output_dir}/doc{i}_docling_output/doc{i}.md
+    {output_dir}/doc{i}_docling_output/pages/doc{i}-page-{n}.png|md
+    {output_dir}/blocks.jsonl  (mmDataBlock.to_json 格式, 供 file_to_blocks 使用)
+
+相同的 --seed 生成相同的数据
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from PIL import Image, ImageDraw
+
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+
+_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质"
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    """生成随机中文段落, 每约 40 字换行"""
+    chars = [rng.choice(_CHARS) for _ in range(length)]
+    for i in range(40, length, 40):
+        chars[i] = "\n"
+    return "".join(chars)
+
+
+def random_page_png(rng: random.Random, width: int, height: int) -> bytes:
+    """白底上绘制随机文本行与色块, 压缩率接近真实页面截图"""
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    margin = width // 12
+    y = margin
+    while y < height - margin:
+        line_width = rng.randint(width // 3, width - 2 * margin)
+        draw.rectangle([margin, y, margin + line_width, y + 8], fill=(rng.randint(0, 80),) * 3)
+        y += rng.randint(18, 30)
+    for _ in range(rng.randint(0, 2)):
+        x0, y0 = rng.randint(0, width // 2), rng.randint(0, height // 2)
+        draw.rectangle([x0, y0, x0 + width // 4, y0 + height // 6],
+                       fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_document(output_dir: Path, name: str, rng: random.Random, pages: int,
+                  width: int, height: int, page_chars: int, pdf_kb: int) -> str:
+    """生成一篇文档的 PDF 与 docling 输出, 返回全文"""
+    docling_dir = output_dir / f"{name}_docling_output"
+    pages_dir = docling_dir / "pages"
+    pages_dir.mkdir(parents=True, exist_ok=True)
+
+    page_texts = []
+    for page in range(1, pages + 1):
+        text = random_text(rng, page_chars)
+        page_texts.append(text)
+        (pages_dir / f"{name}-page-{page}.md").write_text(text, encoding="utf-8")
+        (pages_dir / f"{name}-page-{page}.png").write_bytes(random_page_png(rng, width, height))
+
+    full_text = "\n\n".join(page_texts)
+    (docling_dir / f"{name}.md").write_text(full_text, encoding="utf-8")
+    docling = {
+        "schema_name": "DoclingDocument",
+        "name": name,
+        "pages": {str(page): {"page_no": page, "size": {"width": width, "height": height}}
+                  for page in range(1, pages + 1)},
+        "texts": [{"self_ref": f"#/texts/{i}", "label": "text", "prov": [{"page_no": i + 1}], "text": text}
+                  for i, text in enumerate(page_texts)],
+    }
+    (docling_dir / f"{name}.json").write_text(json.dumps(docling, ensure_ascii=False), encoding="utf-8")
+    # 内容只需可读取与哈希, 不要求是合法 PDF
+    (output_dir / f"{name}.pdf").write_bytes(b"%PDF-1.4\n" + rng.randbytes(pdf_kb * 1024) + b"\n%%EOF\n")
+    return full_text
+
+
+def make_corpus(output_dir: Path, docs: int = 20, pages: int = 10, width: int = 850, height: int = 1100,
+                page_chars: int = 1500, pdf_kb: int = 512, jsonl_blocks: int = 2000, seed: int = 0) -> None:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    names = [f"doc{i}" for i in range(docs)]
+    for name in names:
+        make_document(output_dir, name, rng, pages, width, height, page_chars, pdf_kb)
+    (output_dir / "list.txt").write_text("\n".join(f"{name}.pdf" for name in names), encoding="utf-8")
+
+    # 小图片的 JSONL 块文件
+    image = random_page_png(rng, 64, 64)
+    with open(output_dir / "blocks.jsonl", "w", encoding="utf-8") as file:
+        for i in range(jsonl_blocks):
+            block = mmDataBlock(实体ID=f"block-{i}", md5="", 块ID=i, 块类型="image-text-pair",
+                                扩展字段=json.dumps({"index": i}), 文本=random_text(rng, 200), 图片=image)
+            file.write(block.to_json() + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic docling corpus for benchmarks")
+    parser.add_argument("--output_dir", "-o", type=Path, required=True, help="Output directory")
+    parser.add_argument("--docs", "-n", type=int, default=20, help="Number of documents")
+    parser.add_argument("--pages", "-p", type=int, default=10, help="Pages per document")
+    parser.add_argument("--width", type=int, default=850, help="Page image width")
+    parser.add_argument("--height", type=int, default=1100, help="Page image height")
+    parser.add_argument("--page_chars", type=int, default=1500, help="Characters per page")
+    parser.add_argument("--pdf_kb", type=int, default=512, help="Size of each synthetic pdf in KB")
+    parser.add_argument("--jsonl_blocks", type=int, default=2000, help="Number of blocks in blocks.jsonl")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    make_corpus(args.output_dir, args.docs, args.pages, args.width, args.height,
+                args.page_chars, args.pdf_kb, args.jsonl_blocks, args.seed)
+
+
+if __name__ == "__main__":
+    main()
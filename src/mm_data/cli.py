@@ -0,0 +1,151 @@
+"""
+mm-data 命令行入口
+
+    mm-data convert --type {pdf,image-text-pair,video} ...
+    mm-data validate output/ --workers 8 --report report.json
+    mm-data merge-manifest node0/ node1/ -o dataset.manifest.json
+    mm-data lookup output/out.parquet --md5 9e107d9d372bb6826bd81d3542a419d6
+    python -m src.mm_data.cli convert ...   # 未安装时在仓库根目录运行
+
+启动时只导入标准库与处理器注册表, 选中的块类型的处理模块在解析参数时才导入
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .core.registry import get_handler, handler_names, load_converter
+
+
+def convert(argv: List[str]) -> None:
+    """按 --type 选择处理器并执行转换"""
+    # 先只解析 --type, 再由选中的处理器注册自己的参数
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--type", "-t", choices=handler_names())
+    known, _ = pre_parser.parse_known_args(argv)
+
+    parser = argparse.ArgumentParser(
+        prog="mm-data convert",
+        description="将原始数据转换为 MNBVC 多模态 parquet",
+        epilog="types: " + ", ".join(f"{name} ({get_handler(name).description})" for name in handler_names()))
+    parser.add_argument("--type", "-t", choices=handler_names(), required=True, help="block type")
+    converter = None
+    if known.type is not None:
+        converter = load_converter(known.type)
+        converter.add_arguments(parser)
+
+    args = parser.parse_args(argv)
+    converter.run(args)
+
+
+def validate(argv: List[str]) -> None:
+    """按行组并行校验输出分片, 输出 JSON 报告, 存在问题时退出码为 1"""
+    parser = argparse.ArgumentParser(prog="mm-data validate", description="校验 MNBVC 多模态 parquet 分片")
+    parser.add_argument("paths", nargs="+", type=Path, help="shard files or directories")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes, one row group per task")
+    parser.add_argument("--report", "-r", type=Path, default=None,
+                        help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--max_issues", "--max-issues", type=int, default=1000,
+                        help="Maximum number of issues listed in the report")
+    args = parser.parse_args(argv)
+
+    from .core.validate import validate_shards
+
+    report = validate_shards(args.paths, workers=args.workers, max_issues=args.max_issues)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report is not None:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(text, encoding="utf-8")
+        print(f"{report['rows']} rows in {report['files']} files checked, {report['errors']} errors, "
+              f"report: {args.report}")
+    else:
+        print(text)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+def merge_manifest(argv: List[str]) -> None:
+    """合并各节点的 {stem}.manifest.json 为一个数据集清单, 节点不全或不一致时退出码为 1"""
+    parser = argparse.ArgumentParser(prog="mm-data merge-manifest", description="合并多节点转换的清单")
+    parser.add_argument("paths", nargs="+", type=Path, help="manifest files or directories containing them")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="Merged manifest file")
+    parser.add_argument("--allow_missing", "--allow-missing", action="store_true",
+                        help="Merge even if some node shards have no manifest")
+    args = parser.parse_args(argv)
+
+    from .core.partition import merge_manifests
+
+    manifest_files = []
+    for path in args.paths:
+        if path.is_dir():
+            manifest_files += sorted(file for file in path.glob("*.manifest.json")
+                                     if file.resolve() != args.output.resolve())
+        else:
+            manifest_files.append(path)
+    try:
+        merged = merge_manifests(manifest_files, args.output, allow_missing=args.allow_missing)
+    except ValueError as e:
+        print(f"merge-manifest: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{merged['rows']} rows in {merged['files']} files from {len(merged['nodes'])}/{merged['num_shards']} "
+          f"nodes, manifest: {args.output}")
+
+
+def lookup(argv: List[str]) -> None:
+    """通过行级索引查找块, 输出位置与非二进制字段, 二进制字段只输出字节数; 未找到时退出码为 1"""
+    parser = argparse.ArgumentParser(prog="mm-data lookup", description="按 实体ID/md5/块ID 查找块")
+    parser.add_argument("output_file", type=Path, help="output file given to convert (out.parquet) or an .index.arrow")
+    key = parser.add_mutually_exclusive_group(required=True)
+    key.add_argument("--entity_id", "--entity-id", type=str, default=None, help="实体ID")
+    key.add_argument("--md5", type=str, default=None, help="md5")
+    key.add_argument("--block_id", "--block-id", type=int, default=None, help="块ID")
+    parser.add_argument("--all", action="store_true", help="Print every matching block instead of the first")
+    args = parser.parse_args(argv)
+
+    from .core.block_index import BlockIndex, index_file_for
+    from .core.writer import BINARY_FIELDS, MMDATA_SCHEMA
+
+    index_file = args.output_file if args.output_file.name.endswith(".index.arrow") \
+        else index_file_for(args.output_file)
+    field_name, value = next((name, value) for name, value in
+                             (("实体ID", args.entity_id), ("md5", args.md5), ("块ID", args.block_id))
+                             if value is not None)
+    with BlockIndex(index_file) as index:
+        blocks = index.get_all(field_name, value) if args.all else \
+            [block for block in [index.get(field_name, value)] if block is not None]
+    for block in blocks:
+        values = {f.name: getattr(block, f.name) for f in MMDATA_SCHEMA}
+        for name in BINARY_FIELDS:
+            values[name] = None if values[name] is None else f"<{len(values[name])} bytes>"
+        print(json.dumps(values, ensure_ascii=False))
+    if not blocks:
+        print(f"{field_name}={value} not found", file=sys.stderr)
+        sys.exit(1)
+
+
+COMMANDS = {
+    "convert": (convert, "convert raw data to mm parquet shards"),
+    "validate": (validate, "check shards against schema, md5 and recorded metadata"),
+    "merge-manifest": (merge_manifest, "merge per-node manifests into one dataset index"),
+    "lookup": (lookup, "fetch a block by 实体ID, md5 or 块ID through the offset index"),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="mm-data",
+        description="MNBVC 多模态数据工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<16}{help_text}" for name, (_, help_text) in COMMANDS.items()))
+    parser.add_argument("command", choices=list(COMMANDS), help="sub command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="sub command arguments")
+    args = parser.parse_args(argv)
+    COMMANDS[args.command][0](args.args)
+
+
+if __name__ == "__main__":
+    main()
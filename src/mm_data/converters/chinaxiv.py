@@ -0,0 +1,170 @@
+"""
+Chinaxiv 转换入口, scripts/chinaxiv_convert.py 与 mm-data convert --type {pdf,image-text-pair} 共用
+
+模块顶层只依赖标准库, pyarrow/PIL 等依赖在 run 中才导入
+"""
+
+import argparse
+import os
+from contextlib import ExitStack
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """注册 Chinaxiv 转换参数, --type 由调用方定义"""
+    parser.add_argument("--input_file", "-i", type=Path, help="Input file")
+    parser.add_argument("--output_file", "-o", type=Path, help="Output file")
+    parser.add_argument("--split_size", "-s", type=int, default=200,
+                        help="Split size")  # 500-1000MB 一个 parquet 文件
+    parser.add_argument("--log_dir", "-l", type=Path,
+                        default="logs", help="Log level")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of worker processes, 1 means serial")
+    parser.add_argument("--dedup_index", type=Path, default=None,
+                        help="Content dedup index (sqlite), already ingested content is skipped")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip inputs already committed in the journal and continue shard numbering")
+    parser.add_argument("--num_shards", "--num-shards", type=int, default=1,
+                        help="Number of nodes sharing the input list, inputs are split by a hash of their path")
+    parser.add_argument("--shard_index", "--shard-index", type=int, default=0,
+                        help="Index of this node in [0, num_shards), included in output file names")
+    parser.add_argument("--prefetch_workers", type=int, default=4,
+                        help="Threads reading upcoming page files ahead, 0 reads synchronously")
+    parser.add_argument("--prefetch_bytes", type=int, default=256 << 20,
+                        help="Max bytes of page files read ahead but not yet converted")
+    parser.add_argument("--json_check", type=str, default="structure", choices=["none", "structure", "full"],
+                        help="Check on docling json stored as-is (pdf only): none, cheap structure check or full parse")
+    parser.add_argument("--transcode", type=str, default=None, choices=["webp-lossless", "webp", "jpeg"],
+                        help="Transcode page images (image-text-pair only), default stores the original PNG")
+    parser.add_argument("--max_edge", type=int, default=None,
+                        help="Downscale transcoded pages so the longest edge is at most this many pixels")
+    parser.add_argument("--quality", type=int, default=85, help="Quality of lossy webp/jpeg transcoding")
+    parser.add_argument("--transcode_workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used for transcoding in the serial and single-file paths")
+    parser.add_argument("--media_compression", type=str, default="none", choices=["none", "lz4", "snappy", "zstd"],
+                        help="Parquet compression of image/video/audio columns, which are already compressed")
+    parser.add_argument("--text_compression_level", type=int, default=3,
+                        help="zstd level of text columns")
+    parser.add_argument("--row_group_bytes", type=int, default=64 << 20,
+                        help="Max uncompressed bytes per parquet row group")
+    parser.add_argument("--auto_tune", "--auto-tune", action="store_true",
+                        help="Benchmark candidate column codecs on the first blocks and pick the best trade-off")
+    parser.add_argument("--auto_tune_rows", "--auto-tune-rows", type=int, default=256,
+                        help="Number of leading blocks sampled by --auto_tune")
+    parser.add_argument("--metrics_interval", type=float, default=None,
+                        help="Log a per-stage timing summary every N seconds")
+    parser.add_argument("--metrics_file", type=Path, default=None,
+                        help="Write metrics in Prometheus text format to this file")
+
+
+def run(args: argparse.Namespace) -> None:
+    """执行 Chinaxiv 转换, 指定 --metrics_interval 或 --metrics_file 时收集阶段指标"""
+    from ..core import metrics
+
+    if args.metrics_interval or args.metrics_file:
+        metrics.enable(args.metrics_interval, args.metrics_file)
+    try:
+        _run(args)
+    finally:
+        metrics.shutdown()
+
+
+def _run(args: argparse.Namespace) -> None:
+    from loguru import logger
+    from ..core.models.chinaxiv_block import (iter_block_batch, batch_to_parquet, chinaxiv_to_record_batch,
+                                              iter_image_text_pair_documents)
+    from ..core.processor import parallel_map
+    from ..core.dedup import DedupIndex
+    from ..core.journal import ConversionJournal
+    from ..core.partition import (input_shard, manifest_file_for, node_output_file, partition_inputs,
+                                  write_manifest)
+    from ..core.transcode import TranscodeOptions, Transcoder
+    from ..core.write_policy import MEDIA_COLUMNS, TEXT_COLUMNS, WritePolicy
+
+    current_date = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+
+    input_file = args.input_file
+    # 多节点运行时每个节点的输出文件名带节点编号, 互不冲突
+    output_file = node_output_file(args.output_file, args.num_shards, args.shard_index)
+    split_size = args.split_size
+    block_type = args.type
+    workers = args.workers
+    # 只有列表输入才使用多进程转换, 单个文件总是在本进程内读取
+    use_workers = workers > 1 and input_file.suffix == ".txt"
+    # 页面转码只用于 image-text-pair; 多进程转换时在各 worker 内转码, 否则在本进程的转码池中
+    transcode = TranscodeOptions(args.transcode, args.max_edge, args.quality) \
+        if args.transcode and block_type == "image-text-pair" else None
+
+    # 出错时同样关闭去重索引 (回滚未提交的记录) 与转码进程池
+    with ExitStack() as stack:
+        dedup = stack.enter_context(DedupIndex(args.dedup_index)) if args.dedup_index else None
+        transcoder = stack.enter_context(Transcoder(transcode, args.transcode_workers)) \
+            if transcode is not None and not use_workers else None
+
+        policy = WritePolicy(compression={name: args.media_compression for name in MEDIA_COLUMNS},
+                             compression_level={name: args.text_compression_level for name in TEXT_COLUMNS})
+
+        log_dir = args.log_dir
+        logger_file = log_dir / f"to_mm_{current_date}.log"
+        logger.add(logger_file, encoding="utf-8", rotation="500MB")
+
+        # 断点日志: 记录每个已提交分片包含的输入
+        journal = ConversionJournal.for_output(output_file)
+        if args.resume:
+            journal.load()
+            logger.info(f"resume from split {journal.next_split}, "
+                        f"{len(journal.committed_inputs)} inputs already committed")
+        else:
+            journal.reset()
+        commit_hooks = [journal.record]
+        if dedup is not None:
+            # 去重记录随分片一起提交, 中断时未写入分片的内容不会被标记为已入库
+            commit_hooks.append(lambda *_: dedup.commit())
+
+        if input_file.suffix == ".txt":
+            input_file_list = input_file.read_text().splitlines()
+            if args.num_shards > 1:
+                total = len(input_file_list)
+                input_file_list = partition_inputs(input_file_list, args.num_shards, args.shard_index)
+                logger.info(f"node {args.shard_index}/{args.num_shards}: {len(input_file_list)} of {total} inputs")
+            input_file_path_list = [input_file.parent /
+                                    file_path for file_path in input_file_list]
+            input_file_path_list = [file_path for file_path in input_file_path_list
+                                    if not journal.is_committed(str(file_path))]
+            logger.info(f"input_file_path_list: {len(input_file_path_list)} files")
+            if use_workers:
+                # 多进程转换, worker 返回 RecordBatch, 按输入顺序交给单个写入器
+                batchs = parallel_map(partial(chinaxiv_to_record_batch, block_type=block_type,
+                                              dedup_file=args.dedup_index, transcode=transcode,
+                                              json_check=args.json_check),
+                                      input_file_path_list, workers)
+                if dedup is not None:
+                    batchs = (dedup.filter_record_batch(batch) for batch in batchs)
+            elif block_type == "image-text-pair":
+                # 惰性生成, 后续文档的页面在写入当前文档时已在预读
+                batchs = iter_image_text_pair_documents(input_file_path_list, dedup,
+                                                        args.prefetch_workers, args.prefetch_bytes, transcoder)
+            else:
+                # 惰性生成, 每个文档的块在写入时才被读取
+                batchs = (iter_block_batch(input_file, block_type, dedup, json_check=args.json_check)
+                          for input_file in input_file_path_list)
+        else:
+            input_file_path_list = [input_file] if not journal.is_committed(str(input_file)) and \
+                input_shard(str(input_file), args.num_shards) == args.shard_index else []
+            batchs = (iter_block_batch(input_file, block_type, dedup, transcoder, args.json_check)
+                      for input_file in input_file_path_list)
+
+        # 将 batchs 流式写入 parquet 文件
+        batch_to_parquet(output_file, split_size, batchs,
+                         sources=[str(file_path) for file_path in input_file_path_list],
+                         start_split=journal.next_split,
+                         commit_hooks=commit_hooks,
+                         policy=policy,
+                         row_group_bytes=args.row_group_bytes,
+                         auto_tune_rows=args.auto_tune_rows if args.auto_tune else 0)
+        manifest = write_manifest(output_file, args.num_shards, args.shard_index)
+        logger.info(f"{manifest['rows']} rows in {manifest['files']} files, "
+                    f"manifest: {manifest_file_for(output_file)}")
+
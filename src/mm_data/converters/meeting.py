@@ -0,0 +1,137 @@
+"""
+会议视频转换入口, scripts/meeting_convert.py 与 mm-data convert --type video 共用
+
+模块顶层只依赖标准库, whisperx/torch 等依赖在 run 中才导入
+"""
+
+import argparse
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """注册视频转换参数, --type 由调用方定义"""
+    parser.add_argument("--input_dir", "-i", type=Path, help="Input files directory")
+    parser.add_argument("--output_dir", "-o", type=Path, help="Output files directory")
+    parser.add_argument("--device", "-d", type=str, choices=["cuda", "cpu"], help="device type")
+    parser.add_argument("--log_dir", "-l", type=Path, default="logs", help="Log directory")
+    parser.add_argument("--dedup_index", type=Path, default=None,
+                        help="Content dedup index (sqlite), already ingested videos are skipped")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip videos already committed in the output journal")
+    parser.add_argument("--extract_workers", type=int, default=2,
+                        help="Number of audio extraction threads")
+    parser.add_argument("--audio_queue_size", type=int, default=2,
+                        help="Max videos prefetched for transcription")
+    parser.add_argument("--write_queue_size", type=int, default=2,
+                        help="Max transcribed blocks waiting to be written")
+    parser.add_argument("--cache_dir", type=Path, default=None,
+                        help="Transcription cache directory, reruns on unchanged audio skip the models")
+    parser.add_argument("--cache_max_bytes", type=int, default=1 << 30,
+                        help="Transcription cache size limit in bytes (LRU eviction)")
+    parser.add_argument("--chunk_size", type=int, default=0,
+                        help="Store videos as chunk rows of this many bytes, 0 stores each video in one row")
+    parser.add_argument("--model", type=str, default="large-v3", help="whisper model name")
+    parser.add_argument("--compute_type", type=str, default=None,
+                        help="Inference precision, default float16 on cuda and int8 on cpu")
+    parser.add_argument("--no_diarize", action="store_true", help="Disable speaker diarization")
+    parser.add_argument("--serve", type=Path, default=None,
+                        help="Run as a long-lived worker keeping models loaded, listening on this unix socket")
+    parser.add_argument("--server", type=Path, default=None,
+                        help="Send videos to a worker started with --serve instead of loading models")
+    parser.add_argument("--metrics_interval", type=float, default=None,
+                        help="Log a per-stage timing summary every N seconds")
+    parser.add_argument("--metrics_file", type=Path, default=None,
+                        help="Write metrics in Prometheus text format to this file")
+
+
+def run(args: argparse.Namespace) -> None:
+    """执行视频转换, 指定 --metrics_interval 或 --metrics_file 时收集阶段指标"""
+    from ..core import metrics
+
+    if args.metrics_interval or args.metrics_file:
+        metrics.enable(args.metrics_interval, args.metrics_file)
+    try:
+        _run(args)
+    finally:
+        metrics.shutdown()
+
+
+def _run(args: argparse.Namespace) -> None:
+    from loguru import logger
+    from ..core.models.video_block import VideoProcessor, process_video_to_parquets
+    from ..core.video_service import process_videos_via_service, serve_video_processor
+    from ..core.cache import TranscriptionCache
+    from ..core.dedup import DedupIndex
+
+    current_date = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+
+    input_dir = args.input_dir
+    output_dir = args.output_dir
+    block_type = args.type
+    device = args.device
+    log_dir = args.log_dir
+
+    logger_file = log_dir / f"to_mm_{current_date}.log"
+    logger.add(logger_file, encoding="utf-8", rotation="500MB")
+
+    if args.server and args.cache_dir:
+        # 转写在服务进程中执行, 缓存需在启动 --serve 时指定
+        logger.warning("--cache_dir is ignored with --server, pass it to the --serve worker instead")
+    if args.serve and args.dedup_index:
+        logger.warning("--dedup_index is ignored with --serve, pass it to the --server client instead")
+    cache = TranscriptionCache(args.cache_dir, args.cache_max_bytes) \
+        if args.cache_dir and not args.server else None
+
+    if args.serve:
+        # 常驻模式: 模型加载一次, 通过 socket 服务多次调用
+        processor = VideoProcessor(use_auth_token=os.getenv("WHISPERX_API_KEY"), device=device,
+                                   compute_type=args.compute_type, cache=cache,
+                                   model_name=args.model, diarize=not args.no_diarize)
+        serve_video_processor(args.serve, processor)
+        return
+
+    if block_type == "video":
+        if not input_dir.exists() or not input_dir.is_dir():
+            raise ValueError(f"输入目录无效: {input_dir}")
+
+        # 👇 获取视频列表
+        videos: List[Path] = sorted(input_dir.glob("*.mp4"))
+
+        if not videos:
+            logger.warning(f"输入目录中未找到视频文件: {input_dir}")
+            return
+
+        dedup = DedupIndex(args.dedup_index) if args.dedup_index else None
+        if args.server:
+            process_videos_via_service(videos, output_dir, args.server, resume=args.resume,
+                                       chunk_size=args.chunk_size or None, dedup=dedup)
+            if dedup is not None:
+                dedup.close()
+            return
+
+        process_video_to_parquets(
+            videos=videos,
+            output_dir=output_dir,
+            use_auth_token=os.getenv("WHISPERX_API_KEY"),
+            device=device,
+            dedup=dedup,
+            resume=args.resume,
+            extract_workers=args.extract_workers,
+            audio_queue_size=args.audio_queue_size,
+            write_queue_size=args.write_queue_size,
+            cache=cache,
+            chunk_size=args.chunk_size or None,
+            compute_type=args.compute_type,
+            model_name=args.model,
+            diarize=not args.no_diarize
+        )
+        if dedup is not None:
+            dedup.close()
+        if cache is not None:
+            cache.close()
+    else:
+        logger.warning(f"尚未处理 block_type: {block_type}")
+
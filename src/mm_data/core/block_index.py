@@ -0,0 +1,237 @@
+"""
+分片的行级偏移索引
+
+写入时为每个行组记录 实体ID / md5 / 块ID 到 (分片, 行组, 行组内行号) 的映射:
+分片提交时写出 {shard_stem}.index.arrow, 写入器关闭时合并为 {stem}.index.arrow.
+
+索引为未压缩的 Arrow IPC 文件, 每种键一个按键排序的 RecordBatch, 打开时内存映射后直接二分查找.
+字符串键存其 8 字节 blake2b 哈希, 查找时读取对应行组校验原值, 哈希冲突不会返回错误的块.
+schema metadata 中记录每个分片的文件名, 行数, 行组数, 各键的最小/最大值与各块类型的行数
+
+    index = BlockIndex.for_output(Path("output/out.parquet"))
+    block = index.get("md5", "9e107d9d372bb6826bd81d3542a419d6")  # 只读取一个行组
+    locations = index.locate("实体ID", "doc0.pdf")                  # [(分片文件, 行组, 行号)]
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as parquet
+
+from .models.mmdata_block import mmDataBlock
+
+KEY_FIELDS = ("实体ID", "md5", "块ID")
+INDEX_VERSION = 1
+INDEX_SCHEMA = pa.schema([
+    pa.field("key", pa.uint64(), nullable=False),
+    pa.field("shard", pa.uint32(), nullable=False),
+    pa.field("row_group", pa.uint32(), nullable=False),
+    pa.field("row", pa.uint32(), nullable=False),
+])
+
+
+def key_hash(field_name: str, value: Union[str, int]) -> int:
+    """块ID 直接作为键, 字符串键取 8 字节 blake2b 哈希"""
+    if field_name == "块ID":
+        return value & 0xFFFFFFFFFFFFFFFF
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _key_hashes(field_name: str, column: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    if field_name == "块ID":
+        return np.asarray(column.to_numpy(), dtype=np.int64).view(np.uint64)
+    return np.fromiter((key_hash(field_name, value) for value in column.to_pylist()),
+                       dtype=np.uint64, count=len(column))
+
+
+def index_file_for(shard_file: Path) -> Path:
+    """分片 out_0.parquet 的索引为 out_0.index.arrow, 输出文件 out.parquet 的全局索引为 out.index.arrow"""
+    shard_file = Path(shard_file)
+    return shard_file.parent / f"{shard_file.stem}.index.arrow"
+
+
+def shard_index_files(output_file: Path, num_splits: int) -> List[Path]:
+    """输出文件 out.parquet 的分片 0 .. num_splits-1 的索引, 之前运行遗留的编号更大的分片不计入"""
+    output_file = Path(output_file)
+    files = [output_file.parent / f"{output_file.stem}_{split}.index.arrow" for split in range(num_splits)]
+    return [file for file in files if file.exists()]
+
+
+def remove_shard_indexes(output_file: Path, start_split: int) -> None:
+    """删除编号不小于 start_split 的分片索引; 这些分片将被重写, 或属于之前的运行"""
+    output_file = Path(output_file)
+    pattern = re.compile(rf"^{re.escape(output_file.stem)}_(\d+)\.index\.arrow$")
+    for file in output_file.parent.glob(f"{output_file.stem}_*.index.arrow"):
+        if (match := pattern.match(file.name)) and int(match.group(1)) >= start_split:
+            file.unlink()
+
+
+def _write_index(index_file: Path, shards: List[Dict[str, Any]], batches: List[pa.RecordBatch]) -> None:
+    """按 KEY_FIELDS 顺序写出各键的 RecordBatch, 先写临时文件再重命名"""
+    schema = INDEX_SCHEMA.with_metadata({
+        "version": str(INDEX_VERSION),
+        "fields": json.dumps(KEY_FIELDS, ensure_ascii=False),
+        "shards": json.dumps(shards, ensure_ascii=False),
+    })
+    temp_file = index_file.parent / f"{index_file.name}.tmp"
+    with pa.OSFile(str(temp_file), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    os.replace(temp_file, index_file)
+
+
+def _sorted_batch(keys: np.ndarray, shards: np.ndarray, row_groups: np.ndarray, rows: np.ndarray) -> pa.RecordBatch:
+    order = np.argsort(keys, kind="stable")
+    return pa.RecordBatch.from_arrays([pa.array(keys[order]), pa.array(shards[order]),
+                                       pa.array(row_groups[order]), pa.array(rows[order])], schema=INDEX_SCHEMA)
+
+
+class IndexBuilder:
+    """累积一个分片的索引与统计, 由写入器在写出每个行组时调用 add_row_group"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.rows = 0
+        self.row_groups = 0
+        self.min: Dict[str, Any] = {}
+        self.max: Dict[str, Any] = {}
+        self.counts: Dict[str, int] = {}
+        self._keys: Dict[str, List[np.ndarray]] = {name: [] for name in KEY_FIELDS}
+        self._row_groups: List[np.ndarray] = []
+        self._rows: List[np.ndarray] = []
+
+    def add_row_group(self, table: pa.Table, row_group: int) -> None:
+        """记录一个已写出的行组, row_group 为其在分片中的编号"""
+        for name in KEY_FIELDS:
+            column = table.column(name)
+            self._keys[name].append(_key_hashes(name, column))
+            min_max = pc.min_max(column).as_py()
+            if min_max["min"] is not None:
+                self.min[name] = min(self.min.get(name, min_max["min"]), min_max["min"])
+                self.max[name] = max(self.max.get(name, min_max["max"]), min_max["max"])
+        for item in pc.value_counts(table.column("块类型")).to_pylist():
+            self.counts[item["values"]] = self.counts.get(item["values"], 0) + item["counts"]
+        self._row_groups.append(np.full(table.num_rows, row_group, dtype=np.uint32))
+        self._rows.append(np.arange(table.num_rows, dtype=np.uint32))
+        self.rows += table.num_rows
+        self.row_groups += 1
+
+    def shard_info(self, shard_name: str) -> Dict[str, Any]:
+        return {"file": shard_name, "rows": self.rows, "row_groups": self.row_groups,
+                "min": dict(self.min), "max": dict(self.max), "counts": dict(self.counts)}
+
+    def write(self, index_file: Path, shard_name: str) -> None:
+        """写出分片索引, 其中 shard 列均为 0"""
+        row_groups = np.concatenate(self._row_groups) if self._row_groups else np.zeros(0, dtype=np.uint32)
+        rows = np.concatenate(self._rows) if self._rows else np.zeros(0, dtype=np.uint32)
+        shards = np.zeros(len(rows), dtype=np.uint32)
+        batches = [_sorted_batch(np.concatenate(self._keys[name]) if self._keys[name] else np.zeros(0, np.uint64),
+                                 shards, row_groups, rows)
+                   for name in KEY_FIELDS]
+        _write_index(index_file, [self.shard_info(shard_name)], batches)
+
+
+def merge_shard_indexes(index_file: Path, shard_files: Iterable[Path]) -> int:
+    """将各分片索引合并为全局索引, 续跑时之前运行写出的分片同样计入, 返回合并的分片数"""
+    shards: List[Dict[str, Any]] = []
+    columns: Dict[str, List[List[np.ndarray]]] = {name: [[], [], [], []] for name in KEY_FIELDS}
+    for shard_id, shard_file in enumerate(shard_files):
+        with pa.memory_map(str(shard_file)) as source:
+            reader = pa.ipc.open_file(source)
+            shards += json.loads(reader.schema.metadata[b"shards"])
+            for i, name in enumerate(KEY_FIELDS):
+                batch = reader.get_batch(i)
+                keys, row_groups, rows = (batch.column(column).to_numpy().copy()
+                                          for column in ("key", "row_group", "row"))
+                for target, values in zip(columns[name], (keys, np.full(len(keys), shard_id, np.uint32),
+                                                          row_groups, rows)):
+                    target.append(values)
+    batches = []
+    for name in KEY_FIELDS:
+        arrays = [np.concatenate(parts) if parts else np.zeros(0, dtype)
+                  for parts, dtype in zip(columns[name], (np.uint64, np.uint32, np.uint32, np.uint32))]
+        batches.append(_sorted_batch(*arrays))
+    _write_index(index_file, shards, batches)
+    return len(shards)
+
+
+class BlockIndex:
+    """内存映射的索引文件, locate 只做二分查找, get 读取一个行组
+
+    Args:
+        index_file: 全局索引 {stem}.index.arrow 或单个分片的索引, 分片文件与其在同一目录
+    """
+
+    def __init__(self, index_file: Path):
+        self.index_file = Path(index_file)
+        self._source = pa.memory_map(str(self.index_file))
+        reader = pa.ipc.open_file(self._source)
+        self.shards: List[Dict[str, Any]] = json.loads(reader.schema.metadata[b"shards"])
+        fields = json.loads(reader.schema.metadata[b"fields"])
+        self._batches = {name: reader.get_batch(i) for i, name in enumerate(fields)}
+        # 零拷贝视图, 数据留在映射的文件中
+        self._keys = {name: batch.column("key").to_numpy() for name, batch in self._batches.items()}
+        self._files: Dict[Path, parquet.ParquetFile] = {}
+
+    @classmethod
+    def for_output(cls, output_file: Path) -> "BlockIndex":
+        return cls(index_file_for(output_file))
+
+    def __len__(self) -> int:
+        return sum(shard["rows"] for shard in self.shards)
+
+    def locate(self, field_name: str, value: Union[str, int]) -> List[Tuple[Path, int, int]]:
+        """返回键可能所在的 (分片文件, 行组, 行组内行号), 字符串键的结果可能含哈希冲突"""
+        if field_name not in self._keys:
+            raise ValueError(f"Field {field_name} is not indexed, indexed fields: {list(self._keys)}")
+        keys = self._keys[field_name]
+        key = np.uint64(key_hash(field_name, value))
+        start, end = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+        batch = self._batches[field_name].slice(start, end - start)
+        return [(self.index_file.parent / self.shards[shard]["file"], row_group, row)
+                for shard, row_group, row in zip(*(batch.column(name).to_pylist()
+                                                   for name in ("shard", "row_group", "row")))]
+
+    def _read_row(self, location: Tuple[Path, int, int]) -> Dict[str, Any]:
+        file, row_group, row = location
+        if file not in self._files:
+            self._files[file] = parquet.ParquetFile(file)
+        return self._files[file].read_row_group(row_group).slice(row, 1).to_pylist()[0]
+
+    def get_all(self, field_name: str, value: Union[str, int], block_class: type = mmDataBlock) -> List[mmDataBlock]:
+        """读取键等于 value 的全部块, 每个候选读取一个行组"""
+        blocks = []
+        for location in self.locate(field_name, value):
+            values = self._read_row(location)
+            if values[field_name] == value:
+                blocks.append(block_class(**values))
+        return blocks
+
+    def get(self, field_name: str, value: Union[str, int], block_class: type = mmDataBlock) -> Optional[mmDataBlock]:
+        """读取第一个键等于 value 的块, 不存在时返回 None"""
+        for location in self.locate(field_name, value):
+            values = self._read_row(location)
+            if values[field_name] == value:
+                return block_class(**values)
+        return None
+
+    def close(self) -> None:
+        self._batches = {}
+        self._keys = {}
+        self._files = {}
+        self._source.close()
+
+    def __enter__(self) -> "BlockIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -0,0 +1,108 @@
+"""
+转写结果缓存
+
+以音频采样内容的哈希加模型名与参数为键, 保存 speech_to_text 的结果(转写文本与说话人分段),
+值为 zlib 压缩的 JSON, 按总大小做 LRU 淘汰
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+DEFAULT_CACHE_MAX_BYTES = 1 << 30
+
+
+def _json_default(value: Any) -> Any:
+    """转写结果中可能包含 numpy 标量与数组"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+
+def to_json_types(value: Any) -> Any:
+    """将转写结果转为 JSON 基本类型 (numpy 标量与数组转为 Python 数值与列表, 元组转为列表)"""
+    return json.loads(json.dumps(value, ensure_ascii=False, default=_json_default))
+
+
+class TranscriptionCache:
+    """基于 SQLite 的转写结果缓存
+
+    Args:
+        cache_dir: 缓存目录, 缓存文件为其中的 transcripts.sqlite
+        max_bytes: 压缩后结果的总大小上限, 超出时淘汰最久未访问的条目
+
+    同一实例可在多个线程间共享 (如 --serve 的请求处理线程), 所有访问由内部锁串行化
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.cache_dir / "transcripts.sqlite", check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_access REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(audio: np.ndarray, settings: Dict[str, Any]) -> str:
+        """由音频采样与模型参数生成缓存键, 直接在数组缓冲区上计算哈希"""
+        digest = hashlib.sha256(memoryview(np.ascontiguousarray(audio)).cast("B"))
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中时返回缓存的结果并刷新访问时间"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """写入结果, 超出容量时按 LRU 淘汰"""
+        data = zlib.compress(json.dumps(value, ensure_ascii=False, default=_json_default).encode("utf-8"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                               (key, data, len(data), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """调用方需持有锁"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.debug(f"转写缓存淘汰 {evicted} 条记录, 当前大小 {total} bytes")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "TranscriptionCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
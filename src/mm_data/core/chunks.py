@@ -0,0 +1,133 @@
+"""
+大体积二进制的分块存储
+
+超大的 视频/音频 按固定大小拆成多行, 各行共享 实体ID 与 块ID, 扩展字段中记录
+{"chunk_index": 0, "chunk_count": 3, "chunk_offset": 0, "total_length": 123}
+文本/OCR文本/STT文本 只保存在第一个分块, 其余分块为空
+分块直接从内存映射的文件切片构建 Arrow 数组, 不复制到 Python bytes, 每个分块单独写为一个行组
+"""
+
+import json
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as parquet
+
+from .models.mmdata_block import mmDataBlock
+from .stats import TEXT_FIELDS, ShardStats
+from .write_policy import DEFAULT_WRITE_POLICY, WritePolicy
+from .writer import BINARY_FIELDS, MMDATA_SCHEMA, blocks_to_record_batch
+
+DEFAULT_CHUNK_SIZE = 64 << 20
+
+
+def _binary_array_from_buffer(buffer: pa.Buffer) -> pa.Array:
+    """用已有缓冲区零拷贝构建单元素 large_binary 数组
+
+    空文件内存映射得到的缓冲区地址为空, Arrow 不接受空的数据缓冲区, 此时换成空的 bytes 缓冲区
+    """
+    if buffer.size == 0:
+        buffer = pa.py_buffer(b"")
+    offsets = pa.py_buffer(np.array([0, buffer.size], dtype=np.int64))
+    return pa.Array.from_buffers(pa.large_binary(), 1, [None, offsets, buffer])
+
+
+def iter_chunk_record_batches(block: mmDataBlock, payload_file: Path, field_name: str = "视频",
+                              chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pa.RecordBatch]:
+    """将 payload_file 的内容按 chunk_size 拆分, 逐个产出分块行
+
+    Args:
+        block: 提供除二进制字段以外的列值, 其扩展字段应为 JSON 对象或为空
+        payload_file: 二进制内容所在文件, 以内存映射方式读取
+        field_name: 存放分块的二进制字段
+        chunk_size: 每个分块的字节数
+    """
+    if field_name not in BINARY_FIELDS:
+        raise ValueError(f"Invalid binary field: {field_name}")
+
+    extends = json.loads(block.扩展字段) if block.扩展字段 else {}
+    # 其余列只转换一次, 每个分块只替换二进制列与扩展字段, 之后的分块去掉文本列
+    base = blocks_to_record_batch([block])
+    field_index = MMDATA_SCHEMA.get_field_index(field_name)
+    extends_index = MMDATA_SCHEMA.get_field_index("扩展字段")
+    text_indexes = [MMDATA_SCHEMA.get_field_index(name) for name in TEXT_FIELDS]
+
+    with pa.memory_map(str(payload_file), "r") as source:
+        total_length = source.size()
+        chunk_count = max((total_length + chunk_size - 1) // chunk_size, 1)
+        for chunk_index in range(chunk_count):
+            chunk_offset = chunk_index * chunk_size
+            source.seek(chunk_offset)
+            buffer = source.read_buffer(min(chunk_size, total_length - chunk_offset))
+            chunk_extends = dict(extends, chunk_index=chunk_index, chunk_count=chunk_count,
+                                 chunk_offset=chunk_offset, total_length=total_length)
+            columns = list(base.columns)
+            columns[field_index] = _binary_array_from_buffer(buffer)
+            columns[extends_index] = pa.array([json.dumps(chunk_extends, ensure_ascii=False)],
+                                              type=pa.large_string())
+            if chunk_index > 0:
+                for index in text_indexes:
+                    columns[index] = pa.nulls(1, type=pa.large_string())
+            yield pa.RecordBatch.from_arrays(columns, schema=MMDATA_SCHEMA)
+
+
+def write_chunked_parquet(block: mmDataBlock, parquet_file: Path, payload_file: Path,
+                          field_name: str = "视频", chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          policy: WritePolicy = DEFAULT_WRITE_POLICY, stats: Optional[ShardStats] = None) -> int:
+    """将块以分块行写入 parquet 文件, 每个分块一个行组, 返回分块数
+
+    提供 stats 时在写入每个分块的同时累加统计
+    """
+    chunk_count = 0
+    with parquet.ParquetWriter(parquet_file, MMDATA_SCHEMA, **policy.writer_kwargs(MMDATA_SCHEMA)) as writer:
+        for record_batch in iter_chunk_record_batches(block, payload_file, field_name, chunk_size):
+            writer.write_batch(record_batch)
+            if stats is not None:
+                stats.update(record_batch)
+            chunk_count += 1
+    return chunk_count
+
+
+def _chunk_row_groups(parquet_file: parquet.ParquetFile, entity_id: str) -> List[tuple]:
+    """只读取 实体ID 与 扩展字段 列, 返回该实体每个分块行的 (行组, 行号, 分块信息)"""
+    rows = []
+    for row_group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=["实体ID", "扩展字段"])
+        for row, (row_entity_id, extends) in enumerate(zip(table.column("实体ID").to_pylist(),
+                                                           table.column("扩展字段").to_pylist())):
+            if row_entity_id != entity_id:
+                continue
+            chunk = json.loads(extends) if extends else {}
+            if "chunk_index" in chunk:
+                rows.append((row_group, row, chunk))
+    return sorted(rows, key=lambda item: item[2]["chunk_index"])
+
+
+def read_chunked_payload(parquet_file: Path, entity_id: str, field_name: str = "视频",
+                         start: int = 0, length: Optional[int] = None) -> bytes:
+    """重组分块存储的二进制内容, 可只读取 [start, start + length) 范围
+
+    只读取与范围重叠的分块所在的行组
+    """
+    source = parquet.ParquetFile(parquet_file)
+    chunks = _chunk_row_groups(source, entity_id)
+    if not chunks:
+        raise KeyError(f"未找到分块数据: {entity_id}")
+
+    total_length = chunks[0][2]["total_length"]
+    end = total_length if length is None else min(start + length, total_length)
+    parts = []
+    for row_group, row, chunk in chunks:
+        chunk_start = chunk["chunk_offset"]
+        if chunk_start >= end:
+            break
+        column = source.read_row_group(row_group, columns=[field_name]).column(0)
+        data = column[row].as_buffer()
+        if chunk_start + data.size <= start:
+            continue
+        lo = max(start - chunk_start, 0)
+        hi = min(end - chunk_start, data.size)
+        parts.append(data[lo:hi].to_pybytes())
+    return b"".join(parts)
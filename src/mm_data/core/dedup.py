@@ -0,0 +1,158 @@
+"""
+跨运行的内容去重索引
+
+1. content 表记录已入库内容的 md5, 转换器在读取、编码、写入之前查询
+2. files 表按 (路径, 大小, 修改时间) 缓存文件内容的 md5, 未变化的文件无需重新读取即可判断是否重复
+
+多进程转换时 worker 只读打开索引, 读取过的文件由 attach_files 附在返回的 RecordBatch 的 schema metadata 中,
+写入进程在 filter_record_batch 中记入 files 表, 与 content 表的记录一同随分片提交
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+import pyarrow as pa
+
+FILES_METADATA_KEY = b"mm_data.dedup_files"
+
+
+class DedupIndex:
+    """基于 SQLite 的内容去重索引
+
+    Args:
+        index_file: 索引文件路径, 不存在时自动创建
+        readonly: 只读模式, 供进程池 worker 查询使用, 新增记录只保存在内存中, 文件的 md5 由 attach_files 交给写入进程
+
+    同一实例可在多个线程间共享, 所有访问由内部锁串行化
+    """
+
+    def __init__(self, index_file: Path, readonly: bool = False):
+        self.index_file = Path(index_file)
+        self.readonly = readonly
+        # 本次运行新增但尚未提交的 md5, 同一运行内的重复内容也会被跳过
+        self._added: Set[str] = set()
+        # 只读模式下读取过的文件 (路径, 大小, 修改时间, md5)
+        self._files: List[Tuple[str, int, int, str]] = []
+        self._lock = threading.RLock()
+
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{self.index_file}?mode=ro", uri=True,
+                                         check_same_thread=False)
+        else:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.index_file, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS content (md5 TEXT PRIMARY KEY, entity_id TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, md5 TEXT)")
+            self._conn.commit()
+
+    def __contains__(self, md5: str) -> bool:
+        with self._lock:
+            if md5 in self._added:
+                return True
+            row = self._conn.execute("SELECT 1 FROM content WHERE md5 = ?", (md5,)).fetchone()
+            return row is not None
+
+    def add(self, md5: str, entity_id: str) -> None:
+        """记录已入库的内容"""
+        with self._lock:
+            self._added.add(md5)
+            if not self.readonly:
+                self._conn.execute("INSERT OR IGNORE INTO content (md5, entity_id) VALUES (?, ?)",
+                                   (md5, entity_id))
+
+    def known_md5(self, file_path: Path) -> Optional[str]:
+        """返回文件未变化时缓存的内容 md5, 不读取文件内容; 文件不存在或无法访问时返回 None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, md5 FROM files WHERE path = ?",
+                                     (str(Path(file_path).resolve()),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def remember_file(self, file_path: Path, md5: str) -> None:
+        """缓存文件内容的 md5, 下次运行时可通过 known_md5 直接获取; 只读模式下暂存, 见 attach_files"""
+        stat = os.stat(file_path)
+        entry = (str(Path(file_path).resolve()), stat.st_size, stat.st_mtime_ns, md5)
+        with self._lock:
+            if self.readonly:
+                self._files.append(entry)
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                                   entry)
+
+    def attach_files(self, record_batch: pa.RecordBatch) -> pa.RecordBatch:
+        """将只读模式下暂存的文件 md5 附在 RecordBatch 的 schema metadata 中, 由写入进程的 filter_record_batch 记录"""
+        with self._lock:
+            files, self._files = self._files, []
+        if not files:
+            return record_batch
+        metadata = dict(record_batch.schema.metadata or {})
+        metadata[FILES_METADATA_KEY] = json.dumps(files, ensure_ascii=False).encode("utf-8")
+        return record_batch.replace_schema_metadata(metadata)
+
+    def is_duplicate_file(self, file_path: Path) -> bool:
+        """文件未变化且内容已入库时返回 True"""
+        md5 = self.known_md5(file_path)
+        return md5 is not None and md5 in self
+
+    def filter_record_batch(self, record_batch: pa.RecordBatch) -> pa.RecordBatch:
+        """去掉 md5 已入库的行, 并将保留的行与 worker 附带的文件 md5 记入索引, 返回的 RecordBatch 不含附带信息"""
+        metadata = dict(record_batch.schema.metadata or {})
+        files = metadata.pop(FILES_METADATA_KEY, None)
+        if files is not None:
+            record_batch = record_batch.replace_schema_metadata(metadata or None)
+            if not self.readonly:
+                with self._lock:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO files (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                        [tuple(entry) for entry in json.loads(files)])
+        keep = []
+        for md5, entity_id in zip(record_batch.column("md5").to_pylist(),
+                                  record_batch.column("实体ID").to_pylist()):
+            duplicate = md5 in self
+            keep.append(not duplicate)
+            if not duplicate:
+                self.add(md5, entity_id)
+        if all(keep):
+            return record_batch
+        return record_batch.filter(pa.array(keep, type=pa.bool_()))
+
+    def commit(self) -> None:
+        """将新增记录写入磁盘, 应在包含这些内容的分片提交后调用, 中断时未提交的记录会回滚"""
+        if not self.readonly:
+            with self._lock:
+                self._conn.commit()
+
+    def rollback(self) -> None:
+        """丢弃尚未提交的新增记录"""
+        with self._lock:
+            if not self.readonly:
+                self._conn.rollback()
+            self._added.clear()
+            self._files = []
+
+    def close(self) -> None:
+        self.commit()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # 出错退出时新增记录所属的分片未提交, 不能标记为已入库
+        if exc_type is not None:
+            self.rollback()
+        self.close()
@@ -1,12 +1,86 @@
 
 from pathlib import Path
-from typing import Tuple
+from typing import Iterable, Iterator, Optional, Tuple
 from PIL import Image as PILImage
 from loguru import logger
 import io
+import json
+import struct
+import subprocess
+import numpy as np
 
-def get_img_bytes_and_size(img_path: Path) -> Tuple[bytes, Tuple[int, int]]:
-    """将图片文件转换为二进制格式
+from . import metrics
+
+# JPEG 中携带图像尺寸的 SOF 标记 (排除 DHT/JPG/DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# 不带长度字段的 JPEG 标记
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9}
+
+
+def _get_jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """遍历 JPEG 段直到 SOF 标记, 读取宽高"""
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # 填充字节
+            i += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        segment_length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        i += 2 + segment_length
+    return None
+
+
+def _get_webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """按 VP8/VP8L/VP8X 三种子格式读取 WebP 宽高"""
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        b0, b1, b2, b3 = data[21:25]
+        width = 1 + (((b1 & 0x3F) << 8) | b0)
+        height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        return width, height
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = 1 + int.from_bytes(data[24:27], "little")
+        height = 1 + int.from_bytes(data[27:30], "little")
+        return width, height
+    return None
+
+
+def get_img_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """只解析容器头部获取图片宽高, 不解码像素
+
+    Args:
+        data: 图片文件的二进制数据
+
+    Returns:
+        Tuple[int, int]: 图片的宽度和高度, 无法识别的格式或头部不完整时返回 None
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _get_jpeg_size(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _get_webp_size(data)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    return None
+
+
+def get_img_bytes_and_size(img_path: Path) -> Optional[Tuple[bytes, Tuple[int, int]]]:
+    """读取图片文件的原始二进制数据, 并从头部读取尺寸
+
+    不解码也不重新编码图片, 仅在头部无法解析时回退到 PIL 读取尺寸
 
     Args:
         img_path: 图片文件路径
@@ -14,40 +88,96 @@ def get_img_bytes_and_size(img_path: Path) -> Tuple[bytes, Tuple[int, int]]:
     Returns:
         bytes: 图片文件的二进制数据
         Tuple[int, int]: 图片的宽度和高度
+        读取或解析失败时记录错误并返回 None
     """
     try:
-        with open(img_path, 'rb') as file:
-            image = PILImage.open(file)
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format=image.format)
-            img_byte_arr = img_byte_arr.getvalue()
-        return img_byte_arr, image.size
+        with metrics.timer("read_image"):
+            img_bytes = Path(img_path).read_bytes()
+        metrics.count("image_bytes", len(img_bytes))
+        img_size = get_img_size(img_bytes)
+        if img_size is None:
+            with metrics.timer("pil_image_size"), PILImage.open(io.BytesIO(img_bytes)) as image:
+                img_size = image.size
+        return img_bytes, img_size
     except Exception as e:
-        logger.error(f"图片转换二进制失败: {e}")
+        logger.error(f"图片转换二进制失败: {img_path}: {e}")
         return None
 
-def get_pdf_bytes(pdf_path: Path) -> bytes:
-    """将PDF文件转换为二进制格式
+
+def iter_img_bytes_and_size(img_paths: Iterable[Path]) -> Iterator[Tuple[Path, bytes, Tuple[int, int]]]:
+    """按输入顺序逐个读取图片, 产出 (路径, 二进制数据, (宽, 高)), 无法读取的图片记录错误并计数后跳过
+
+    Args:
+        img_paths: 图片文件路径列表, 如一个文档的全部页面
+    """
+    for img_path in img_paths:
+        item = get_img_bytes_and_size(img_path)
+        if item is None:
+            metrics.count("unreadable_images")
+            continue
+        yield (img_path, *item)
+
+def get_pdf_bytes(pdf_path: Path) -> Optional[bytes]:
+    """一次读取 PDF 文件的二进制数据, 不经过中间缓冲区复制
 
     Args:
         pdf_path: PDF文件路径
 
     Returns:
-        bytes: PDF文件的二进制数据
+        bytes: PDF文件的二进制数据, 读取失败时记录错误并返回 None
     """
     try:
-        # 打开PDF文件
-        with open(pdf_path, 'rb') as file:
-            # 创建二进制缓冲区
-            pdf_byte_arr = io.BytesIO()
-            # 将PDF内容写入缓冲区
-            pdf_byte_arr.write(file.read())
-            # 获取二进制数据
-            pdf_binary = pdf_byte_arr.getvalue()
-
-        return pdf_binary
-
+        return Path(pdf_path).read_bytes()
     except Exception as e:
         logger.error(f"PDF转换二进制失败: {e}")
         return None
-    
+
+def check_json_text(text: str, check: str = "structure") -> None:
+    """检查原样保存的 JSON 文本, 不合格时抛出 ValueError
+
+    Args:
+        check: none 不检查; structure 只检查首尾为对象括号, 开销与文件大小无关;
+            full 用 json.loads 完整解析, 结果直接丢弃
+    """
+    if check == "none":
+        return
+    if check == "structure":
+        head = text[:64].lstrip()
+        tail = text[-64:].rstrip()
+        if not head.startswith("{") or not tail.endswith("}"):
+            raise ValueError("JSON 文本不是一个对象")
+    elif check == "full":
+        try:
+            json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON 解析失败: {e}")
+    else:
+        raise ValueError(f"Invalid json check: {check}")
+
+# whisperx 等语音模型使用的采样率
+AUDIO_SAMPLE_RATE = 16000
+
+def load_audio(media_path: Path, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """通过 ffmpeg 管道将音视频文件的音轨直接解码为单声道 float32 数组
+
+    不写任何临时文件, 也不经过有损的中间编码
+
+    Args:
+        media_path: 音频或视频文件路径
+        sample_rate: 目标采样率
+
+    Returns:
+        np.ndarray: 取值范围 [-1, 1] 的 float32 采样数组, 时长为 len / sample_rate
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", str(media_path),
+        "-vn", "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-",
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"音频解码失败: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(result.stdout, dtype=np.float32)
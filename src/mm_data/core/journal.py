@@ -0,0 +1,76 @@
+"""
+转换断点日志
+
+日志与输出文件放在同一目录, 每提交一个分片追加一行 JSON:
+{"split": 0, "shard": "out_0.parquet", "rows": 1200, "inputs": ["a.pdf", "b.pdf"]}
+分片先写入临时文件并在完成后重命名, 因此日志中出现的分片一定是完整的
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+
+class ConversionJournal:
+    """记录已提交的分片及其输入, 用于 --resume 断点续跑
+
+    Args:
+        journal_file: 日志文件路径
+    """
+
+    def __init__(self, journal_file: Path):
+        self.journal_file = Path(journal_file)
+        self.committed_inputs: Set[str] = set()
+        self.next_split = 0
+
+    @classmethod
+    def for_output(cls, output_file: Path) -> "ConversionJournal":
+        """输出文件 out.parquet 对应的日志为同目录下的 out.journal.jsonl"""
+        output_file = Path(output_file)
+        return cls(output_file.parent / f"{output_file.stem}.journal.jsonl")
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """按提交顺序读取日志记录, 忽略崩溃时写了一半的最后一行"""
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+
+    def load(self) -> "ConversionJournal":
+        """读取已有日志"""
+        for record in self.records():
+            self.committed_inputs.update(record["inputs"])
+            if record.get("split") is not None:
+                self.next_split = max(self.next_split, record["split"] + 1)
+        return self
+
+    def reset(self) -> "ConversionJournal":
+        """不续跑时清空日志"""
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        self.journal_file.write_text("", encoding="utf-8")
+        self.committed_inputs = set()
+        self.next_split = 0
+        return self
+
+    def is_committed(self, input_name: str) -> bool:
+        return input_name in self.committed_inputs
+
+    def record(self, split: Optional[int], shard_file: Optional[Path], inputs: List[str], rows: int) -> None:
+        """分片重命名完成后追加一条记录并落盘"""
+        record = {
+            "split": split,
+            "shard": shard_file.name if shard_file is not None else None,
+            "rows": rows,
+            "inputs": inputs,
+        }
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_file, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.committed_inputs.update(inputs)
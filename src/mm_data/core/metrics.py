@@ -0,0 +1,177 @@
+"""
+阶段计时与计数
+
+    from mm_data.core import metrics
+
+    metrics.enable(log_interval=30, prometheus_file=Path("logs/mm_data.prom"))
+    with metrics.timer("read_image"):
+        ...
+    metrics.count("image_bytes", len(data))
+    metrics.gauge("write_queue_depth", write_queue.qsize())
+    metrics.shutdown()
+
+未启用时 timer 返回共享的空上下文, count/gauge 直接返回, 开销接近于零.
+指标只在当前进程内累计, 进程池 worker 中的调用不会汇总到主进程.
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+_NULL_TIMER = nullcontext()
+
+_enabled = False
+_lock = threading.Lock()
+_timers: Dict[str, list] = {}  # name -> [调用次数, 总耗时, 最大耗时]
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_reporter: Optional[threading.Thread] = None
+_stop = threading.Event()
+_prometheus_file: Optional[Path] = None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stat = _timers.setdefault(self.name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] = max(stat[2], elapsed)
+
+
+def timer(name: str):
+    """阶段计时上下文"""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def count(name: str, value: float = 1) -> None:
+    """累加计数, 如字节数与行数"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name: str, value: float) -> None:
+    """记录当前值, 如队列深度"""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "timers": {name: {"calls": calls, "seconds": total, "max_seconds": longest}
+                       for name, (calls, total, longest) in _timers.items()},
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+        }
+
+
+def summary() -> str:
+    """单行摘要, 计时按总耗时降序"""
+    data = snapshot()
+    timers = sorted(data["timers"].items(), key=lambda item: -item[1]["seconds"])
+    parts = [f"{name} {stat['seconds']:.2f}s/{stat['calls']}" for name, stat in timers]
+    parts += [f"{name}={value:g}" for name, value in sorted(data["counters"].items())]
+    parts += [f"{name}~{value:g}" for name, value in sorted(data["gauges"].items())]
+    return ", ".join(parts)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def to_prometheus() -> str:
+    """Prometheus 文本格式, 供 node_exporter textfile collector 读取"""
+    data = snapshot()
+    lines = [
+        "# TYPE mm_data_stage_seconds_total counter",
+        *(f'mm_data_stage_seconds_total{{stage="{name}"}} {stat["seconds"]}'
+          for name, stat in data["timers"].items()),
+        "# TYPE mm_data_stage_calls_total counter",
+        *(f'mm_data_stage_calls_total{{stage="{name}"}} {stat["calls"]}'
+          for name, stat in data["timers"].items()),
+    ]
+    for name, value in data["counters"].items():
+        lines += [f"# TYPE mm_data_{_metric_name(name)}_total counter", f"mm_data_{_metric_name(name)}_total {value}"]
+    for name, value in data["gauges"].items():
+        lines += [f"# TYPE mm_data_{_metric_name(name)} gauge", f"mm_data_{_metric_name(name)} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _write_prometheus() -> None:
+    """先写临时文件再重命名, 采集方不会读到写了一半的文件"""
+    _prometheus_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _prometheus_file.parent / f"{_prometheus_file.name}.tmp"
+    temp_file.write_text(to_prometheus(), encoding="utf-8")
+    os.replace(temp_file, _prometheus_file)
+
+
+def _report(log_interval: float) -> None:
+    while not _stop.wait(log_interval):
+        logger.info(f"metrics: {summary()}")
+        if _prometheus_file is not None:
+            _write_prometheus()
+
+
+def enable(log_interval: Optional[float] = None, prometheus_file: Optional[Path] = None) -> None:
+    """开始收集指标
+
+    Args:
+        log_interval: 每隔多少秒在日志中输出摘要 (同时刷新 prometheus_file), None 时只在 shutdown 时输出
+        prometheus_file: Prometheus 文本格式输出文件
+    """
+    global _enabled, _reporter, _prometheus_file
+    _enabled = True
+    _prometheus_file = Path(prometheus_file) if prometheus_file is not None else None
+    if log_interval and _reporter is None:
+        _stop.clear()
+        _reporter = threading.Thread(target=_report, args=(log_interval,), name="metrics-reporter", daemon=True)
+        _reporter.start()
+
+
+def shutdown() -> None:
+    """停止定期输出, 输出最终摘要并关闭收集"""
+    global _enabled, _reporter
+    if not _enabled:
+        return
+    _stop.set()
+    if _reporter is not None:
+        _reporter.join()
+        _reporter = None
+    logger.info(f"metrics: {summary()}")
+    if _prometheus_file is not None:
+        _write_prometheus()
+    _enabled = False
+
+
+def reset() -> None:
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _gauges.clear()
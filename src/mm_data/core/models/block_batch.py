@@ -0,0 +1,137 @@
+"""
+列式块容器
+
+按字段保存多行块数据, 转换为 Arrow 数组后整列校验 (与 mmDataBlock.__post_init__ 规则相同),
+再直接交给 ShardWriter 写入, 不需要为每一行构建块对象.
+串行转换时文档的行由 BlockBatchStream 惰性追加, 每 BLOCKS_PER_RECORD_BATCH 行转换一次
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .. import metrics
+from .mmdata_block import get_md5, get_timestamp, mmDataBlock
+from ..writer import BLOCKS_PER_RECORD_BATCH, MMDATA_SCHEMA, _to_column_value
+
+FIELD_NAMES = tuple(f.name for f in MMDATA_SCHEMA)
+
+
+class BlockBatch:
+    """列式存储的一批块
+
+    Example:
+        batch = BlockBatch()
+        batch.append(实体ID="a.png", 块ID=0, 块类型="image-text-pair", 图片=data, 文本=text)
+        writer.write_batch(batch.to_record_batch(), source="a.pdf")
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, List[Any]] = {name: [] for name in FIELD_NAMES}
+
+    def __len__(self) -> int:
+        return len(self._columns["实体ID"])
+
+    def append(self, **values: Any) -> None:
+        """追加一行, 未给出的字段为空, 校验推迟到 to_record_batch 时整列进行"""
+        unknown = values.keys() - self._columns.keys()
+        if unknown:
+            raise ValueError(f"未知字段: {sorted(unknown)}")
+        for name, column in self._columns.items():
+            column.append(_to_column_value(name, values.get(name)))
+
+    def append_block(self, block: mmDataBlock) -> None:
+        for name, column in self._columns.items():
+            column.append(_to_column_value(name, getattr(block, name)))
+
+    def extend(self, blocks: Iterable[mmDataBlock]) -> None:
+        for block in blocks:
+            self.append_block(block)
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[mmDataBlock]) -> "BlockBatch":
+        batch = cls()
+        batch.extend(blocks)
+        return batch
+
+    def clear(self) -> None:
+        for column in self._columns.values():
+            column.clear()
+
+    def _entity_ids(self) -> pa.Array:
+        entity_ids = pa.array(self._columns["实体ID"], type=pa.string())
+        if pc.any(pc.fill_null(pc.equal(entity_ids, ""), True)).as_py():
+            raise ValueError("实体ID不能为空")
+        return entity_ids
+
+    def _block_types(self) -> pa.Array:
+        block_types = pa.array(self._columns["块类型"], type=pa.string())
+        if pc.any(pc.fill_null(pc.equal(block_types, ""), True)).as_py():
+            raise ValueError("块类型不能为空")
+        return block_types
+
+    def _block_ids(self) -> pa.Array:
+        try:
+            block_ids = pa.array(self._columns["块ID"])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            raise TypeError("块ID必须是整数类型")
+        if len(block_ids) and (not pa.types.is_integer(block_ids.type) or block_ids.null_count):
+            raise TypeError("块ID必须是整数类型")
+        return block_ids.cast(pa.int64())
+
+    def _md5s(self, entity_ids: pa.Array) -> pa.Array:
+        """未提供 md5 的行使用 实体ID 的 md5"""
+        md5s = pa.array(self._columns["md5"], type=pa.string())
+        missing = pc.fill_null(pc.equal(md5s, ""), True)
+        if not pc.any(missing).as_py():
+            return md5s
+        filled = [get_md5(entity_id) if is_missing else md5
+                  for md5, entity_id, is_missing in zip(md5s.to_pylist(), entity_ids.to_pylist(),
+                                                         missing.to_pylist())]
+        return pa.array(filled, type=pa.string())
+
+    def to_record_batch(self) -> pa.RecordBatch:
+        """整列校验并转换为 RecordBatch"""
+        if len(self) == 0:
+            return pa.RecordBatch.from_pylist([], schema=MMDATA_SCHEMA)
+        entity_ids = self._entity_ids()
+        columns = {
+            "实体ID": entity_ids,
+            "md5": self._md5s(entity_ids),
+            "块ID": self._block_ids(),
+            "块类型": self._block_types(),
+            "时间": pc.fill_null(pa.array(self._columns["时间"], type=pa.string()), get_timestamp()),
+        }
+        arrays = [columns[f.name] if f.name in columns else pa.array(self._columns[f.name], type=f.type)
+                  for f in MMDATA_SCHEMA]
+        return pa.RecordBatch.from_arrays(arrays, schema=MMDATA_SCHEMA)
+
+
+class BlockBatchStream:
+    """惰性产出行字段的一个批次 (通常为一个文档), 交给 ShardWriter.write_batch 写入
+
+    每 rows_per_batch 行追加到 BlockBatch 后整列校验并转换为 RecordBatch, 内存中最多保留 rows_per_batch 行
+
+    Args:
+        rows: 行字段迭代器, 字段同 BlockBatch.append
+        rows_per_batch: 每个 RecordBatch 的行数
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], rows_per_batch: int = BLOCKS_PER_RECORD_BATCH):
+        self.rows = rows
+        self.rows_per_batch = rows_per_batch
+
+    def record_batches(self) -> Iterator[pa.RecordBatch]:
+        batch = BlockBatch()
+        for row in self.rows:
+            batch.append(**row)
+            if len(batch) >= self.rows_per_batch:
+                with metrics.timer("to_record_batch"):
+                    record_batch = batch.to_record_batch()
+                batch.clear()
+                yield record_batch
+        if len(batch):
+            with metrics.timer("to_record_batch"):
+                record_batch = batch.to_record_batch()
+            yield record_batch
@@ -1,12 +1,15 @@
-from src.mm_data.core.models.mmdata_block import mmDataBlock
+from .mmdata_block import mmDataBlock
 from pathlib import Path
-from typing import List
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as parquet
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from loguru import logger
-from src.mm_data.core.file_handlers import get_pdf_bytes, get_img_bytes_and_size
-from src.mm_data.core.processor import get_md5
+from ..file_handlers import check_json_text, get_img_bytes_and_size, get_pdf_bytes
+from ..processor import get_bytes_md5, batch_to_parquet  # noqa: F401
+from ..dedup import DedupIndex
+from .. import metrics
+from ..prefetch import DEFAULT_PREFETCH_BYTES, DEFAULT_PREFETCH_WORKERS, list_pages, prefetch
+from .block_batch import BlockBatch, BlockBatchStream
+from ..transcode import TranscodeOptions, Transcoder
+import pyarrow as pa
 import json
 
 """
@@ -22,60 +25,114 @@ Chinaxiv 数据
 
 class ChinaxivBlock(mmDataBlock):
     """ Chinaxiv 数据块 """
+    __slots__ = ()
+
     def __repr__(self):
         return f"ChinaxivBlock(实体ID={self.实体ID}, 块ID={self.块ID}, 块类型={self.块类型}, 时间={self.时间}, 扩展字段={self.扩展字段})"
 
-def chinaxiv_to_pdf_blocks(input_file: Path) -> List[ChinaxivBlock]:
-    """将 Chinaxiv 文件转换为 ChinaxivPDFBlock 列表"""
+def _iter_pdf_rows(input_file: Path, dedup: Optional[DedupIndex] = None,
+                   json_check: str = "structure") -> Iterator[Dict[str, Any]]:
+    """逐个生成 PDF 块的字段, 提供 dedup 时跳过已入库的 PDF
+
+    docling 的 .json 与 .md 各一次读取后原样写入 扩展字段 与 文本, 不解析为 Python 对象;
+    json_check 见 check_json_text
+    """
     docling_output_dir = input_file.parent / \
         f"{input_file.stem}_docling_output"
     
-    blocks, block_id = [], 0
+    block_count, block_id = 0, 0
     
     # 读取 docling_output_dir 下的所有文件
     pdf_file = input_file
     
+    if dedup is not None and dedup.is_duplicate_file(pdf_file):
+        logger.info(f"skip {input_file}, content already ingested")
+        return
+    
     pdf_data = get_pdf_bytes(pdf_file)
+    if pdf_data is None:
+        logger.warning(f"skip unreadable pdf {pdf_file}")
+        metrics.count("unreadable_pdfs")
+        return
     pdf_name = pdf_file.name
+    pdf_md5 = get_bytes_md5(pdf_data)
+    
+    if dedup is not None:
+        dedup.remember_file(pdf_file, pdf_md5)
+        if pdf_md5 in dedup:
+            logger.info(f"skip {input_file}, content already ingested")
+            return
+        dedup.add(pdf_md5, pdf_name)
     
     json_file = docling_output_dir / (input_file.stem + ".json")
-    json_data = json.load(json_file.open("r", encoding="utf-8"))
+    json_data = json_file.read_text(encoding="utf-8")
+    check_json_text(json_data, json_check)
     
     md_file = docling_output_dir / (input_file.stem + ".md")
-    md_data = md_file.open("r", encoding="utf-8").read()
+    md_data = md_file.read_text(encoding="utf-8")
     
-    blocks.append(ChinaxivBlock(
+    yield dict(
         实体ID=pdf_name,
         块ID=block_id,
         块类型="pdf",
         扩展字段=json_data,
         图片=pdf_data,
-        文本=md_data
-    ))
+        文本=md_data,
+        md5=pdf_md5
+    )
+    block_count += 1
     
     logger.info(
-        f"process {input_file} done, {len(blocks)} blocks generated")
-    
-    return blocks
+        f"process {input_file} done, {block_count} blocks generated")
 
-def chinaxiv_to_image_text_pair_blocks(input_file: Path) -> List[ChinaxivBlock]:
-    """将 Chinaxiv 文件转换为 ChinaxivImageTextPairBlock 列表"""
-    docling_output_dir = input_file.parent / \
-        f"{input_file.stem}_docling_output"
-    
-    blocks, block_id = [], 0
-
-    pages_dir = docling_output_dir / "pages"
-    img_files = sorted(list(pages_dir.glob("*.png")),
-                       key=lambda x: int(x.stem.split("page-")[1]))  # 按页码排序
-    md_files = sorted(list(pages_dir.glob("*.md")),
-                      key=lambda x: int(x.stem.split("page-")[1]))  # 按页码排序
-    assert len(img_files) == len(md_files), logger.error(
-        f"The number of image files and md files is {len(img_files)}")
-    
-    for page_id, (img_file, md_file) in enumerate(zip(img_files, md_files)):
-        img_data, img_size = get_img_bytes_and_size(img_file)
-        md_data = md_file.open("r", encoding="utf-8").read()
+def iter_chinaxiv_to_pdf_blocks(input_file: Path, dedup: Optional[DedupIndex] = None,
+                                json_check: str = "structure") -> Iterator[ChinaxivBlock]:
+    """将 Chinaxiv 文件逐个转换为 ChinaxivPDFBlock, 提供 dedup 时跳过已入库的 PDF"""
+    for row in _iter_pdf_rows(input_file, dedup, json_check):
+        yield ChinaxivBlock(**row)
+
+def chinaxiv_to_pdf_blocks(input_file: Path, dedup: Optional[DedupIndex] = None) -> List[ChinaxivBlock]:
+    """将 Chinaxiv 文件转换为 ChinaxivPDFBlock 列表"""
+    return list(iter_chinaxiv_to_pdf_blocks(input_file, dedup))
+
+def _page_tasks(input_file: Path, dedup: Optional[DedupIndex] = None) -> List[Tuple[int, Path, Path, int]]:
+    """列出文档的 (page_id, 图片, 文本, 字节数), 提供 dedup 时去掉文件未变化且已入库的页"""
+    pages_dir = input_file.parent / f"{input_file.stem}_docling_output" / "pages"
+    tasks = [(page_id, img_file, md_file, size)
+             for page_id, (img_file, md_file, size) in enumerate(list_pages(pages_dir))]
+    if dedup is not None:
+        tasks = [task for task in tasks if not dedup.is_duplicate_file(task[1])]
+    return tasks
+
+def _load_page(task: Tuple[int, Path, Path, int]) -> Tuple[Optional[Tuple[bytes, Tuple[int, int]]], str]:
+    """在预读线程中读取一页的图片与文本, 图片无法读取时为 None"""
+    _, img_file, md_file, _ = task
+    img_item = get_img_bytes_and_size(img_file)
+    with metrics.timer("read_text"):
+        md_data = md_file.read_text(encoding="utf-8")
+    return img_item, md_data
+
+def _page_size(task: Tuple[int, Path, Path, int]) -> int:
+    return task[3]
+
+def _page_rows(input_file: Path, pages: Iterator[Tuple[Tuple[int, Path, Path, int], tuple]],
+               dedup: Optional[DedupIndex] = None) -> Iterator[Dict[str, Any]]:
+    """由已读取的页生成 image-text pair 块的字段, 图片无法读取或内容已入库的页跳过"""
+    block_count, block_id = 0, 0
+
+    for (page_id, img_file, _, _), (img_item, md_data) in pages:
+        if img_item is None:
+            logger.warning(f"skip unreadable page image {img_file}")
+            metrics.count("unreadable_images")
+            continue
+        img_data, img_size = img_item
+        with metrics.timer("hash_image"):
+            img_md5 = get_bytes_md5(img_data)
+        if dedup is not None:
+            dedup.remember_file(img_file, img_md5)
+            if img_md5 in dedup:
+                continue
+            dedup.add(img_md5, img_file.name)
         
         json_data = {
             "page_id": page_id,
@@ -86,66 +143,145 @@ def chinaxiv_to_image_text_pair_blocks(input_file: Path) -> List[ChinaxivBlock]:
             "page_text_length": len(md_data),
         }
         
-        blocks.append(ChinaxivBlock(
+        yield dict(
             实体ID=img_file.name,
             块ID=block_id,
             块类型="image-text-pair",
             扩展字段=json.dumps(json_data),
             图片=img_data,
             文本=md_data,
-            md5=get_md5(img_file.name)
-        ))
+            md5=img_md5
+        )
+        block_count += 1
         
     logger.info(
-        f"process {input_file} done, {len(blocks)} blocks generated")
-    
-    return blocks
-    
-def get_blocks(input_file: Path, block_type: str) -> List[ChinaxivBlock]:
+        f"process {input_file} done, {block_count} blocks generated")
+
+def _iter_image_text_pair_rows(input_file: Path, dedup: Optional[DedupIndex] = None,
+                               prefetch_workers: int = DEFAULT_PREFETCH_WORKERS,
+                               prefetch_bytes: int = DEFAULT_PREFETCH_BYTES,
+                               transcoder: Optional[Transcoder] = None) -> Iterator[Dict[str, Any]]:
+    """逐页生成 image-text pair 块的字段, 后续页面在线程池中预读, 在途数据不超过 prefetch_bytes
+
+    提供 dedup 时, 图片内容已入库的页在读取之前或读取之后立即跳过; 提供 transcoder 时页面图片被转码
+    """
+    pages = prefetch(_page_tasks(input_file, dedup), _load_page, _page_size,
+                     prefetch_workers, prefetch_bytes)
+    rows = _page_rows(input_file, pages, dedup)
+    return transcoder.map_rows(rows) if transcoder is not None else rows
+
+def iter_chinaxiv_to_image_text_pair_blocks(input_file: Path, dedup: Optional[DedupIndex] = None,
+                                            transcoder: Optional[Transcoder] = None) -> Iterator[ChinaxivBlock]:
+    """将 Chinaxiv 文件逐页转换为 ChinaxivImageTextPairBlock, 提供 dedup 时跳过已入库的页"""
+    for row in _iter_image_text_pair_rows(input_file, dedup, transcoder=transcoder):
+        yield ChinaxivBlock(**row)
+
+def chinaxiv_to_image_text_pair_blocks(input_file: Path, dedup: Optional[DedupIndex] = None) -> List[ChinaxivBlock]:
+    """将 Chinaxiv 文件转换为 ChinaxivImageTextPairBlock 列表"""
+    return list(iter_chinaxiv_to_image_text_pair_blocks(input_file, dedup))
+
+def _document_page_tasks(input_files: Iterable[Path], dedup: Optional[DedupIndex] = None):
+    """展开为 (文档, 页, 错误) 序列, 每个文档以 (文档, None, 错误) 开始
+
+    预读会提前列出后续文档的页面, 列出失败时错误随开始标记保存, 到该文档被消费时才抛出,
+    避免之前文档所在的分片因后续文档出错而无法提交
+    """
+    for input_file in input_files:
+        try:
+            tasks = _page_tasks(input_file, dedup)
+        except Exception as error:
+            yield input_file, None, error
+            continue
+        yield input_file, None, None
+        for task in tasks:
+            yield input_file, task, None
+
+def iter_image_text_pair_documents(input_files: Iterable[Path], dedup: Optional[DedupIndex] = None,
+                                   prefetch_workers: int = DEFAULT_PREFETCH_WORKERS,
+                                   prefetch_bytes: int = DEFAULT_PREFETCH_BYTES,
+                                   transcoder: Optional[Transcoder] = None) -> Iterator[BlockBatchStream]:
+    """按文档逐个产出 BlockBatchStream, 预读跨越文档边界: 处理当前文档时已在读取后续文档的页面
+
+    每个文档都会产出一个批次 (可能为空), 与 input_files 一一对应; 调用方未读完的页面会被跳过.
+    列出某个文档的页面失败时, 错误在读取该文档的迭代器时抛出.
+    提供 transcoder 时页面图片在其进程池中转码
+    """
+    stream = prefetch(_document_page_tasks(input_files, dedup),
+                      lambda item: _load_page(item[1]) if item[1] is not None else None,
+                      lambda item: _page_size(item[1]) if item[1] is not None else 0,
+                      prefetch_workers, prefetch_bytes)
+    current = next(stream, None)
+    while current is not None:
+        input_file, _, error = current[0]
+
+        def pages():
+            nonlocal current
+            if error is not None:
+                raise error
+            current = next(stream, None)
+            while current is not None and current[0][1] is not None:
+                yield current[0][1], current[1]
+                current = next(stream, None)
+
+        document_pages = pages()
+        rows = _page_rows(input_file, document_pages, dedup)
+        if transcoder is not None:
+            rows = transcoder.map_rows(rows)
+        yield BlockBatchStream(_timed_rows(rows))
+        # 推进到下一个文档的开始标记
+        for _ in document_pages:
+            pass
+
+def _timed_rows(rows: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """按块计入 get_blocks 阶段耗时 (读取, 哈希, 转码) 与 blocks 计数, 不含调用方写入的时间"""
+    while True:
+        with metrics.timer("get_blocks"):
+            row = next(rows, None)
+        if row is None:
+            return
+        metrics.count("blocks")
+        yield row
+
+def _iter_rows(input_file: Path, block_type: str, dedup: Optional[DedupIndex] = None,
+               transcoder: Optional[Transcoder] = None, json_check: str = "structure") -> Iterator[Dict[str, Any]]:
     if block_type == "pdf":
-        return chinaxiv_to_pdf_blocks(input_file)
+        return _timed_rows(_iter_pdf_rows(input_file, dedup, json_check))
     elif block_type == "image-text-pair":
-        return chinaxiv_to_image_text_pair_blocks(input_file)
+        return _timed_rows(_iter_image_text_pair_rows(input_file, dedup, transcoder=transcoder))
     else:
         raise ValueError(f"Invalid block type: {block_type}")
-    
-def batch_to_parquet(output_file: Path, split_size: int, batchs: List[List[ChinaxivBlock]]):
-    # 将 rows 写入 parquet 文件
-    batch_rows = []
-    # 将 batchs 按 split_size 分割，
-    # 当 batch 长度大于 split_size 时，将 batch 写入 parquet 文件
-    # 当 batch 长度小于 split_size 时，继续追加 batch_rows
-    batch_count = 0
-    split_count = 0
-    for batch in batchs:
-        batch_count += 1
-        batch_rows.extend(batch)
-        if batch_count >= split_size:
-            df = pd.DataFrame([row.to_dict() for row in batch_rows])
-            output_file_split = output_file.parent / \
-                f"{output_file.stem}_{split_count}.parquet"
-            # 使用 pyarrow 引擎
-            table = pa.Table.from_pandas(df)
-            # 保存为 parquet
-            parquet.write_table(table,
-                                output_file_split,
-                                compression='zstd',  # 可选: 'snappy', 'gzip', 'brotli', 'zstd', 'lz4'
-                                row_group_size=100000  # 优化读写性能的行组大小
-                                )
-            logger.info(
-                f"batch {split_count} done, {output_file_split} generated")
-            batch_rows = []
-            batch_count = 0
-            split_count += 1
-
-    # 处理最后一个 batch
-    if batch_rows:
-        df = pd.DataFrame([row.to_dict() for row in batch_rows])
-        output_file_last = output_file.parent / f"{output_file.stem}_{split_count}.parquet"
-        table = pa.Table.from_pandas(df)
-        parquet.write_table(table,
-                            output_file_last,
-                            compression='zstd',  # 可选: 'snappy', 'gzip', 'brotli', 'zstd', 'lz4'
-                            row_group_size=100000  # 优化读写性能的行组大小
-                            )
-        logger.info(f"batch {split_count} done, {output_file_last} generated")
\ No newline at end of file
+
+def iter_blocks(input_file: Path, block_type: str, dedup: Optional[DedupIndex] = None,
+                transcoder: Optional[Transcoder] = None, json_check: str = "structure") -> Iterator[ChinaxivBlock]:
+    """按块类型逐个生成块, 供流式写入使用"""
+    rows = _iter_rows(input_file, block_type, dedup, transcoder, json_check)
+    return (ChinaxivBlock(**row) for row in rows)
+
+def iter_block_batch(input_file: Path, block_type: str, dedup: Optional[DedupIndex] = None,
+                     transcoder: Optional[Transcoder] = None, json_check: str = "structure") -> BlockBatchStream:
+    """按块类型惰性生成一个文档的行, 写入时经 BlockBatch 整列转换, 不构建块对象"""
+    return BlockBatchStream(_iter_rows(input_file, block_type, dedup, transcoder, json_check))
+
+def get_blocks(input_file: Path, block_type: str, dedup: Optional[DedupIndex] = None) -> List[ChinaxivBlock]:
+    return list(iter_blocks(input_file, block_type, dedup))
+
+def chinaxiv_to_record_batch(input_file: Path, block_type: str, dedup_file: Optional[Path] = None,
+                             transcode: Optional[TranscodeOptions] = None,
+                             json_check: str = "structure") -> pa.RecordBatch:
+    """将 Chinaxiv 文件转换为列格式的 RecordBatch, 供进程池 worker 返回给写入进程
+
+    字段直接追加到 BlockBatch 并整列校验, 不构建块对象;
+    worker 以只读方式打开去重索引, 仅用于提前跳过已入库的内容, 由写入进程负责记录,
+    读取过的文件的 md5 附在返回的 RecordBatch 中 (见 DedupIndex.attach_files);
+    worker 本身已在进程池中, 转码在 worker 内顺序执行
+    """
+    batch = BlockBatch()
+    transcoder = Transcoder(transcode) if transcode is not None else None
+    if dedup_file is None:
+        for row in _iter_rows(input_file, block_type, transcoder=transcoder, json_check=json_check):
+            batch.append(**row)
+        return batch.to_record_batch()
+    with DedupIndex(dedup_file, readonly=True) as dedup:
+        for row in _iter_rows(input_file, block_type, dedup, transcoder, json_check):
+            batch.append(**row)
+        return dedup.attach_files(batch.to_record_batch())
@@ -5,7 +5,7 @@ import base64
 import hashlib
 import json
 from typing import Dict, Any, Optional
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 
 
@@ -17,9 +17,12 @@ def get_md5(text: str) -> str:
     return hashlib.md5(text.encode()).hexdigest()
 
 
-@dataclass
+@dataclass(slots=True)
 class mmDataBlock:
-    """Base class for data blocks with customizable field mapping"""
+    """Base class for data blocks with customizable field mapping
+
+    使用 __slots__ 存储字段, 大量块对象不再各自持有 __dict__; 批量构建时使用 BlockBatch
+    """
     # 必填字段
     实体ID: str
     md5: str
@@ -78,7 +81,8 @@ class mmDataBlock:
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典，处理二进制数据的序列化"""
         result = {}
-        for field_name, value in self.__dict__.items():
+        for f in fields(self):
+            field_name, value = f.name, getattr(self, f.name)
             if value is None:
                 result[field_name] = None
             elif isinstance(value, bytes):
@@ -97,8 +101,9 @@ class mmDataBlock:
         """从JSON字符串创建实例"""
         try:
             data_dict = json.loads(json_str)
+            names = {f.name for f in fields(cls)}
             instance = cls(**{k: v for k, v in data_dict.items()
-                              if k in cls.__annotations__})
+                              if k in names})
             return instance
         except Exception as e:
             raise ValueError(f"从JSON创建实例失败: {e}")
@@ -1,16 +1,32 @@
-from dataclasses import asdict, dataclass
+import json
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
-import whisperx
+import pyarrow.parquet as parquet
+import numpy as np
 from loguru import logger
-from moviepy import VideoFileClip, AudioFileClip
 
-from src.mm_data.core.models.mmdata_block import mmDataBlock, get_md5
+from .mmdata_block import mmDataBlock
+from .. import metrics
+from ..cache import TranscriptionCache, to_json_types
+from ..chunks import DEFAULT_CHUNK_SIZE, write_chunked_parquet
+from ..dedup import DedupIndex
+from ..file_handlers import AUDIO_SAMPLE_RATE, load_audio
+from ..journal import ConversionJournal
+from ..processor import get_bytes_md5, get_file_md5
+from ..stats import ShardStats, stats_file_for, write_run_summary
+from ..write_policy import DEFAULT_WRITE_POLICY
+from ..writer import MMDATA_SCHEMA, blocks_to_record_batch
 
 
-@dataclass
+@dataclass(slots=True)
 class VideoBlock(mmDataBlock):
     """ 视频数据块 """
 
@@ -18,101 +34,252 @@ class VideoBlock(mmDataBlock):
         return f"VideoBlock(实体ID={self.实体ID}, 块ID={self.块ID}, 块类型={self.块类型}, 时间={self.时间}, 扩展字段={self.扩展字段})"
 
 
+def resolve_device(device: Optional[str] = None) -> str:
+    """未指定设备时, 有可用 GPU 则使用 cuda, 否则使用 cpu"""
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def resolve_compute_type(device: str, compute_type: Optional[str] = None) -> str:
+    """选择推理精度: GPU 使用 float16, CPU 使用 int8 (CPU 上 float16 没有高效实现)"""
+    if compute_type:
+        return compute_type
+    return "float16" if device.startswith("cuda") else "int8"
+
+
 class VideoProcessor:
-    """视频处理类，负责模型加载和视频块生成"""
-
-    def __init__(self, use_auth_token: str, device: str = "cuda", compute_type: str = "float16"):
-        """初始化模型"""
-        logger.info("Loading models...")
-        self.model = whisperx.load_model("large-v3", device, compute_type=compute_type)
-        logger.info(f"模型加载成功: {type(self.model)}")
-        self.diarize_model = whisperx.DiarizationPipeline(use_auth_token=use_auth_token, device=device)
-        logger.info(f"说话人识别模型加载成功: {type(self.diarize_model)}")
-        self.device = device
+    """视频处理类，负责模型加载和视频块生成
+
+    whisperx 及其依赖在首次转写时才导入, 模型在首次使用时才加载, 转写结果全部命中缓存时不会加载模型
+
+    Args:
+        use_auth_token: 说话人识别模型的 HuggingFace token
+        device: 推理设备, 为空时自动选择
+        compute_type: 推理精度, 为空时按设备选择 (cuda: float16, cpu: int8)
+        cache: 转写结果缓存
+        model_name: whisper 模型名称
+        diarize: 是否进行说话人识别, 关闭时不加载说话人识别模型
+    """
+
+    def __init__(self, use_auth_token: str, device: Optional[str] = None, compute_type: Optional[str] = None,
+                 cache: Optional[TranscriptionCache] = None, model_name: str = "large-v3", diarize: bool = True):
+        self.model_name = model_name
+        self.device = resolve_device(device)
+        self.compute_type = resolve_compute_type(self.device, compute_type)
         self.use_auth_token = use_auth_token
-
-    def speech_to_text(self, audio_file: Path) -> dict:
-        """从音频文件中提取文本"""
-        logger.debug(f"Using existing model to transcribe audio file: {audio_file}")
-        audio = whisperx.load_audio(str(audio_file))
-        stt_result = self.model.transcribe(audio)
-        diarize_segments = self.diarize_model(audio)
-        result = whisperx.assign_word_speakers(diarize_segments, stt_result)
+        self.cache = cache
+        self.diarize = diarize
+        self._model = None
+        self._diarize_model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            import whisperx
+            logger.info(f"Loading models... ({self.model_name}, {self.device}, {self.compute_type})")
+            self._model = whisperx.load_model(self.model_name, self.device, compute_type=self.compute_type)
+            logger.info(f"模型加载成功: {type(self._model)}")
+        return self._model
+
+    @property
+    def diarize_model(self):
+        if self._diarize_model is None:
+            import whisperx
+            self._diarize_model = whisperx.DiarizationPipeline(use_auth_token=self.use_auth_token,
+                                                               device=self.device)
+            logger.info(f"说话人识别模型加载成功: {type(self._diarize_model)}")
+        return self._diarize_model
+
+    def cache_settings(self) -> dict:
+        """影响转写结果的模型参数, 作为缓存键的一部分"""
+        return {"model": self.model_name, "compute_type": self.compute_type, "diarize": self.diarize}
+
+    def speech_to_text(self, audio: np.ndarray) -> dict:
+        """从 16kHz 单声道音频采样中提取文本, 优先读取转写缓存"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(audio, self.cache_settings())
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Transcription cache hit")
+                metrics.count("transcription_cache_hits")
+                return cached["result"]
+            metrics.count("transcription_cache_misses")
+
+        logger.debug(f"Using existing model to transcribe audio: {len(audio) / AUDIO_SAMPLE_RATE:.1f}s")
+        metrics.count("audio_seconds", len(audio) / AUDIO_SAMPLE_RATE)
+        with metrics.timer("speech_to_text"):
+            stt_result = self.model.transcribe(audio)
+        diarize_segments = None
+        if self.diarize:
+            import whisperx
+            with metrics.timer("diarize"):
+                diarize_segments = self.diarize_model(audio)
+                result = whisperx.assign_word_speakers(diarize_segments, stt_result)
+        else:
+            result = stt_result
+        # 转为 JSON 基本类型, 与缓存命中时返回的结果一致, 使 STT文本 不因是否命中而不同
+        result = to_json_types(result)
+
+        if self.cache is not None:
+            self.cache.put(cache_key, {
+                "result": result,
+                "diarize_segments": diarize_segments.to_dict("records")
+                if isinstance(diarize_segments, pd.DataFrame) else diarize_segments,
+            })
         return result
 
-    def extract_audio(self, video_file: Path, audio_file: Path) -> None:
-        """从视频文件中提取出音频文件"""
-        logger.debug(f"Extracting audio from {video_file} to {audio_file}")
-        video_file_clip = VideoFileClip(str(video_file))
-        video_file_clip.audio.write_audiofile(str(audio_file), logger=None)
-        video_file_clip.close()  # 释放资源
-
-    def generate_block(self, video_file: Path, block_id: int) -> VideoBlock:
-        """将视频文件转换为block"""
+    def extract_audio(self, video_file: Path) -> np.ndarray:
+        """将视频文件的音轨一次解码为内存中的 16kHz 单声道 float32 数组"""
+        logger.debug(f"Extracting audio from {video_file}")
+        with metrics.timer("extract_audio"):
+            audio = load_audio(video_file, AUDIO_SAMPLE_RATE)
+        metrics.count("audio_bytes", audio.nbytes)
+        return audio
+
+    def generate_block(self, video_file: Path, block_id: int, audio: Optional[np.ndarray] = None,
+                       read_video: bool = True) -> VideoBlock:
+        """将视频文件转换为block
+
+        Args:
+            audio: 预先提取的音频采样, 为空时现场提取
+            read_video: 是否将视频读入 视频 字段, 分块存储时为 False, 由写入阶段直接从文件读取
+        """
         logger.info(f"开始生成视频块: {video_file.name}, 块ID: {block_id}")
 
         if not video_file.exists():
             raise FileNotFoundError(f"视频文件不存在: {video_file}")
 
-        # 生成临时音频文件路径
-        audio_file = video_file.with_suffix(".mp3")
-
-        # 提取音频
-        if not audio_file.exists():
-            self.extract_audio(video_file, audio_file)
-
-        # 读取音频时长
-        try:
-            audio_clip = AudioFileClip(str(audio_file))
-            duration = audio_clip.duration
-            audio_clip.close()  # 释放音频资源
-        except Exception as e:
-            logger.error(f"读取音频时长失败: {e}")
-            duration = None
+        # 提取音频, 时长由采样数计算
+        if audio is None:
+            audio = self.extract_audio(video_file)
+        duration = len(audio) / AUDIO_SAMPLE_RATE
 
         # stt信息提取
-        stt = self.speech_to_text(audio_file)
+        stt = self.speech_to_text(audio)
         texts = [segment.get('text', '') for segment in stt['segments'] if isinstance(segment, dict)]
         full_text = ' '.join(texts)
         language = stt.get('language', 'unknown')
 
-        with open(video_file, 'rb') as f:
-            binary_data = f.read()
+        if read_video:
+            with open(video_file, 'rb') as f:
+                binary_data = f.read()
+            video_md5 = get_bytes_md5(binary_data)
+        else:
+            binary_data = None
+            video_md5 = get_file_md5(video_file)
 
         # 创建扩展字段字典
         extends = {"duration": duration, "language": language}
 
         block = VideoBlock(
             实体ID=video_file.name,
-            md5=get_md5(video_file.name),
+            md5=video_md5,
             块ID=block_id,
             块类型="视频",
             时间=str(pd.Timestamp.now()),
             视频=binary_data,
             文本=full_text,
             STT文本=str(stt),
-            扩展字段=str(extends)
+            扩展字段=json.dumps(extends, ensure_ascii=False)
         )
 
         return block
 
 
-def block_to_parquet(block: VideoBlock, parquet_file: Path) -> None:
-    """将块实例存储为parquet格式"""
-    logger.debug(f"将块存储为parquet文件: {parquet_file}")
-
-    # 将 dataclass 转换为字典
-    block_dict = asdict(block)
-
-    # 将字典包装为单行 DataFrame
-    df = pd.DataFrame([block_dict])
+def block_to_parquet(block: VideoBlock, parquet_file: Path, payload_file: Optional[Path] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """将块实例存储为parquet格式, 返回写入的行数
 
-    # 写入 Parquet 文件
-    df.to_parquet(parquet_file, index=False)
-
-
-def process_video_to_parquets(videos: List[Path], output_dir: Path, use_auth_token: str, device: str) -> None:
-    """批量将视频列表处理成 parquet 文件"""
+    提供 payload_file 时, 视频内容从该文件内存映射读取并按 chunk_size 拆成多行写入,
+    写入时统计并在同目录写出 {stem}.stats.json
+    """
+    logger.debug(f"将块存储为parquet文件: {parquet_file}")
+    with metrics.timer("block_to_parquet"):
+        stats = ShardStats()
+
+        # 先写临时文件再重命名, 中断时不会留下写了一半的 parquet
+        temp_file = parquet_file.parent / f"{parquet_file.name}.tmp"
+        if payload_file is not None:
+            rows = write_chunked_parquet(block, temp_file, payload_file, "视频", chunk_size, stats=stats)
+            logger.debug(f"视频按 {chunk_size} bytes 分块写入, 共 {rows} 块")
+        else:
+            # 按列直接构建单行 RecordBatch, 视频二进制不经过字典与 DataFrame 复制
+            record_batch = blocks_to_record_batch([block])
+            # 视频本身已压缩, 按列策略不再压缩视频列
+            with parquet.ParquetWriter(temp_file, MMDATA_SCHEMA,
+                                       **DEFAULT_WRITE_POLICY.writer_kwargs(MMDATA_SCHEMA)) as writer:
+                writer.write_batch(record_batch)
+            stats.update(record_batch)
+            rows = record_batch.num_rows
+        os.replace(temp_file, parquet_file)
+        stats.write(stats_file_for(parquet_file), shard=parquet_file.name)
+    return rows
+
+
+def write_video_summary(output_dir: Path, journal: ConversionJournal) -> ShardStats:
+    """合并断点日志中已提交视频的 {块ID}.stats.json 为 videos.stats.json, 之前运行遗留的文件不计入"""
+    stats_files = [stats_file_for(output_dir / record["shard"]) for record in journal.records()
+                   if record["shard"] is not None]
+    return write_run_summary(output_dir / "videos.stats.json", [file for file in stats_files if file.exists()])
+
+
+def _write_blocks(write_queue: "queue.Queue", output_dir: Path, journal: ConversionJournal,
+                  dedup: Optional[DedupIndex], chunk_size: Optional[int]) -> None:
+    """写入线程: 依次将完成的块写为 parquet 并提交断点日志, 收到 None 时退出"""
+    while True:
+        item = write_queue.get()
+        if item is None:
+            return
+        idx, video_file, block = item
+        metrics.gauge("write_queue_depth", write_queue.qsize())
+        try:
+            if block is None:
+                # 读取前已判定为重复的视频, 仅记录为已处理
+                journal.record(None, None, [str(video_file)], 0)
+                continue
+            if dedup is not None:
+                dedup.remember_file(video_file, block.md5)
+                if block.md5 in dedup:
+                    logger.info(f"视频内容已入库, 跳过: {video_file.name}")
+                    journal.record(None, None, [str(video_file)], 0)
+                    continue
+            parquet_path = output_dir / f"{block.块ID}.parquet"
+            if chunk_size:
+                rows = block_to_parquet(block, parquet_path, payload_file=video_file, chunk_size=chunk_size)
+            else:
+                rows = block_to_parquet(block, parquet_path)
+            journal.record(idx, parquet_path, [str(video_file)], rows)
+            if dedup is not None:
+                dedup.add(block.md5, block.实体ID)
+                dedup.commit()
+        except Exception as e:
+            logger.exception(f"写入文件 {video_file.name} 时出错: {e}")
+
+
+def process_video_to_parquets(videos: List[Path], output_dir: Path, use_auth_token: str, device: str,
+                              dedup: Optional[DedupIndex] = None, resume: bool = False,
+                              extract_workers: int = 2, audio_queue_size: int = 2,
+                              write_queue_size: int = 2, cache: Optional[TranscriptionCache] = None,
+                              chunk_size: Optional[int] = None, compute_type: Optional[str] = None,
+                              model_name: str = "large-v3", diarize: bool = True) -> None:
+    """批量将视频列表处理成 parquet 文件
+
+    按三级流水线执行: 音频提取线程池预取后续视频, 当前线程用模型转写, 写入线程串行落盘.
+    各级之间的队列有界, 下游阻塞时上游停止预取.
+
+    Args:
+        dedup: 去重索引, 跳过内容已入库的视频
+        resume: 跳过输出目录断点日志中已提交的视频
+        extract_workers: 音频提取线程数
+        audio_queue_size: 已提交提取但尚未转写的视频数上限
+        write_queue_size: 已转写但尚未写入的块数上限
+        cache: 转写结果缓存, 命中时跳过模型推理
+        chunk_size: 设置时视频按该字节数分块存储, 不整体读入内存
+        compute_type, model_name, diarize: 见 VideoProcessor
+    """
     logger.info(f"开始批量处理视频文件，共 {len(videos)} 个视频，输出目录: {output_dir}")
 
     if not videos:
@@ -125,17 +292,56 @@ def process_video_to_parquets(videos: List[Path], output_dir: Path, use_auth_tok
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # 初始化 VideoProcessor 实例
-    processor = VideoProcessor(use_auth_token=use_auth_token, device=device)
-
-    for idx, video_file in enumerate(videos, start=1):
-        logger.info(f"处理文件: {video_file.name}，块ID: {idx}")
+    journal = ConversionJournal(output_dir / "videos.journal.jsonl")
+    if resume:
+        journal.load()
+        logger.info(f"断点续跑, 已提交 {len(journal.committed_inputs)} 个视频")
+    else:
+        journal.reset()
 
-        try:
-            block = processor.generate_block(video_file, block_id=idx)
-            parquet_path = output_dir / f"{block.块ID}.parquet"
-            block_to_parquet(block, parquet_path)
-        except Exception as e:
-            logger.error(f"处理文件 {video_file.name} 时出错: {e}", exc_info=True)
+    # 初始化 VideoProcessor 实例
+    processor = VideoProcessor(use_auth_token=use_auth_token, device=device, compute_type=compute_type,
+                               cache=cache, model_name=model_name, diarize=diarize)
+
+    write_queue = queue.Queue(maxsize=write_queue_size)
+    writer = threading.Thread(target=_write_blocks, args=(write_queue, output_dir, journal, dedup, chunk_size),
+                              name="video-writer", daemon=True)
+    writer.start()
+
+    todo = iter([(idx, video_file) for idx, video_file in enumerate(videos, start=1)
+                 if not journal.is_committed(str(video_file))])
+    inflight = deque()
+
+    with ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix="audio-extract") as pool:
+        def submit_next() -> None:
+            """提交下一个需要处理的视频的音频提取任务"""
+            for idx, video_file in todo:
+                if dedup is not None and dedup.is_duplicate_file(video_file):
+                    logger.info(f"视频内容已入库, 跳过: {video_file.name}")
+                    write_queue.put((idx, video_file, None))
+                    continue
+                inflight.append((idx, video_file, pool.submit(processor.extract_audio, video_file)))
+                return
+
+        for _ in range(max(audio_queue_size, 1)):
+            submit_next()
+
+        while inflight:
+            idx, video_file, future = inflight.popleft()
+            submit_next()
+            metrics.gauge("audio_inflight", len(inflight))
+            logger.info(f"处理文件: {video_file.name}，块ID: {idx}")
+            try:
+                block = processor.generate_block(video_file, block_id=idx, audio=future.result(),
+                                                 read_video=not chunk_size)
+            except Exception as e:
+                logger.exception(f"处理文件 {video_file.name} 时出错: {e}")
+                continue
+            # 写入队列已满时阻塞, 形成背压
+            write_queue.put((idx, video_file, block))
+
+    write_queue.put(None)
+    writer.join()
+    write_video_summary(output_dir, journal)
 
     logger.info("视频文件处理完成")
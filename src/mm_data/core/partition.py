@@ -0,0 +1,189 @@
+"""
+多节点切分与数据集清单
+
+共 K 个节点时, 节点 i 只处理 hash(输入路径) % K == i 的输入, 输出文件名带节点编号:
+    out.parquet -> out-00002-of-00008.parquet, 分片为 out-00002-of-00008_0.parquet ...
+各节点结束时根据断点日志写出 {node_stem}.manifest.json, 汇总后由 mm-data merge-manifest 合并为一个数据集清单.
+
+哈希使用列表文件中的路径原文 (通常为相对路径) 的 md5, 与各机器的挂载位置和 Python 的 hash 随机化无关,
+节点之间不需要协调服务, 文件名也不会冲突
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from .block_index import BlockIndex, index_file_for
+from .journal import ConversionJournal
+from .stats import ShardStats, stats_file_for
+
+MANIFEST_VERSION = 1
+
+
+def input_shard(name: str, num_shards: int) -> int:
+    """输入路径所属的节点编号"""
+    digest = hashlib.md5(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def check_shard(num_shards: int, shard_index: int) -> None:
+    if num_shards < 1 or not 0 <= shard_index < num_shards:
+        raise ValueError(f"Invalid node shard {shard_index} of {num_shards}")
+
+
+def partition_inputs(names: Iterable[str], num_shards: int, shard_index: int) -> List[str]:
+    """按路径哈希切分输入, 保持原有顺序"""
+    check_shard(num_shards, shard_index)
+    if num_shards == 1:
+        return list(names)
+    return [name for name in names if input_shard(name, num_shards) == shard_index]
+
+
+def node_output_file(output_file: Path, num_shards: int, shard_index: int) -> Path:
+    """单节点时不改名, 否则为 {stem}-{shard_index:05d}-of-{num_shards:05d}{suffix}"""
+    check_shard(num_shards, shard_index)
+    output_file = Path(output_file)
+    if num_shards == 1:
+        return output_file
+    return output_file.parent / f"{output_file.stem}-{shard_index:05d}-of-{num_shards:05d}{output_file.suffix}"
+
+
+def manifest_file_for(output_file: Path) -> Path:
+    """输出文件 out.parquet 对应的清单为同目录下的 out.manifest.json"""
+    output_file = Path(output_file)
+    return output_file.parent / f"{output_file.stem}.manifest.json"
+
+
+def _write_json(file: Path, data: Dict[str, Any]) -> None:
+    file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = file.parent / f"{file.name}.tmp"
+    temp_file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temp_file, file)
+
+
+def write_manifest(output_file: Path, num_shards: int = 1, shard_index: int = 0) -> Dict[str, Any]:
+    """根据断点日志写出本节点的清单, 续跑时之前运行提交的分片同样计入
+
+    行数, 文件数与统计均只由清单列出的分片得出 (统计为各分片统计文件之和);
+    索引覆盖的分片与清单不一致时抛出 ValueError
+
+    Args:
+        output_file: 本节点的输出文件 (已含节点编号)
+    """
+    output_file = Path(output_file)
+    shards = []
+    inputs = 0
+    stats = ShardStats()
+    has_stats = True
+    for record in ConversionJournal.for_output(output_file).records():
+        inputs += len(record["inputs"])
+        if record["shard"] is None:
+            continue
+        shards.append({
+            "file": record["shard"],
+            "split": record["split"],
+            "rows": record["rows"],
+            "inputs": len(record["inputs"]),
+            "bytes": (output_file.parent / record["shard"]).stat().st_size,
+        })
+        stats_file = stats_file_for(output_file.parent / record["shard"])
+        if stats_file.exists():
+            stats.merge(ShardStats.from_dict(json.loads(stats_file.read_text(encoding="utf-8"))))
+        else:
+            has_stats = False
+    rows = sum(shard["rows"] for shard in shards)
+    if has_stats and stats.rows != rows:
+        raise ValueError(f"Shard stats of {output_file.name} count {stats.rows} rows, the journal {rows}")
+
+    index_file = index_file_for(output_file)
+    if index_file.exists():
+        with BlockIndex(index_file) as index:
+            indexed = {shard["file"]: shard["rows"] for shard in index.shards}
+        listed = {shard["file"]: shard["rows"] for shard in shards}
+        if indexed != listed:
+            raise ValueError(f"Index {index_file.name} covers {sum(indexed.values())} rows in {len(indexed)} "
+                             f"shards, the journal {rows} rows in {len(listed)} shards")
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "num_shards": num_shards,
+        "shard_index": shard_index,
+        "output": output_file.name,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "inputs": inputs,
+        "rows": rows,
+        "files": len(shards),
+        "bytes": sum(shard["bytes"] for shard in shards),
+        "shards": shards,
+        "stats": dict(stats.to_dict(), shards=len(shards)) if has_stats else None,
+        "index": index_file.name if index_file.exists() else None,
+    }
+    _write_json(manifest_file_for(output_file), manifest)
+    return manifest
+
+
+def merge_manifests(manifest_files: Iterable[Path], output_file: Path,
+                    allow_missing: bool = False) -> Dict[str, Any]:
+    """合并各节点清单, 按节点编号与分片顺序给出每个分片在整个数据集中的起始行号
+
+    分片路径改写为相对 output_file 所在目录; 节点数不一致, 节点编号重复, 清单自身的行数不一致,
+    或缺少节点 (allow_missing 为 False 时) 抛出 ValueError
+    """
+    output_file = Path(output_file)
+    manifests = []
+    for manifest_file in manifest_files:
+        manifest = json.loads(Path(manifest_file).read_text(encoding="utf-8"))
+        shard_rows = sum(shard["rows"] for shard in manifest["shards"])
+        stats_rows = manifest["stats"]["rows"] if manifest["stats"] is not None else shard_rows
+        if not manifest["rows"] == shard_rows == stats_rows:
+            raise ValueError(f"Inconsistent manifest {manifest_file}: rows={manifest['rows']}, "
+                             f"sum of shard rows={shard_rows}, stats rows={stats_rows}")
+        manifests.append((manifest["shard_index"], Path(manifest_file), manifest))
+    if not manifests:
+        raise ValueError("No manifest to merge")
+
+    num_shards = {manifest["num_shards"] for _, _, manifest in manifests}
+    if len(num_shards) != 1:
+        raise ValueError(f"Manifests disagree on the number of node shards: {sorted(num_shards)}")
+    num_shards = num_shards.pop()
+    indices = [index for index, _, _ in manifests]
+    duplicated = sorted({index for index in indices if indices.count(index) > 1})
+    if duplicated:
+        raise ValueError(f"Duplicated node shards: {duplicated}")
+    missing = sorted(set(range(num_shards)) - set(indices))
+    if missing and not allow_missing:
+        raise ValueError(f"Missing node shards: {missing}")
+
+    shards = []
+    indexes = []
+    row_offset = 0
+    stats = ShardStats()
+    for index, manifest_file, manifest in sorted(manifests, key=lambda item: item[0]):
+        for shard in manifest["shards"]:
+            shard_file = os.path.relpath(manifest_file.parent / shard["file"], output_file.parent)
+            shards.append(dict(shard, file=shard_file, node=index, row_offset=row_offset))
+            row_offset += shard["rows"]
+        if manifest["stats"] is not None:
+            stats.merge(ShardStats.from_dict(manifest["stats"]))
+        if manifest.get("index") is not None:
+            indexes.append(os.path.relpath(manifest_file.parent / manifest["index"], output_file.parent))
+
+    merged = {
+        "version": MANIFEST_VERSION,
+        "num_shards": num_shards,
+        "nodes": sorted(indices),
+        "missing_nodes": missing,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "inputs": sum(manifest["inputs"] for _, _, manifest in manifests),
+        "rows": row_offset,
+        "files": len(shards),
+        "bytes": sum(shard["bytes"] for shard in shards),
+        "shards": shards,
+        "stats": stats.to_dict(),
+        # 各节点的行级偏移索引, 见 block_index
+        "indexes": indexes,
+    }
+    _write_json(output_file, merged)
+    return merged
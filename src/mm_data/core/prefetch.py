@@ -0,0 +1,80 @@
+"""
+页面文件预读
+
+1. 每个文档的 pages 目录只 scandir 一次, 每个文件名只解析一次页码
+2. 线程池按输入顺序预读后续页面 (可跨文档), 在途数据按文件大小计入字节上限
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Tuple, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_PREFETCH_WORKERS = 4
+DEFAULT_PREFETCH_BYTES = 256 << 20
+
+
+def _page_number(name: str) -> int:
+    """doc-page-12.png -> 12"""
+    return int(name.rsplit(".", 1)[0].split("page-")[1])
+
+
+def list_pages(pages_dir: Path) -> List[Tuple[Path, Path, int]]:
+    """列出 pages 目录下的 (图片, 文本, 两者字节数), 按页码排序
+
+    图片与文本各自按页码排序后一一对应, 数量不一致时抛出 ValueError
+    """
+    images, texts = [], []
+    with metrics.timer("list_pages"), os.scandir(pages_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".png"):
+                images.append((_page_number(entry.name), Path(entry.path), entry.stat().st_size))
+            elif entry.name.endswith(".md"):
+                texts.append((_page_number(entry.name), Path(entry.path), entry.stat().st_size))
+    if len(images) != len(texts):
+        raise ValueError(f"The number of image files and md files is {len(images)} and {len(texts)} in {pages_dir}")
+    images.sort(key=lambda item: item[0])
+    texts.sort(key=lambda item: item[0])
+    return [(img_file, md_file, img_size + md_size)
+            for (_, img_file, img_size), (_, md_file, md_size) in zip(images, texts)]
+
+
+def prefetch(items: Iterable[T], load: Callable[[T], R], size_of: Callable[[T], int],
+             workers: int = DEFAULT_PREFETCH_WORKERS,
+             max_bytes: int = DEFAULT_PREFETCH_BYTES) -> Iterator[Tuple[T, R]]:
+    """在线程池中预读, 按输入顺序产出 (item, load(item))
+
+    Args:
+        items: 输入迭代器, 按需消费
+        load: 读取函数, 在线程池中执行
+        size_of: 预估 load 结果的字节数, 用于限制在途数据量
+        workers: 线程数, 小于等于 0 时在当前线程顺序读取
+        max_bytes: 已读取或正在读取但尚未被消费的数据上限, 至少保留一个在途任务
+    """
+    if workers <= 0:
+        for item in items:
+            yield item, load(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") as executor:
+        pending = deque()
+        inflight_bytes = 0
+        for item in items:
+            size = size_of(item)
+            # 超出预算时先交出最早的结果
+            while pending and inflight_bytes + size > max_bytes:
+                done_item, done_size, future = pending.popleft()
+                inflight_bytes -= done_size
+                yield done_item, future.result()
+            pending.append((item, size, executor.submit(load, item)))
+            inflight_bytes += size
+            metrics.gauge("prefetch_bytes", inflight_bytes)
+        while pending:
+            done_item, _, future = pending.popleft()
+            yield done_item, future.result()
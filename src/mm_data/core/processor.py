@@ -3,13 +3,34 @@
 """
 
 import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
 from .models.mmdata_block import mmDataBlock
 from pathlib import Path
-from typing import List
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as parquet
-from loguru import logger
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+from .writer import DEFAULT_ROW_GROUP_BYTES, ShardWriter
+from .write_policy import WritePolicy
+from . import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 创建进程池时主进程中已有预读, 指标与日志线程, fork 会把其他线程持有的锁原样复制到 worker 中导致死锁,
+# 因此 worker 由 forkserver (不支持时为 spawn) 启动, 任务函数与参数须可 pickle
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """创建 worker 不经 fork 启动的进程池
+
+    forkserver 预先导入本模块 (及 pyarrow 等依赖), 单线程的 forkserver 再 fork 出 worker, 避免每个 worker 重新导入
+    """
+    context = multiprocessing.get_context(POOL_START_METHOD)
+    if POOL_START_METHOD == "forkserver":
+        context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
 
 def file_to_blocks(file_path: Path) -> List[mmDataBlock]:
     """将文件转换为 mmDataBlock 列表"""
@@ -19,48 +40,78 @@ def file_to_blocks(file_path: Path) -> List[mmDataBlock]:
         blocks = [mmDataBlock.from_json(line) for line in file]
     return blocks
 
-def batch_to_parquet(output_file: Path, split_size: int, batchs: List[List[mmDataBlock]]):
-    # 将 rows 写入 parquet 文件
-    batch_rows = []
-    # 将 batchs 按 split_size 分割，
-    # 当 batch 长度大于 split_size 时，将 batch 写入 parquet 文件
-    # 当 batch 长度小于 split_size 时，继续追加 batch_rows
-    batch_count = 0
-    split_count = 0
-    for batch in batchs:
-        batch_count += 1
-        batch_rows.extend(batch)
-        if batch_count >= split_size:
-            df = pd.DataFrame([row.to_dict() for row in batch_rows])
-            output_file_split = output_file.parent / \
-                f"{output_file.stem}_{split_count}.parquet"
-            # 使用 pyarrow 引擎
-            table = pa.Table.from_pandas(df)
-            # 保存为 parquet
-            parquet.write_table(table,
-                                output_file_split,
-                                compression='zstd',  # 可选: 'snappy', 'gzip', 'brotli', 'zstd', 'lz4'
-                                row_group_size=100000  # 优化读写性能的行组大小
-                                )
-            logger.info(
-                f"batch {split_count} done, {output_file_split} generated")
-            batch_rows = []
-            batch_count = 0
-            split_count += 1
+def batch_to_parquet(output_file: Path, split_size: int, batchs: Iterable[Iterable[mmDataBlock]],
+                     sources: Optional[Iterable[str]] = None, start_split: int = 0,
+                     commit_hooks: Optional[List[Callable]] = None, policy: Optional[WritePolicy] = None,
+                     row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES, auto_tune_rows: int = 0):
+    """将批次写入 parquet 分片, 每 split_size 个批次一个分片
 
-    # 处理最后一个 batch
-    if batch_rows:
-        df = pd.DataFrame([row.to_dict() for row in batch_rows])
-        output_file_last = output_file.parent / \
-            f"{output_file.stem}_{split_count}.parquet"
-        table = pa.Table.from_pandas(df)
-        parquet.write_table(table,
-                            output_file_last,
-                            compression='zstd',  # 可选: 'snappy', 'gzip', 'brotli', 'zstd', 'lz4'
-                            row_group_size=100000  # 优化读写性能的行组大小
-                            )
-        logger.info(f"batch {split_count} done, {output_file_last} generated")
+    Args:
+        batchs: 批次迭代器, 每个批次的类型见 ShardWriter.write_batch
+        sources: 与 batchs 一一对应的来源标识, 分片提交时传给 commit_hooks
+        start_split: 起始分片编号
+        commit_hooks: 分片提交后的回调, 见 ShardWriter
+        policy: 按列的压缩与字典编码策略
+        row_group_bytes: 每个行组未压缩数据的字节数上限
+        auto_tune_rows: 大于 0 时在前 auto_tune_rows 行上自动选择 policy
+    """
+    with metrics.timer("batch_to_parquet"), \
+            ShardWriter(output_file, split_size, row_group_bytes=row_group_bytes, policy=policy,
+                        start_split=start_split, commit_hooks=commit_hooks,
+                        auto_tune_rows=auto_tune_rows) as writer:
+        if sources is None:
+            for batch in batchs:
+                writer.write_batch(batch)
+        else:
+            for batch, source in zip(batchs, sources):
+                writer.write_batch(batch, source=source)
+
+def parallel_map(func: Callable[[T], R], inputs: Iterable[T], workers: int,
+                 prefetch: Optional[int] = None, executor: Optional[Executor] = None) -> Iterator[R]:
+    """在进程池中执行 func, 按输入顺序产出结果
+
+    Args:
+        func: 可 pickle 的顶层函数 (或其 functools.partial), 输入与结果同样须可 pickle
+        inputs: 输入迭代器, 按需消费
+        workers: 进程数, 小于等于 1 时在当前进程串行执行
+        prefetch: 同时在途的任务数上限, 默认为 workers 的两倍
+        executor: 复用已有的进程池 (见 process_pool), 由调用方负责关闭
+    """
+    if workers <= 1:
+        yield from map(func, inputs)
+        return
+
+    prefetch = prefetch or workers * 2
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(process_pool(workers))
+        pending = deque()
+        for item in inputs:
+            pending.append(executor.submit(func, item))
+            metrics.gauge("parallel_inflight", len(pending))
+            # 在途任务达到上限时先交出最早的结果, 限制内存占用
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 def get_md5(text: str) -> str:
     """获取文本的md5值"""
     return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def get_bytes_md5(data: bytes) -> str:
+    """获取二进制内容的md5值, 直接在原缓冲区上计算"""
+    return hashlib.md5(memoryview(data)).hexdigest()
+
+def get_file_md5(file_path: Path, chunk_size: int = 1 << 20) -> str:
+    """分块流式计算文件内容的md5值, 复用同一个读缓冲区"""
+    md5 = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as file:
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            md5.update(view[:size])
+    return md5.hexdigest()
@@ -0,0 +1,223 @@
+"""
+输出分片的惰性读取
+
+1. 列投影: 只读取需要的列
+2. 谓词下推: 按 块类型 / 实体ID / 时间 过滤, 利用行组统计信息跳过不相关的行组
+3. 二进制字段 (图片/视频/音频) 在首次访问时才按行组读取
+4. 目录下的分片以写入时的记录为准 (断点日志, 清单或合并索引), 之前运行遗留的分片不会被读取
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as parquet
+
+from .block_index import BlockIndex, index_file_for
+from .journal import ConversionJournal
+from .models.mmdata_block import mmDataBlock
+from .partition import manifest_file_for
+from .writer import BINARY_FIELDS, MMDATA_SCHEMA
+
+
+def _natural_key(file: Path):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", file.name)]
+
+
+def output_shard_files(output_file: Path) -> Optional[List[Path]]:
+    """输出文件 out.parquet 已提交的分片, 按提交顺序
+
+    依次以断点日志 (out.journal.jsonl), 清单 (out.manifest.json), 合并索引 (out.index.arrow) 为准,
+    都不存在时返回 None
+    """
+    output_file = Path(output_file)
+    journal = ConversionJournal.for_output(output_file)
+    if journal.journal_file.exists():
+        return [output_file.parent / record["shard"] for record in journal.records()
+                if record["shard"] is not None]
+    manifest_file = manifest_file_for(output_file)
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        return [output_file.parent / shard["file"] for shard in manifest["shards"]]
+    index_file = index_file_for(output_file)
+    if index_file.exists():
+        with BlockIndex(index_file) as index:
+            return [output_file.parent / shard["file"] for shard in index.shards]
+    return None
+
+
+def _output_files(directory: Path) -> List[Path]:
+    """目录下有断点日志, 清单或合并索引的输出文件; 分片自身的索引 out_0.index.arrow 不算"""
+    outputs = set()
+    for suffix in (".journal.jsonl", ".manifest.json", ".index.arrow"):
+        for file in directory.glob(f"*{suffix}"):
+            output_file = directory / f"{file.name[:-len(suffix)]}.parquet"
+            if not output_file.is_file():
+                outputs.add(output_file)
+    return sorted(outputs, key=_natural_key)
+
+
+def shard_files(path: Path) -> List[Path]:
+    """返回单个分片文件, 输出文件 (out.parquet) 已提交的分片, 或目录下各输出已提交的分片
+
+    目录下没有任何写入记录时, 退回为按编号排序的全部 .parquet 文件 (不含未完成的 .tmp 文件)
+    """
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    if not path.is_dir():
+        return output_shard_files(path) or []
+
+    outputs = _output_files(path)
+    if not outputs:
+        return sorted(path.glob("*.parquet"), key=_natural_key)
+    return [file for output_file in outputs for file in output_shard_files(output_file)]
+
+
+def build_filter(block_types: Optional[Iterable[str]] = None,
+                 entity_ids: Optional[Iterable[str]] = None,
+                 time_range: Optional[Tuple[Optional[str], Optional[str]]] = None) -> Optional[ds.Expression]:
+    """由 块类型 / 实体ID / 时间 条件构建过滤表达式, 无条件时返回 None
+
+    Args:
+        block_types: 保留的块类型
+        entity_ids: 保留的实体ID
+        time_range: (起始, 结束) 时间字符串, 闭区间, 任一端可为 None
+    """
+    conditions = []
+    if block_types is not None:
+        conditions.append(pc.field("块类型").isin(list(block_types)))
+    if entity_ids is not None:
+        conditions.append(pc.field("实体ID").isin(list(entity_ids)))
+    if time_range is not None:
+        start, end = time_range
+        if start is not None:
+            conditions.append(pc.field("时间") >= start)
+        if end is not None:
+            conditions.append(pc.field("时间") <= end)
+    if not conditions:
+        return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+
+def iter_record_batches(path: Path, columns: Optional[List[str]] = None,
+                        block_types: Optional[Iterable[str]] = None,
+                        entity_ids: Optional[Iterable[str]] = None,
+                        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+                        filter: Optional[ds.Expression] = None,
+                        batch_size: int = 1024) -> Iterator[pa.RecordBatch]:
+    """按列投影与过滤条件扫描分片, 逐个产出 RecordBatch
+
+    filter 为自定义表达式, 与 block_types 等条件同时给出时取交集
+    """
+    expression = build_filter(block_types, entity_ids, time_range)
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+    dataset = ds.dataset([str(file) for file in shard_files(path)], format="parquet")
+    yield from dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size)
+
+
+class _RowGroupColumnCache:
+    """缓存最近读取的行组二进制列, 顺序访问同一行组的块时每列只读取一次"""
+
+    def __init__(self):
+        self._files: Dict[Path, parquet.ParquetFile] = {}
+        self._key = None
+        self._column: Optional[pa.ChunkedArray] = None
+
+    def get(self, file: Path, row_group: int, field_name: str, row: int) -> Any:
+        key = (file, row_group, field_name)
+        if key != self._key:
+            if file not in self._files:
+                self._files[file] = parquet.ParquetFile(file)
+            self._column = self._files[file].read_row_group(row_group, columns=[field_name]).column(0)
+            self._key = key
+        return self._column[row].as_py()
+
+    def get_row(self, file: Path, row_group: int, field_names: List[str], row: int) -> Dict[str, Any]:
+        """读取一行的若干列, 不影响缓存的列"""
+        if file not in self._files:
+            self._files[file] = parquet.ParquetFile(file)
+        table = self._files[file].read_row_group(row_group, columns=field_names)
+        return table.slice(row, 1).to_pylist()[0]
+
+
+class LazyBlock:
+    """只读的块视图, 非二进制字段在扫描时读取, 二进制字段在首次访问时读取"""
+
+    def __init__(self, values: Dict[str, Any], binary_fields: List[str],
+                 cache: _RowGroupColumnCache, file: Path, row_group: int, row: int):
+        self.__dict__.update(values)
+        self._binary_fields = binary_fields
+        self._cache = cache
+        self._location = (file, row_group, row)
+
+    def __getattr__(self, name: str) -> Any:
+        # 仅在实例属性中找不到时调用
+        if name in self.__dict__.get("_binary_fields", ()):
+            file, row_group, row = self._location
+            value = self._cache.get(file, row_group, name, row)
+            self.__dict__[name] = value
+            return value
+        raise AttributeError(name)
+
+    @property
+    def location(self) -> Tuple[Path, int, int]:
+        """(分片文件, 行组, 行组内行号)"""
+        return self._location
+
+    def to_block(self, block_class: type = mmDataBlock) -> mmDataBlock:
+        """构建完整的块实例, 扫描时列投影未包含的字段从所在行组重新读取"""
+        names = [f.name for f in MMDATA_SCHEMA]
+        loaded = set(self.__dict__) | set(self._binary_fields)
+        values = {name: getattr(self, name) for name in names if name in loaded}
+        missing = [name for name in names if name not in loaded]
+        if missing:
+            file, row_group, row = self._location
+            values.update(self._cache.get_row(file, row_group, missing, row))
+        return block_class(**values)
+
+    def __repr__(self):
+        return f"LazyBlock(实体ID={self.__dict__.get('实体ID')}, 块ID={self.__dict__.get('块ID')}, " \
+               f"块类型={self.__dict__.get('块类型')}, location={self._location})"
+
+
+def iter_blocks(path: Path, columns: Optional[List[str]] = None,
+                block_types: Optional[Iterable[str]] = None,
+                entity_ids: Optional[Iterable[str]] = None,
+                time_range: Optional[Tuple[Optional[str], Optional[str]]] = None) -> Iterator[LazyBlock]:
+    """逐个产出 LazyBlock, 按行组统计信息跳过不满足条件的行组
+
+    Args:
+        columns: 需要的字段, 默认全部; 其中的二进制字段不会在扫描时读取, 只在访问时读取
+    """
+    expression = build_filter(block_types, entity_ids, time_range)
+    wanted = [f.name for f in MMDATA_SCHEMA if columns is None or f.name in columns]
+    scalar_columns = [name for name in wanted if name not in BINARY_FIELDS]
+    binary_fields = [name for name in wanted if name in BINARY_FIELDS]
+    # 过滤条件涉及的列必须读取
+    filter_columns = [name for name, value in (("块类型", block_types), ("实体ID", entity_ids), ("时间", time_range))
+                      if value is not None and name not in scalar_columns]
+    cache = _RowGroupColumnCache()
+
+    for file in shard_files(path):
+        fragment = next(ds.dataset(str(file), format="parquet").get_fragments())
+        row_group_fragments = fragment.split_by_row_group(expression) if expression is not None \
+            else fragment.split_by_row_group()
+        for row_group_fragment in row_group_fragments:
+            row_group = row_group_fragment.row_groups[0].id
+            table = row_group_fragment.to_table(columns=scalar_columns + filter_columns)
+            table = table.append_column("__row", pa.array(range(table.num_rows), type=pa.int64()))
+            if expression is not None:
+                table = table.filter(expression)
+            rows = table.select(scalar_columns + ["__row"]).to_pylist()
+            for values in rows:
+                row = values.pop("__row")
+                yield LazyBlock(values, binary_fields, cache, file, row_group, row)
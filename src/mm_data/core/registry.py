@@ -0,0 +1,60 @@
+"""
+模态处理器注册表
+
+每种块类型登记一个转换入口模块, 以字符串引用 (以 . 开头时相对于本包 mm_data.core),
+只有被选中的类型才会导入对应模块及其重型依赖 (whisperx、PIL、pyarrow 等)
+"""
+
+import importlib
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, List
+
+
+@dataclass(frozen=True)
+class HandlerSpec:
+    """块类型处理器
+
+    Args:
+        converter: 转换入口模块, 提供 add_arguments(parser) 与 run(args)
+        description: 命令行帮助中显示的说明
+    """
+    converter: str
+    description: str = ""
+
+
+_HANDLERS: Dict[str, HandlerSpec] = {}
+
+
+def register_handler(block_type: str, spec: HandlerSpec) -> None:
+    """登记块类型处理器, 同名类型会被覆盖"""
+    _HANDLERS[block_type] = spec
+
+
+def handler_names() -> List[str]:
+    return list(_HANDLERS)
+
+
+def get_handler(block_type: str) -> HandlerSpec:
+    if block_type not in _HANDLERS:
+        raise ValueError(f"Invalid block type: {block_type}")
+    return _HANDLERS[block_type]
+
+
+def load_converter(block_type: str) -> ModuleType:
+    """导入块类型对应的转换入口模块"""
+    return importlib.import_module(get_handler(block_type).converter, package=__package__)
+
+
+register_handler("pdf", HandlerSpec(
+    converter="..converters.chinaxiv",
+    description="Chinaxiv PDF 与 docling 解析结果",
+))
+register_handler("image-text-pair", HandlerSpec(
+    converter="..converters.chinaxiv",
+    description="Chinaxiv 逐页图文对",
+))
+register_handler("video", HandlerSpec(
+    converter="..converters.meeting",
+    description="会议视频及其语音转写",
+))
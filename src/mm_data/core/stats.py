@@ -0,0 +1,150 @@
+"""
+输出数据统计
+
+写入时对每个行组用 pyarrow.compute 做列统计, 不需要再次读取分片:
+字数, 图片/视频/音频/OCR/STT 数量, 各模态字节数, 以及扩展字段中的视频时长.
+每个分片写一个 {shard_stem}.stats.json, 一次运行结束后合并为 {stem}.stats.json
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+TEXT_FIELDS = ("文本", "OCR文本", "STT文本")
+MEDIA_FIELDS = ("图片", "视频", "音频")
+
+
+def _sum(array: pa.Array) -> int:
+    return pc.sum(array).as_py() or 0
+
+
+def _count_non_empty(lengths: pa.Array) -> int:
+    return _sum(pc.fill_null(pc.greater(lengths, 0), False).cast(pa.int64()))
+
+
+class ShardStats:
+    """累积一个分片或一次运行的统计
+
+    分块存储的视频/音频 (扩展字段含 chunk_index) 只有第一个分块计入数量与字数, 字节数按全部分块累加
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.chars = {name: 0 for name in TEXT_FIELDS}
+        self.counts = {name: 0 for name in TEXT_FIELDS + MEDIA_FIELDS}
+        self.bytes = {name: 0 for name in MEDIA_FIELDS}
+        self.video_seconds = 0.0
+        self.video_durations = 0
+
+    def _primary_mask(self, table: Union[pa.Table, pa.RecordBatch]) -> pa.Array:
+        """非分块行或第一个分块行为 True, 只解析含视频/音频的行的扩展字段"""
+        media = pc.or_(pc.is_valid(table.column("视频")), pc.is_valid(table.column("音频")))
+        primary = np.ones(table.num_rows, dtype=bool)
+        indices = pc.indices_nonzero(media).to_numpy()
+        if len(indices) == 0:
+            return pa.array(primary)
+        extends = pc.take(table.column("扩展字段"), pa.array(indices)).to_pylist()
+        has_video = pc.take(pc.is_valid(table.column("视频")), pa.array(indices)).to_pylist()
+        for index, extend, video in zip(indices, extends, has_video):
+            try:
+                extend = json.loads(extend) if extend else {}
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(extend, dict):
+                continue
+            if extend.get("chunk_index", 0) > 0:
+                primary[index] = False
+            elif video and isinstance(extend.get("duration"), (int, float)):
+                self.video_seconds += extend["duration"]
+                self.video_durations += 1
+        return pa.array(primary)
+
+    def update(self, table: Union[pa.Table, pa.RecordBatch]) -> None:
+        """累加一个行组的统计"""
+        if table.num_rows == 0:
+            return
+        self.rows += table.num_rows
+        primary = self._primary_mask(table)
+        for name in TEXT_FIELDS:
+            lengths = pc.utf8_length(pc.filter(table.column(name), primary))
+            self.chars[name] += _sum(lengths)
+            self.counts[name] += _count_non_empty(lengths)
+        for name in MEDIA_FIELDS:
+            lengths = pc.binary_length(table.column(name))
+            self.bytes[name] += _sum(lengths)
+            self.counts[name] += _count_non_empty(pc.filter(lengths, primary))
+
+    def merge(self, other: "ShardStats") -> "ShardStats":
+        self.rows += other.rows
+        for name in self.chars:
+            self.chars[name] += other.chars[name]
+        for name in self.counts:
+            self.counts[name] += other.counts[name]
+        for name in self.bytes:
+            self.bytes[name] += other.bytes[name]
+        self.video_seconds += other.video_seconds
+        self.video_durations += other.video_durations
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "chars": dict(self.chars),
+            "counts": dict(self.counts),
+            "bytes": dict(self.bytes),
+            "video_duration": {"seconds": self.video_seconds, "count": self.video_durations},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ShardStats":
+        stats = cls()
+        stats.rows = data["rows"]
+        stats.chars.update(data["chars"])
+        stats.counts.update(data["counts"])
+        stats.bytes.update(data["bytes"])
+        stats.video_seconds = data["video_duration"]["seconds"]
+        stats.video_durations = data["video_duration"]["count"]
+        return stats
+
+    def write(self, stats_file: Path, **extra: Any) -> None:
+        data = dict(extra, **self.to_dict())
+        stats_file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def stats_file_for(shard_file: Path) -> Path:
+    """分片 out_0.parquet 的统计文件为 out_0.stats.json"""
+    return shard_file.parent / f"{shard_file.stem}.stats.json"
+
+
+def write_run_summary(summary_file: Path, stats_files: Iterable[Path]) -> ShardStats:
+    """合并各分片的统计文件, 续跑时之前运行写出的分片同样计入"""
+    total = ShardStats()
+    shards: List[str] = []
+    for stats_file in stats_files:
+        total.merge(ShardStats.from_dict(json.loads(stats_file.read_text(encoding="utf-8"))))
+        shards.append(stats_file.name)
+    total.write(summary_file, shards=len(shards))
+    return total
+
+
+def shard_stats_files(output_file: Path, num_splits: int) -> List[Path]:
+    """输出文件 out.parquet 的分片 0 .. num_splits-1 的统计文件
+
+    只按编号取本次运行 (及其续跑前) 写出的分片, 同目录下之前运行遗留的编号更大的分片不计入
+    """
+    output_file = Path(output_file)
+    files = [output_file.parent / f"{output_file.stem}_{split}.stats.json" for split in range(num_splits)]
+    return [file for file in files if file.exists()]
+
+
+def stale_shard_files(output_file: Path, num_splits: int) -> List[Path]:
+    """同目录下编号不小于 num_splits 的 {stem}_N.* 文件, 即之前运行遗留、不属于本次输出的分片及其旁路文件"""
+    output_file = Path(output_file)
+    pattern = re.compile(rf"^{re.escape(output_file.stem)}_(\d+)\.")
+    return sorted(file for file in output_file.parent.glob(f"{output_file.stem}_*")
+                  if (match := pattern.match(file.name)) and int(match.group(1)) >= num_splits)
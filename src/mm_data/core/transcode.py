@@ -0,0 +1,112 @@
+"""
+页面图片转码 (可选)
+
+docling 输出的页面为 PNG, 是 image-text-pair 分片中最大的部分. 开启后在进程池中将页面转为
+无损 WebP, 或限制最长边后转为有损 JPEG/WebP.
+
+md5 仍为原始图片内容的哈希 (与去重索引一致), 扩展字段中记录:
+    page_image_size: 转码后的尺寸
+    transcode: {"format", "original_size": {"width", "height"}, "original_bytes", "bytes", "md5"}
+其中 transcode.md5 为转码后内容的哈希. 转码结果不比原图小且无需缩放时保留原图, format 为 "original"
+"""
+
+import io
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from PIL import Image as PILImage
+
+from . import metrics
+from .processor import get_bytes_md5, parallel_map, process_pool
+
+TRANSCODE_FORMATS = ("webp-lossless", "webp", "jpeg")
+
+
+@dataclass(frozen=True)
+class TranscodeOptions:
+    """
+    Args:
+        format: webp-lossless, webp 或 jpeg
+        max_edge: 最长边上限, 超出时等比缩小, None 不缩放
+        quality: 有损格式的质量 (1-100)
+    """
+    format: str = "webp-lossless"
+    max_edge: Optional[int] = None
+    quality: int = 85
+
+    def __post_init__(self):
+        if self.format not in TRANSCODE_FORMATS:
+            raise ValueError(f"Invalid transcode format: {self.format}")
+
+
+def transcode_image(data: bytes, options: TranscodeOptions) -> Tuple[bytes, Tuple[int, int]]:
+    """转码一张图片, 返回 (新内容, (宽, 高))"""
+    with PILImage.open(io.BytesIO(data)) as image:
+        image.load()
+        if options.max_edge and max(image.size) > options.max_edge:
+            image.thumbnail((options.max_edge, options.max_edge), PILImage.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if options.format == "jpeg":
+            image.convert("RGB").save(buffer, format="JPEG", quality=options.quality, optimize=True)
+        elif options.format == "webp":
+            image.save(buffer, format="WEBP", quality=options.quality, method=4)
+        else:
+            image.save(buffer, format="WEBP", lossless=True, quality=100, method=4)
+        return buffer.getvalue(), image.size
+
+
+def transcode_row(item: Tuple[Dict[str, Any], TranscodeOptions]) -> Dict[str, Any]:
+    """转码一行 image-text pair 块字段中的图片, 需可 pickle, 供进程池调用"""
+    row, options = item
+    original = row["图片"]
+    extends = json.loads(row["扩展字段"])
+    original_size = extends["page_image_size"]
+
+    with metrics.timer("transcode_image"):
+        data, size = transcode_image(original, options)
+    resized = (size[0], size[1]) != (original_size["width"], original_size["height"])
+    if len(data) >= len(original) and not resized:
+        data, output_format = original, "original"
+    else:
+        output_format = options.format
+
+    extends["page_image_size"] = {"width": size[0], "height": size[1]}
+    extends["transcode"] = {
+        "format": output_format,
+        "original_size": original_size,
+        "original_bytes": len(original),
+        "bytes": len(data),
+        "md5": get_bytes_md5(data),
+    }
+    return dict(row, 图片=data, 扩展字段=json.dumps(extends))
+
+
+class Transcoder:
+    """在进程池中按顺序转码行, 进程池在多个文档之间复用
+
+    Args:
+        options: 转码参数
+        workers: 进程数, 小于等于 1 时在当前进程转码
+    """
+
+    def __init__(self, options: TranscodeOptions, workers: int = 1):
+        self.options = options
+        self.workers = workers
+        # 创建时主进程已有预读与指标线程, 见 processor.process_pool
+        self._executor = process_pool(workers) if workers > 1 else None
+
+    def map_rows(self, rows: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        return parallel_map(transcode_row, ((row, self.options) for row in rows), self.workers,
+                            executor=self._executor)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "Transcoder":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
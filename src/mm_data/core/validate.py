@@ -0,0 +1,188 @@
+"""
+输出分片校验
+
+以行组为单位在进程池中检查:
+1. schema 与 MMDATA_SCHEMA 一致
+2. 实体ID / 块类型 非空
+3. md5 与内容一致: 有二进制内容时为第一个非空二进制字段的 md5, 否则为 实体ID 的 md5, 分块行跳过;
+   转码过的页面 md5 为原图哈希, 改为与扩展字段中的 transcode.md5 比较
+4. 图片头部尺寸与扩展字段中的 page_image_size 一致, 只解析头部不解码像素
+5. 扩展字段中的 page_text_length 与 文本 长度一致
+
+无法读取的行组与检查出错的行记为问题 (unreadable_row_group / image_header / row_error) 后继续, 不中断校验
+"""
+
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as parquet
+
+from .file_handlers import get_img_size
+from .processor import parallel_map
+from .reader import shard_files
+from .writer import BINARY_FIELDS, MMDATA_SCHEMA
+
+DEFAULT_MAX_ISSUES = 1000
+
+
+def _binary_views(array: pa.Array) -> List[Optional[memoryview]]:
+    """按偏移量切分 large_binary 数组的数据缓冲区, 不复制内容"""
+    if array.null_count == len(array):
+        return [None] * len(array)
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = memoryview(data).cast("B")
+    valid = array.is_valid().to_numpy(zero_copy_only=False)
+    return [data[offsets[i]:offsets[i + 1]] if valid[i] else None for i in range(len(array))]
+
+
+def _parse_extends(column: pa.Array) -> List[Dict[str, Any]]:
+    extends = []
+    for value in column.to_pylist():
+        try:
+            value = json.loads(value) if value else {}
+        except json.JSONDecodeError:
+            value = {}
+        extends.append(value if isinstance(value, dict) else {})
+    return extends
+
+
+def check_schema(file: Path) -> Optional[Dict[str, Any]]:
+    """只读取 footer, 返回与 MMDATA_SCHEMA 的差异, 一致时返回 None"""
+    schema = parquet.read_schema(file)
+    if schema.remove_metadata().equals(MMDATA_SCHEMA):
+        return None
+    expected = {f.name: str(f.type) for f in MMDATA_SCHEMA}
+    actual = {f.name: str(f.type) for f in schema}
+    diff = {name: {"expected": expected.get(name), "actual": actual.get(name)}
+            for name in sorted(expected.keys() | actual.keys()) if expected.get(name) != actual.get(name)}
+    return diff or {"nullable": "differs"}
+
+
+def validate_row_group(task: Tuple[str, int]) -> Dict[str, Any]:
+    """校验一个行组, 返回 {"file", "row_group", "rows", "issues"}; 需可 pickle, 供进程池调用"""
+    file, row_group = task
+    issues: List[Dict[str, Any]] = []
+    try:
+        table = parquet.ParquetFile(file).read_row_group(row_group).combine_chunks()
+    except Exception as e:
+        issues.append({"file": file, "row_group": row_group, "check": "unreadable_row_group",
+                       "detail": f"{type(e).__name__}: {e}"})
+        return {"file": file, "row_group": row_group, "rows": _row_group_rows(file, row_group), "issues": issues}
+    if table.num_rows == 0:
+        return {"file": file, "row_group": row_group, "rows": 0, "issues": issues}
+    entity_ids = table.column("实体ID").to_pylist()
+
+    def report(check: str, rows: Iterable[int], detail: Any = None) -> None:
+        for row in rows:
+            issues.append({"file": file, "row_group": row_group, "row": int(row),
+                           "实体ID": entity_ids[row], "check": check, "detail": detail})
+
+    for name in ("实体ID", "块类型"):
+        empty = pc.fill_null(pc.equal(pc.utf8_length(table.column(name)), 0), True)
+        report(f"empty_{name}", pc.indices_nonzero(empty).to_pylist())
+
+    extends = _parse_extends(table.column("扩展字段").chunk(0))
+    text_lengths = pc.fill_null(pc.utf8_length(table.column("文本")), 0).to_pylist()
+    payloads = [_binary_views(table.column(name).chunk(0)) for name in BINARY_FIELDS]
+    images = payloads[BINARY_FIELDS.index("图片")]
+    md5s = table.column("md5").to_pylist()
+
+    for row, extend in enumerate(extends):
+        try:
+            _check_row(row, extend, text_lengths[row], images[row], payloads, entity_ids[row], md5s[row], report)
+        except Exception as e:
+            report("row_error", [row], f"{type(e).__name__}: {e}")
+
+    return {"file": file, "row_group": row_group, "rows": table.num_rows, "issues": issues}
+
+
+def _row_group_rows(file: str, row_group: int) -> int:
+    """footer 中记录的行数, footer 也无法读取时为 0"""
+    try:
+        return parquet.ParquetFile(file).metadata.row_group(row_group).num_rows
+    except Exception:
+        return 0
+
+
+def _check_row(row: int, extend: Dict[str, Any], text_length: int, image: Optional[memoryview],
+               payloads: List[List[Optional[memoryview]]], entity_id: Optional[str], md5: Optional[str],
+               report: Callable[..., None]) -> None:
+    if "page_text_length" in extend and extend["page_text_length"] != text_length:
+        report("page_text_length", [row], {"recorded": extend["page_text_length"], "actual": text_length})
+
+    size = extend.get("page_image_size")
+    if size is not None and image is not None:
+        try:
+            header_size = get_img_size(image)
+        except Exception as e:
+            report("image_header", [row], f"{type(e).__name__}: {e}")
+        else:
+            recorded = (size.get("width"), size.get("height"))
+            if header_size is None:
+                report("image_header", [row], "unrecognized image header")
+            elif tuple(header_size) != recorded:
+                report("page_image_size", [row], {"recorded": list(recorded), "actual": list(header_size)})
+
+    if "chunk_index" in extend:
+        return
+    payload = next((column[row] for column in payloads if column[row] is not None), None)
+    expected = hashlib.md5(payload).hexdigest() if payload is not None \
+        else hashlib.md5(entity_id.encode()).hexdigest() if entity_id else None
+    recorded = extend["transcode"].get("md5") if isinstance(extend.get("transcode"), dict) else md5
+    if expected is not None and recorded != expected:
+        report("md5", [row], {"recorded": recorded, "actual": expected})
+
+
+def _iter_tasks(files: List[Path], schema_issues: List[Dict[str, Any]]) -> Iterator[Tuple[str, int]]:
+    for file in files:
+        try:
+            diff = check_schema(file)
+        except Exception as e:
+            schema_issues.append({"file": str(file), "check": "unreadable", "detail": str(e)})
+            continue
+        if diff is not None:
+            # schema 不一致时逐行检查没有意义
+            schema_issues.append({"file": str(file), "check": "schema", "detail": diff})
+            continue
+        for row_group in range(parquet.ParquetFile(file).num_row_groups):
+            yield str(file), row_group
+
+
+def validate_shards(paths: Iterable[Path], workers: int = 1,
+                    max_issues: int = DEFAULT_MAX_ISSUES) -> Dict[str, Any]:
+    """校验分片文件或目录, 返回可序列化为 JSON 的报告
+
+    Args:
+        paths: 分片文件或包含分片的目录
+        workers: 进程数, 每个任务为一个行组
+        max_issues: 报告中最多列出的问题条数, 统计数不受限制
+    """
+    files = [file for path in paths for file in shard_files(Path(path))]
+    schema_issues: List[Dict[str, Any]] = []
+    by_check: Counter = Counter()
+    issues: List[Dict[str, Any]] = []
+    rows = row_groups = 0
+
+    for result in parallel_map(validate_row_group, _iter_tasks(files, schema_issues), workers):
+        rows += result["rows"]
+        row_groups += 1
+        by_check.update(issue["check"] for issue in result["issues"])
+        issues.extend(result["issues"][:max(max_issues - len(issues), 0)])
+
+    by_check.update(issue["check"] for issue in schema_issues)
+    return {
+        "ok": not by_check,
+        "files": len(files),
+        "row_groups": row_groups,
+        "rows": rows,
+        "errors": sum(by_check.values()),
+        "by_check": dict(by_check),
+        "issues": schema_issues + issues,
+    }
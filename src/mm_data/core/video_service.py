@@ -0,0 +1,171 @@
+"""
+常驻视频转写服务
+
+在一个长期运行的进程中保持 VideoProcessor 及已加载的模型, 通过本地 Unix socket 接收请求,
+多次调用 meeting_convert.py 时不必重复加载模型.
+
+协议为按行分隔的 JSON:
+请求  {"video": "/path/a.mp4", "block_id": 1, "output": "/out/1.parquet", "chunk_size": null}
+响应  {"ok": true, "md5": "...", "output": "/out/1.parquet", "rows": 1} 或 {"ok": false, "error": "..."}
+请求 {"cmd": "shutdown"} 关闭服务
+
+转写缓存 (--cache_dir) 属于服务进程, 由服务端的 VideoProcessor 使用; 去重索引 (--dedup_index) 由客户端
+process_videos_via_service 查询与提交
+"""
+
+import json
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from .dedup import DedupIndex
+from .journal import ConversionJournal
+from .models.video_block import VideoProcessor, block_to_parquet, write_video_summary
+from .stats import stats_file_for
+
+
+class _VideoRequestHandler(socketserver.StreamRequestHandler):
+    """逐行处理一个连接上的请求, 模型推理由服务级锁串行化"""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = json.loads(line)
+            if request.get("cmd") == "shutdown":
+                self._reply({"ok": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            try:
+                response = self._convert(request)
+            except Exception as e:
+                logger.exception(f"处理请求失败 {request}: {e}")
+                response = {"ok": False, "error": str(e)}
+            self._reply(response)
+
+    def _convert(self, request: dict) -> dict:
+        video_file = Path(request["video"])
+        parquet_file = Path(request["output"])
+        chunk_size = request.get("chunk_size")
+        parquet_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.server.lock:
+            block = self.server.processor.generate_block(video_file, block_id=request["block_id"],
+                                                         read_video=not chunk_size)
+        if chunk_size:
+            rows = block_to_parquet(block, parquet_file, payload_file=video_file, chunk_size=chunk_size)
+        else:
+            rows = block_to_parquet(block, parquet_file)
+        return {"ok": True, "md5": block.md5, "output": str(parquet_file), "rows": rows}
+
+    def _reply(self, response: dict) -> None:
+        self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _VideoServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, processor: VideoProcessor):
+        super().__init__(socket_path, _VideoRequestHandler)
+        self.processor = processor
+        self.lock = threading.Lock()
+
+
+def serve_video_processor(socket_path: Path, processor: VideoProcessor) -> None:
+    """在 socket_path 上启动常驻服务, 直到收到 shutdown 请求"""
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        socket_path.unlink()
+    with _VideoServer(str(socket_path), processor) as server:
+        logger.info(f"视频转写服务已启动: {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
+    logger.info("视频转写服务已关闭")
+
+
+class VideoServiceClient:
+    """常驻视频转写服务的客户端"""
+
+    def __init__(self, socket_path: Path):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(str(socket_path))
+        self._file = self._sock.makefile("rwb")
+
+    def request(self, payload: dict) -> dict:
+        self._file.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("视频转写服务已断开")
+        return json.loads(line)
+
+    def convert(self, video_file: Path, block_id: int, parquet_file: Path,
+                chunk_size: Optional[int] = None) -> dict:
+        return self.request({"video": str(Path(video_file).resolve()), "block_id": block_id,
+                             "output": str(Path(parquet_file).resolve()), "chunk_size": chunk_size})
+
+    def shutdown(self) -> None:
+        self.request({"cmd": "shutdown"})
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "VideoServiceClient":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def process_videos_via_service(videos: List[Path], output_dir: Path, socket_path: Path,
+                               resume: bool = False, chunk_size: Optional[int] = None,
+                               dedup: Optional[DedupIndex] = None) -> None:
+    """将视频交给常驻服务处理, 本进程不加载任何模型
+
+    Args:
+        dedup: 去重索引; 文件未变化且内容已入库时不发送请求, 否则在服务返回 md5 后判断,
+            重复时删除刚写出的 parquet
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    journal = ConversionJournal(output_dir / "videos.journal.jsonl")
+    if resume:
+        journal.load()
+    else:
+        journal.reset()
+
+    with VideoServiceClient(socket_path) as client:
+        for idx, video_file in enumerate(videos, start=1):
+            if journal.is_committed(str(video_file)):
+                logger.info(f"视频已提交, 跳过: {video_file.name}")
+                continue
+            if dedup is not None and dedup.is_duplicate_file(video_file):
+                logger.info(f"视频内容已入库, 跳过: {video_file.name}")
+                journal.record(None, None, [str(video_file)], 0)
+                continue
+            parquet_file = output_dir / f"{idx}.parquet"
+            response = client.convert(video_file, idx, parquet_file, chunk_size)
+            if not response.get("ok"):
+                logger.error(f"处理文件 {video_file.name} 时出错: {response.get('error')}")
+                continue
+            if dedup is not None:
+                dedup.remember_file(video_file, response["md5"])
+                if response["md5"] in dedup:
+                    logger.info(f"视频内容已入库, 删除输出: {video_file.name}")
+                    parquet_file.unlink(missing_ok=True)
+                    stats_file_for(parquet_file).unlink(missing_ok=True)
+                    journal.record(None, None, [str(video_file)], 0)
+                    dedup.commit()
+                    continue
+            journal.record(idx, parquet_file, [str(video_file)], response["rows"])
+            if dedup is not None:
+                dedup.add(response["md5"], video_file.name)
+                dedup.commit()
+            logger.info(f"处理文件: {video_file.name} 完成, 输出 {parquet_file}")
+
+    write_video_summary(output_dir, journal)
+    logger.info("视频文件处理完成")
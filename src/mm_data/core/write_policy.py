@@ -0,0 +1,195 @@
+"""
+按列的编码与压缩策略
+
+1. 图片/视频/音频本身已是压缩格式 (PNG/mp4 等), 默认不再压缩
+2. 文本与扩展字段使用 zstd, 压缩级别可调
+3. 块类型/时间/实体ID/页ID 等低基数列使用字典编码
+4. 行组按字节数切分 (见 row_group_bounds), 大图片不会让单个行组膨胀到数 GB
+
+auto_tune 在前 N 行样本上逐列试写候选压缩设置, 在可接受的耗时内选择最小的输出
+"""
+
+import io
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as parquet
+from loguru import logger
+
+MEDIA_COLUMNS = ("图片", "视频", "音频")
+TEXT_COLUMNS = ("文本", "OCR文本", "STT文本", "扩展字段")
+# 可能为低基数的字符串列, auto_tune 时按样本中的重复率决定是否字典编码
+CATEGORICAL_COLUMNS = ("实体ID", "md5", "块类型", "时间", "页ID")
+
+# 支持压缩级别的算法
+_LEVELED_CODECS = ("zstd", "gzip", "brotli")
+
+MEDIA_CANDIDATES = (("none", None), ("lz4", None), ("zstd", 1))
+TEXT_CANDIDATES = (("zstd", 1), ("zstd", 3), ("zstd", 6), ("zstd", 9), ("lz4", None), ("snappy", None))
+
+
+def _default_compression() -> Dict[str, str]:
+    return {name: "none" for name in MEDIA_COLUMNS}
+
+
+def _default_levels() -> Dict[str, int]:
+    return {name: 3 for name in TEXT_COLUMNS}
+
+
+@dataclass(frozen=True)
+class WritePolicy:
+    """
+    Args:
+        compression: 列名 -> 压缩算法 (none/lz4/snappy/zstd/gzip/brotli), 未列出的列使用 default_compression
+        compression_level: 列名 -> 压缩级别, 只对支持级别的算法生效, 未列出时使用 default_level
+        dictionary: 使用字典编码的列
+        default_compression: 其余列的压缩算法
+        default_level: 其余列的压缩级别
+    """
+    compression: Dict[str, str] = field(default_factory=_default_compression)
+    compression_level: Dict[str, int] = field(default_factory=_default_levels)
+    dictionary: Tuple[str, ...] = ("实体ID", "块类型", "时间", "页ID")
+    default_compression: str = "zstd"
+    default_level: Optional[int] = 3
+
+    def codec(self, column: str) -> str:
+        return self.compression.get(column, self.default_compression)
+
+    def level(self, column: str) -> Optional[int]:
+        if self.codec(column) not in _LEVELED_CODECS:
+            return None
+        return self.compression_level.get(column, self.default_level)
+
+    def writer_kwargs(self, schema: pa.Schema) -> dict:
+        """ParquetWriter 的 compression/compression_level/use_dictionary 参数"""
+        levels = {name: self.level(name) for name in schema.names if self.level(name) is not None}
+        return {
+            "compression": {name: self.codec(name) for name in schema.names},
+            "compression_level": levels or None,
+            "use_dictionary": [name for name in self.dictionary if name in schema.names],
+        }
+
+    def uniform(self, compression: str, level: Optional[int] = None) -> "WritePolicy":
+        """所有列使用同一压缩算法, 保留字典编码设置"""
+        return replace(self, compression={}, compression_level={},
+                       default_compression=compression, default_level=level)
+
+    def describe(self, schema: pa.Schema) -> str:
+        parts = []
+        for name in schema.names:
+            level = self.level(name)
+            parts.append(f"{name}={self.codec(name)}" + (f"({level})" if level is not None else ""))
+        return ", ".join(parts) + f"; dictionary=[{', '.join(self.dictionary)}]"
+
+
+DEFAULT_WRITE_POLICY = WritePolicy()
+
+
+def row_nbytes(table: Union[pa.Table, pa.RecordBatch]) -> np.ndarray:
+    """每行未压缩的近似字节数: 变长列为内容长度, 定长列为类型宽度"""
+    sizes = np.zeros(table.num_rows, dtype=np.int64)
+    for column, column_field in zip(table.columns, table.schema):
+        column_type = column_field.type
+        if pa.types.is_string(column_type) or pa.types.is_large_string(column_type) or \
+                pa.types.is_binary(column_type) or pa.types.is_large_binary(column_type):
+            sizes += pc.fill_null(pc.binary_length(column), 0).to_numpy().astype(np.int64)
+        else:
+            sizes += column_type.bit_width // 8
+    return sizes
+
+
+def row_group_bounds(sizes: np.ndarray, row_group_size: int, row_group_bytes: int,
+                     final: bool = False) -> List[Tuple[int, int]]:
+    """按行数与字节数上限切分行组, 返回 [(start, end)]
+
+    行组在达到 row_group_size 行或累计达到 row_group_bytes 字节 (含使其达到的一行) 时结束,
+    划分只取决于行序列, 与数据分几次写入无关. 非 final 时末尾不满的部分不返回, 留待下次写入
+    """
+    cumulative = np.cumsum(sizes)
+    bounds = []
+    start, num_rows = 0, len(sizes)
+    while start < num_rows:
+        base = cumulative[start - 1] if start else 0
+        by_bytes = int(np.searchsorted(cumulative, base + row_group_bytes, side="left")) + 1
+        end = min(start + row_group_size, by_bytes, num_rows)
+        full = end - start == row_group_size or cumulative[end - 1] - base >= row_group_bytes
+        if not full and not final:
+            break
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _measure(table: pa.Table, codec: str, level: Optional[int], repeat: int) -> Tuple[int, float]:
+    """将单列表写入内存, 返回 (字节数, 最短耗时)"""
+    size, best = 0, float("inf")
+    for _ in range(repeat):
+        sink = io.BytesIO()
+        start = time.perf_counter()
+        parquet.write_table(table, sink, compression=codec, compression_level=level, use_dictionary=False)
+        best = min(best, time.perf_counter() - start)
+        size = sink.tell()
+    return size, best
+
+
+def _choose(results: List[Tuple[str, Optional[int], int, float]], max_slowdown: float,
+            min_gain: float) -> Tuple[str, Optional[int]]:
+    """在耗时不超过最快候选 max_slowdown 倍的候选中取输出最小的,
+    比它大不到 min_gain 的更快候选优先"""
+    fastest = min(seconds for *_, seconds in results)
+    # 样本很小时计时误差为主, 给出 1ms 的余量
+    eligible = [result for result in results if result[3] <= fastest * max_slowdown + 1e-3]
+    smallest = min(size for _, _, size, _ in eligible)
+    codec, level, _, _ = min((result for result in eligible if result[2] <= smallest * (1 + min_gain)),
+                             key=lambda result: result[3])
+    return codec, level
+
+
+def auto_tune(sample: pa.Table, base: WritePolicy = DEFAULT_WRITE_POLICY, max_slowdown: float = 2.0,
+              min_gain: float = 0.01, dictionary_ratio: float = 0.5, repeat: int = 3) -> WritePolicy:
+    """在样本上逐列试写候选设置, 返回调整后的策略
+
+    Args:
+        sample: 样本行, 通常为运行开始时的前 N 行
+        base: 基础策略, 样本中全为空的列保持不变
+        max_slowdown: 可接受的耗时相对最快候选的倍数
+        min_gain: 输出减小不足该比例时选择更快的候选
+        dictionary_ratio: CATEGORICAL_COLUMNS 中不同值占非空行的比例不超过该值时使用字典编码
+        repeat: 每个候选的试写次数, 取最短耗时
+    """
+    compression = dict(base.compression)
+    levels = dict(base.compression_level)
+    for name, candidates in [(name, MEDIA_CANDIDATES) for name in MEDIA_COLUMNS] + \
+                            [(name, TEXT_CANDIDATES) for name in TEXT_COLUMNS]:
+        if name not in sample.column_names or sample.column(name).null_count == sample.num_rows:
+            continue
+        column_table = sample.select([name])
+        results = [(codec, level, *_measure(column_table, codec, level, repeat)) for codec, level in candidates]
+        compression[name], level = _choose(results, max_slowdown, min_gain)
+        if level is not None:
+            levels[name] = level
+        else:
+            levels.pop(name, None)
+        logger.debug(f"auto tune {name}: " + ", ".join(
+            f"{codec}{f'({level})' if level is not None else ''} {size}B {seconds * 1000:.1f}ms"
+            for codec, level, size, seconds in results))
+
+    dictionary = [name for name in base.dictionary if name not in CATEGORICAL_COLUMNS]
+    for name in CATEGORICAL_COLUMNS:
+        if name not in sample.column_names:
+            continue
+        column = sample.column(name)
+        non_null = len(column) - column.null_count
+        if non_null == 0:
+            if name in base.dictionary:
+                dictionary.append(name)
+        elif pc.count_distinct(column).as_py() <= non_null * dictionary_ratio:
+            dictionary.append(name)
+
+    policy = replace(base, compression=compression, compression_level=levels, dictionary=tuple(dictionary))
+    logger.info(f"auto tuned write policy on {sample.num_rows} rows: {policy.describe(sample.schema)}")
+    return policy
@@ -0,0 +1,312 @@
+"""
+基于 pyarrow.parquet.ParquetWriter 的流式分片写入器
+
+1. 使用固定的显式 schema, 二进制字段类型为 large_binary, 不再经过 base64 与 pandas
+2. 块按行组增量追加, 峰值内存为一个行组而不是一个分片
+3. 写出每个行组时顺带统计, 分片旁写 {shard_stem}.stats.json, 关闭时合并为 {stem}.stats.json
+4. 按列的压缩与字典编码见 write_policy, 行组按行数与字节数上限切分
+5. 写出每个行组时记录 实体ID/md5/块ID 的行级索引, 分片旁写 {shard_stem}.index.arrow, 关闭时合并为 {stem}.index.arrow
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as parquet
+from loguru import logger
+
+from . import metrics
+from .block_index import IndexBuilder, index_file_for, merge_shard_indexes, remove_shard_indexes, shard_index_files
+from .models.mmdata_block import mmDataBlock
+from .stats import ShardStats, shard_stats_files, stale_shard_files, stats_file_for, write_run_summary
+from .write_policy import DEFAULT_WRITE_POLICY, WritePolicy, auto_tune, row_group_bounds, row_nbytes
+
+if TYPE_CHECKING:
+    from .models.block_batch import BlockBatch, BlockBatchStream
+
+# mmDataBlock 字段与 parquet 列的一一对应
+MMDATA_SCHEMA = pa.schema([
+    pa.field("实体ID", pa.string(), nullable=False),
+    pa.field("md5", pa.string(), nullable=False),
+    pa.field("块ID", pa.int64(), nullable=False),
+    pa.field("块类型", pa.string(), nullable=False),
+    pa.field("扩展字段", pa.large_string()),
+    pa.field("时间", pa.string()),
+    pa.field("页ID", pa.string()),
+    pa.field("文本", pa.large_string()),
+    pa.field("图片", pa.large_binary()),
+    pa.field("视频", pa.large_binary()),
+    pa.field("音频", pa.large_binary()),
+    pa.field("OCR文本", pa.large_string()),
+    pa.field("STT文本", pa.large_string()),
+])
+
+BINARY_FIELDS = ("图片", "视频", "音频")
+
+DEFAULT_ROW_GROUP_SIZE = 8192
+DEFAULT_ROW_GROUP_BYTES = 64 << 20
+# write_blocks 每次转换为 RecordBatch 的块数, 与行组划分无关
+BLOCKS_PER_RECORD_BATCH = 256
+
+
+def _to_column_value(field_name: str, value):
+    """将块字段值转换为与 schema 对应的列值"""
+    if value is None:
+        return None
+    if field_name == "扩展字段" and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def blocks_to_record_batch(blocks: List[mmDataBlock]) -> pa.RecordBatch:
+    """将块列表按列直接转换为 RecordBatch, 二进制数据保持原样"""
+    columns = [
+        pa.array([_to_column_value(f.name, getattr(block, f.name)) for block in blocks], type=f.type)
+        for f in MMDATA_SCHEMA
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=MMDATA_SCHEMA)
+
+
+class ShardWriter:
+    """按 split_size 个批次切分分片, 并按行组增量写入 parquet 文件
+
+    分片先写入 {name}.tmp, 完成后重命名为正式文件名, 中断时不会留下写了一半的分片
+
+    Args:
+        output_file: 输出文件路径, 分片命名为 {stem}_{split_count}.parquet
+        split_size: 每个分片包含的批次(文档)数量
+        row_group_size: 每个行组的最大行数
+        row_group_bytes: 每个行组未压缩数据的字节数上限, 达到后即结束该行组
+        policy: 按列的压缩与字典编码策略, 默认 DEFAULT_WRITE_POLICY
+        compression: 指定时所有列统一使用该压缩算法, 覆盖 policy 中的按列设置
+        auto_tune_rows: 大于 0 时缓存前 auto_tune_rows 行, 在其上试写候选设置后确定 policy
+        start_split: 起始分片编号, 断点续跑时从日志中的下一个编号开始
+        commit_hooks: 分片提交后依次调用, 参数为 (split, shard_file, inputs, rows),
+            其中 inputs 为该分片包含的批次来源, 如 ConversionJournal.record
+        collect_stats: 是否在写入时统计并写出统计文件
+        build_index: 是否在写入时建立行级偏移索引, 见 block_index
+    """
+
+    def __init__(self,
+                 output_file: Path,
+                 split_size: int,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES,
+                 policy: Optional[WritePolicy] = None,
+                 compression: Optional[str] = None,
+                 start_split: int = 0,
+                 commit_hooks: Optional[List[Callable]] = None,
+                 collect_stats: bool = True,
+                 auto_tune_rows: int = 0,
+                 build_index: bool = True):
+        self.output_file = Path(output_file)
+        self.split_size = split_size
+        self.row_group_size = row_group_size
+        self.row_group_bytes = row_group_bytes
+        self.policy = policy or DEFAULT_WRITE_POLICY
+        if compression is not None:
+            self.policy = self.policy.uniform(compression)
+        self.auto_tune_rows = auto_tune_rows
+        self._tuned = auto_tune_rows <= 0
+        self.commit_hooks = list(commit_hooks or [])
+
+        self.split_count = start_split
+        self._batch_count = 0
+        self._writer: Optional[parquet.ParquetWriter] = None
+        self._shard_file: Optional[Path] = None
+        self._pending: List[pa.RecordBatch] = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+        self._shard_rows = 0
+        self._sources: List[str] = []
+        self._stats: Optional[ShardStats] = ShardStats() if collect_stats else None
+        self._index: Optional[IndexBuilder] = IndexBuilder() if build_index else None
+        if build_index:
+            # 不续跑时清除之前运行的全部分片索引, 续跑时清除将被重写的编号
+            remove_shard_indexes(self.output_file, start_split)
+        self._shard_row_groups = 0
+
+    def _shard_path(self, split_count: int) -> Path:
+        return self.output_file.parent / f"{self.output_file.stem}_{split_count}.parquet"
+
+    def _temp_path(self) -> Path:
+        return self._shard_file.parent / f"{self._shard_file.name}.tmp"
+
+    def _open_shard(self) -> None:
+        self._shard_file = self._shard_path(self.split_count)
+        self._shard_file.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = parquet.ParquetWriter(self._temp_path(),
+                                             MMDATA_SCHEMA,
+                                             **self.policy.writer_kwargs(MMDATA_SCHEMA))
+
+    def _tune(self) -> None:
+        """在缓存的前 auto_tune_rows 行上确定 policy, 只在打开第一个分片前执行一次"""
+        self._tuned = True
+        if not self._pending:
+            return
+        sample = pa.Table.from_batches(self._pending, schema=MMDATA_SCHEMA).slice(0, self.auto_tune_rows)
+        with metrics.timer("auto_tune"):
+            self.policy = auto_tune(sample, self.policy)
+
+    def _flush_row_group(self, final: bool = False) -> None:
+        """将缓存中已满的行组写出, final 时写出全部剩余行"""
+        if not self._pending:
+            return
+        table = pa.Table.from_batches(self._pending, schema=MMDATA_SCHEMA)
+        sizes = row_nbytes(table)
+        bounds = row_group_bounds(sizes, self.row_group_size, self.row_group_bytes, final)
+        if not bounds:
+            return
+        if self._writer is None:
+            self._open_shard()
+        num_rows = bounds[-1][1]
+        with metrics.timer("write_row_group"):
+            for start, end in bounds:
+                row_group = table.slice(start, end - start)
+                self._writer.write_table(row_group, row_group_size=end - start)
+                if self._index is not None:
+                    self._index.add_row_group(row_group, self._shard_row_groups)
+                self._shard_row_groups += 1
+        metrics.count("rows_written", num_rows)
+        if self._stats is not None:
+            self._stats.update(table.slice(0, num_rows))
+        self._shard_rows += num_rows
+        # 不满一个行组的剩余行留待下次写入, 保证行组划分与写入方式无关
+        rest = table.slice(num_rows)
+        self._pending = rest.to_batches()
+        self._pending_rows = rest.num_rows
+        self._pending_bytes = int(sizes[num_rows:].sum())
+
+    def _commit(self, split: Optional[int], shard_file: Optional[Path]) -> None:
+        for hook in self.commit_hooks:
+            hook(split, shard_file, self._sources, self._shard_rows)
+        self._sources = []
+        self._shard_rows = 0
+        self._batch_count = 0
+
+    def _close_shard(self) -> None:
+        if not self._tuned:
+            self._tune()
+        self._flush_row_group(final=True)
+        if self._writer is None:
+            # 批次全部为空, 仍需记录其来源已处理
+            if self._sources:
+                self._commit(None, None)
+            self._batch_count = 0
+            return
+        self._writer.close()
+        os.replace(self._temp_path(), self._shard_file)
+        if self._stats is not None:
+            self._stats.write(stats_file_for(self._shard_file), shard=self._shard_file.name)
+            self._stats = ShardStats()
+        if self._index is not None:
+            self._index.write(index_file_for(self._shard_file), self._shard_file.name)
+            self._index.reset()
+        self._shard_row_groups = 0
+        logger.info(f"batch {self.split_count} done, {self._shard_file} generated")
+        self._commit(self.split_count, self._shard_file)
+        self._writer = None
+        self._shard_file = None
+        self.split_count += 1
+
+    def write_record_batch(self, record_batch: pa.RecordBatch) -> None:
+        """追加已转换为列格式的行, 累计满 row_group_size 行或 row_group_bytes 字节时写出行组"""
+        if record_batch.num_rows == 0:
+            return
+        self._pending.append(record_batch)
+        self._pending_rows += record_batch.num_rows
+        self._pending_bytes += int(row_nbytes(record_batch).sum())
+        if not self._tuned:
+            if self._pending_rows < self.auto_tune_rows:
+                return
+            self._tune()
+        if self._pending_rows >= self.row_group_size or self._pending_bytes >= self.row_group_bytes:
+            self._flush_row_group()
+
+    def write_blocks(self, blocks: Iterable[mmDataBlock]) -> None:
+        """追加块, 每 BLOCKS_PER_RECORD_BATCH 个块转换为一个 RecordBatch 写入"""
+        rows: List[mmDataBlock] = []
+        for block in blocks:
+            rows.append(block)
+            if len(rows) >= BLOCKS_PER_RECORD_BATCH:
+                with metrics.timer("to_record_batch"):
+                    record_batch = blocks_to_record_batch(rows)
+                self.write_record_batch(record_batch)
+                rows = []
+        if rows:
+            with metrics.timer("to_record_batch"):
+                record_batch = blocks_to_record_batch(rows)
+            self.write_record_batch(record_batch)
+
+    def write_batch(self, batch: Union[pa.RecordBatch, "BlockBatch", "BlockBatchStream", Iterable[mmDataBlock]],
+                    source: Optional[str] = None) -> None:
+        """写入一个批次(通常为一个文档的所有块), 满 split_size 个批次后切换分片
+
+        Args:
+            batch: 块迭代器, RecordBatch, BlockBatch 或 BlockBatchStream
+            source: 批次来源(如输入文件路径), 分片提交时传给 commit_hooks
+        """
+        if isinstance(batch, pa.RecordBatch):
+            self.write_record_batch(batch)
+        elif hasattr(batch, "to_record_batch"):
+            # BlockBatch 整列校验后直接写入
+            self.write_record_batch(batch.to_record_batch())
+        elif hasattr(batch, "record_batches"):
+            # BlockBatchStream 逐段整列校验后写入
+            for record_batch in batch.record_batches():
+                self.write_record_batch(record_batch)
+        else:
+            self.write_blocks(batch)
+        if source is not None:
+            self._sources.append(source)
+        self._batch_count += 1
+        if self._batch_count >= self.split_size:
+            self._close_shard()
+
+    def close(self) -> None:
+        """写出剩余数据并关闭当前分片
+
+        汇总只包含编号小于 split_count 的分片 (本次运行及续跑前写出的), 之前运行遗留的分片不计入
+        """
+        if self._pending or self._writer is not None or self._sources:
+            self._close_shard()
+        stale = stale_shard_files(self.output_file, self.split_count)
+        if stale:
+            logger.warning(f"{len(stale)} files left by an earlier run are not part of this output: "
+                           f"{', '.join(file.name for file in stale[:5])}{' ...' if len(stale) > 5 else ''}")
+        if self._stats is not None:
+            summary_file = self.output_file.parent / f"{self.output_file.stem}.stats.json"
+            summary_file.parent.mkdir(parents=True, exist_ok=True)
+            write_run_summary(summary_file, shard_stats_files(self.output_file, self.split_count))
+        if self._index is not None:
+            self.output_file.parent.mkdir(parents=True, exist_ok=True)
+            with metrics.timer("merge_index"):
+                merge_shard_indexes(index_file_for(self.output_file),
+                                    shard_index_files(self.output_file, self.split_count))
+
+    def abort(self) -> None:
+        """出错时丢弃未完成的分片, 不触发 commit_hooks"""
+        if self._writer is not None:
+            self._writer.close()
+            self._temp_path().unlink(missing_ok=True)
+        self._writer = None
+        self._shard_file = None
+        self._pending = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+        if self._stats is not None:
+            self._stats = ShardStats()
+        if self._index is not None:
+            self._index.reset()
+        self._shard_row_groups = 0
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
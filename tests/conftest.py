@@ -0,0 +1,60 @@
+import importlib.util
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pyarrow.parquet as parquet
+import pytest
+
+from src.mm_data import cli
+from src.mm_data.core.journal import ConversionJournal
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = 4
+PAGES = 3
+
+
+def _load_script(name: str):
+    spec = importlib.util.spec_from_file_location(name, ROOT / "scripts" / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """DOCS 篇文档, 每篇 PAGES 页的合成数据, 只读; 需要修改时用 corpus_copy"""
+    corpus_dir = tmp_path_factory.mktemp("corpus")
+    _load_script("make_synthetic_corpus").make_corpus(corpus_dir, docs=DOCS, pages=PAGES, width=120, height=160,
+                                                      page_chars=120, pdf_kb=4, jsonl_blocks=0)
+    return corpus_dir
+
+
+@pytest.fixture
+def corpus_copy(corpus: Path, tmp_path: Path) -> Path:
+    return Path(shutil.copytree(corpus, tmp_path / "corpus"))
+
+
+@pytest.fixture
+def convert(tmp_path: Path) -> Callable[..., None]:
+    """在当前进程中执行 mm-data convert"""
+    def run(input_file: Path, output_file: Path, block_type: str, *options: Any) -> None:
+        cli.main(["convert", "--type", block_type, "-i", str(input_file), "-o", str(output_file),
+                  "-l", str(tmp_path / "logs"), *map(str, options)])
+    return run
+
+
+def read_output(output_file: Path) -> List[Dict[str, Any]]:
+    """按断点日志中的分片顺序读取全部行, 去掉写入时生成的 时间 列"""
+    output_file = Path(output_file)
+    rows = []
+    for record in ConversionJournal.for_output(output_file).records():
+        if record["shard"] is not None:
+            rows += parquet.read_table(output_file.parent / record["shard"]).drop_columns(["时间"]).to_pylist()
+    return rows
+
+
+def write_list(file: Path, inputs: List[Path]) -> Path:
+    """写出绝对路径的列表文件"""
+    file.write_text("\n".join(str(input_file) for input_file in inputs), encoding="utf-8")
+    return file
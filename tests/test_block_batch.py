@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from src.mm_data.core.models.block_batch import BlockBatch, BlockBatchStream
+from src.mm_data.core.models.chinaxiv_block import get_blocks, iter_block_batch
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+from src.mm_data.core.writer import MMDATA_SCHEMA, blocks_to_record_batch
+
+
+def _table(record_batches) -> pa.Table:
+    return pa.Table.from_batches(list(record_batches), schema=MMDATA_SCHEMA).drop_columns(["时间"])
+
+
+@pytest.mark.parametrize("block_type", ["pdf", "image-text-pair"])
+def test_block_batch_matches_blocks(corpus: Path, block_type: str):
+    for input_file in sorted(corpus.glob("*.pdf")):
+        expected = _table([blocks_to_record_batch(get_blocks(input_file, block_type))])
+        stream = iter_block_batch(input_file, block_type)
+        # 每个 RecordBatch 的行数不影响结果
+        stream.rows_per_batch = 2
+        assert _table(stream.record_batches()).equals(expected)
+        assert _table([BlockBatch.from_blocks(get_blocks(input_file, block_type)).to_record_batch()]).equals(expected)
+
+
+def test_validation_matches_blocks():
+    rows = [dict(实体ID="a.png", md5="", 块ID=0, 块类型="image-text-pair", 扩展字段=None, 文本="a"),
+            dict(实体ID="", md5="", 块ID=1, 块类型="image-text-pair", 扩展字段=None, 文本="b")]
+    with pytest.raises(ValueError, match="实体ID不能为空"):
+        mmDataBlock(**rows[1])
+    with pytest.raises(ValueError, match="实体ID不能为空"):
+        list(BlockBatchStream(iter(rows)).record_batches())
+    with pytest.raises(TypeError, match="块ID必须是整数类型"):
+        list(BlockBatchStream([dict(rows[0], 块ID="0")]).record_batches())
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pyarrow.parquet as parquet
+import pytest
+
+from conftest import read_output
+from src.mm_data.core.block_index import BlockIndex
+
+
+def test_index_lookup_and_locate(corpus: Path, tmp_path: Path, convert):
+    output_file = tmp_path / "out" / "out.parquet"
+    convert(corpus / "list.txt", output_file, "image-text-pair", "-s", 3)
+    rows = read_output(output_file)
+
+    with BlockIndex.for_output(output_file) as index:
+        assert len(index) == len(rows)
+        assert [shard["file"] for shard in index.shards] == ["out_0.parquet", "out_1.parquet"]
+        for row in rows:
+            block = index.get("md5", row["md5"])
+            assert (block.实体ID, block.图片, block.文本) == (row["实体ID"], row["图片"], row["文本"])
+
+            [(shard_file, row_group, offset)] = index.locate("实体ID", row["实体ID"])
+            table = parquet.ParquetFile(shard_file).read_row_group(row_group, columns=["实体ID", "md5"])
+            assert table.slice(offset, 1).to_pylist() == [{"实体ID": row["实体ID"], "md5": row["md5"]}]
+
+        # image-text-pair 的块ID 均为 0
+        assert sorted(block.md5 for block in index.get_all("块ID", 0)) == sorted(row["md5"] for row in rows)
+        assert index.get("md5", "0" * 32) is None
+        assert index.locate("实体ID", "missing.png") == []
+        with pytest.raises(ValueError):
+            index.locate("文本", "text")
+
+
+def test_index_after_resplit(corpus: Path, tmp_path: Path, convert):
+    """同一输出先以较小的分片大小运行, 之前运行遗留的分片不进入索引"""
+    output_file = tmp_path / "out" / "out.parquet"
+    convert(corpus / "list.txt", output_file, "pdf", "-s", 1)
+    convert(corpus / "list.txt", output_file, "pdf", "-s", 3)
+
+    with BlockIndex.for_output(output_file) as index:
+        assert len(index) == len(read_output(output_file))
+        assert [shard["file"] for shard in index.shards] == ["out_0.parquet", "out_1.parquet"]
@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.mm_data.core.cache import TranscriptionCache
+
+SETTINGS = {"model": "large-v3", "compute_type": "int8", "diarize": True}
+
+
+def _result(i: int) -> dict:
+    # 随机文本压缩后大小稳定, 便于按字节数设置容量
+    text = np.random.default_rng(i).integers(0, 1 << 30, 64).tobytes().hex()
+    return {"result": {"segments": [{"text": text, "start": np.float32(i)}], "language": "zh"}}
+
+
+def test_key_depends_on_audio_and_settings():
+    audio = np.zeros(1600, dtype=np.float32)
+    key = TranscriptionCache.make_key(audio, SETTINGS)
+    assert TranscriptionCache.make_key(audio.copy(), dict(reversed(SETTINGS.items()))) == key
+    assert TranscriptionCache.make_key(audio + 1, SETTINGS) != key
+    assert TranscriptionCache.make_key(audio, dict(SETTINGS, diarize=False)) != key
+
+
+def test_roundtrip_and_persistence(tmp_path):
+    with TranscriptionCache(tmp_path) as cache:
+        assert cache.get("a") is None
+        cache.put("a", _result(1))
+    with TranscriptionCache(tmp_path) as cache:
+        assert cache.get("a") == {"result": {"segments": [{"text": _result(1)["result"]["segments"][0]["text"],
+                                                           "start": 1.0}], "language": "zh"}}
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("src.mm_data.core.cache.time.time", lambda: next(clock))
+    with TranscriptionCache(tmp_path, max_bytes=1 << 30) as cache:
+        cache.put("probe", _result(0))
+        size = cache._conn.execute("SELECT size FROM entries").fetchone()[0]
+    (tmp_path / "transcripts.sqlite").unlink()
+
+    # 容量约为三条记录
+    with TranscriptionCache(tmp_path, max_bytes=size * 3 + size // 2) as cache:
+        for key in "abc":
+            cache.put(key, _result(ord(key)))
+        assert cache.get("a") is not None  # a 最近访问, b 最久未访问
+        cache.put("d", _result(4))
+        assert cache.get("b") is None
+        assert all(cache.get(key) is not None for key in "acd")
+
+        # 上面依次访问了 a, c, d
+        cache.put("e", _result(5))
+        assert cache.get("a") is None
+        total = cache._conn.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+        assert total <= cache.max_bytes
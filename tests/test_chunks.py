@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as parquet
+import pytest
+
+from src.mm_data.core.cache import TranscriptionCache
+from src.mm_data.core.chunks import read_chunked_payload, write_chunked_parquet
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+from src.mm_data.core.models.video_block import VideoProcessor, block_to_parquet
+from src.mm_data.core.stats import stats_file_for
+
+
+def _video_block() -> mmDataBlock:
+    return mmDataBlock(实体ID="meeting.mp4", md5="", 块ID=0, 块类型="视频", 扩展字段=None, 时间="2025-01-01")
+
+
+@pytest.mark.parametrize("size", [0, 1, 7, 8, 9, 64])
+def test_chunked_roundtrip(tmp_path: Path, size: int):
+    payload = bytes(range(256)) * (size // 256 + 1)
+    payload_file = tmp_path / "payload.bin"
+    payload_file.write_bytes(payload[:size])
+    parquet_file = tmp_path / "chunks.parquet"
+
+    chunk_count = write_chunked_parquet(_video_block(), parquet_file, payload_file, chunk_size=8)
+
+    assert chunk_count == max((size + 7) // 8, 1)
+    assert parquet.ParquetFile(parquet_file).num_row_groups == chunk_count
+    assert read_chunked_payload(parquet_file, "meeting.mp4") == payload[:size]
+    assert read_chunked_payload(parquet_file, "meeting.mp4", start=3, length=6) == payload[:size][3:9]
+
+
+def test_empty_payload(tmp_path: Path):
+    payload_file = tmp_path / "empty.bin"
+    payload_file.write_bytes(b"")
+    parquet_file = tmp_path / "chunks.parquet"
+
+    assert write_chunked_parquet(_video_block(), parquet_file, payload_file) == 1
+    assert parquet.read_table(parquet_file).column("视频").to_pylist() == [b""]
+    assert read_chunked_payload(parquet_file, "meeting.mp4") == b""
+
+
+def test_transcript_on_first_chunk_only(tmp_path: Path):
+    payload_file = tmp_path / "payload.bin"
+    payload_file.write_bytes(bytes(20))
+    block = mmDataBlock(实体ID="meeting.mp4", md5="", 块ID=0, 块类型="视频", 扩展字段='{"duration": 1.5}',
+                        时间="2025-01-01", 文本="hello", STT文本="{'segments': []}")
+    parquet_file = tmp_path / "chunks.parquet"
+
+    assert block_to_parquet(block, parquet_file, payload_file=payload_file, chunk_size=8) == 3
+    table = parquet.read_table(parquet_file)
+    assert table.column("文本").to_pylist() == ["hello", None, None]
+    assert table.column("STT文本").to_pylist() == ["{'segments': []}", None, None]
+    assert json.loads(stats_file_for(parquet_file).read_text(encoding="utf-8"))["rows"] == 3
+
+
+class _Model:
+    def transcribe(self, audio: np.ndarray) -> dict:
+        return {"segments": [{"text": "hi", "start": np.float32(0.5), "end": np.float64(1.25)}],
+                "language": "en"}
+
+
+def test_cache_hit_keeps_stt_text(tmp_path: Path):
+    audio = np.zeros(16000, dtype=np.float32)
+    with TranscriptionCache(tmp_path / "cache") as cache:
+        processor = VideoProcessor(use_auth_token="", device="cpu", cache=cache, diarize=False)
+        processor._model = _Model()
+        miss = processor.speech_to_text(audio)
+        hit = processor.speech_to_text(audio)
+    assert str(hit) == str(miss)
+    assert miss["segments"][0]["start"] == 0.5 and type(miss["segments"][0]["start"]) is float
@@ -0,0 +1,125 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from conftest import DOCS, PAGES, read_output, write_list
+from src.mm_data.core.journal import ConversionJournal
+from src.mm_data.core.partition import manifest_file_for
+
+ROWS = {"pdf": DOCS, "image-text-pair": DOCS * PAGES}
+
+
+@pytest.mark.parametrize("block_type", ["pdf", "image-text-pair"])
+def test_workers_match_serial(corpus: Path, tmp_path: Path, convert, block_type: str):
+    serial = tmp_path / "serial" / "out.parquet"
+    workers = tmp_path / "workers" / "out.parquet"
+    convert(corpus / "list.txt", serial, block_type, "-s", 3)
+    convert(corpus / "list.txt", workers, block_type, "-s", 3, "-w", 2)
+
+    rows = read_output(serial)
+    assert len(rows) == ROWS[block_type]
+    assert read_output(workers) == rows
+    assert [(record["shard"], record["rows"]) for record in ConversionJournal.for_output(workers).records()] == \
+        [(record["shard"], record["rows"]) for record in ConversionJournal.for_output(serial).records()]
+
+
+def test_resume_after_crash(corpus: Path, corpus_copy: Path, tmp_path: Path, convert):
+    json_file = corpus_copy / "doc2_docling_output" / "doc2.json"
+    json_text = json_file.read_text(encoding="utf-8")
+    json_file.write_text("truncated", encoding="utf-8")
+    output_file = tmp_path / "out" / "out.parquet"
+
+    with pytest.raises(ValueError):
+        convert(corpus_copy / "list.txt", output_file, "pdf", "-s", 1)
+    journal = ConversionJournal.for_output(output_file)
+    journal.load()
+    assert journal.next_split == 2
+    assert not list(output_file.parent.glob("*.tmp"))
+
+    json_file.write_text(json_text, encoding="utf-8")
+    convert(corpus_copy / "list.txt", output_file, "pdf", "-s", 1, "--resume")
+    clean = tmp_path / "clean" / "out.parquet"
+    convert(corpus / "list.txt", clean, "pdf", "-s", 1)
+
+    rows = read_output(output_file)
+    assert [row["实体ID"] for row in rows] == [f"doc{i}.pdf" for i in range(DOCS)]
+    assert rows == read_output(clean)
+    manifest = json.loads(manifest_file_for(output_file).read_text(encoding="utf-8"))
+    assert manifest["rows"] == manifest["stats"]["rows"] == DOCS
+    assert [shard["file"] for shard in manifest["shards"]] == [f"out_{i}.parquet" for i in range(DOCS)]
+
+
+def test_listing_error_in_prefetched_document(corpus_copy: Path, tmp_path: Path, convert):
+    # doc3 的页面在写入 doc0/doc1 时已被预读列出, 其错误不应阻止之前的分片提交
+    next((corpus_copy / "doc3_docling_output" / "pages").glob("*.md")).unlink()
+    output_file = tmp_path / "out" / "out.parquet"
+
+    with pytest.raises(ValueError, match="number of image files"):
+        convert(corpus_copy / "list.txt", output_file, "image-text-pair", "-s", 2)
+    assert [record["shard"] for record in ConversionJournal.for_output(output_file).records()] == \
+        ["out_0.parquet"]
+    assert [row["实体ID"].split("-")[0] for row in read_output(output_file)] == \
+        ["doc0"] * PAGES + ["doc1"] * PAGES
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_dedup_across_runs(corpus: Path, tmp_path: Path, convert, workers: int):
+    index_file = tmp_path / "dedup.sqlite"
+    inputs = [corpus / f"doc{i}.pdf" for i in range(DOCS)]
+    first = write_list(tmp_path / "first.txt", inputs[:2])
+    everything = write_list(tmp_path / "all.txt", inputs)
+
+    convert(first, tmp_path / "run1" / "out.parquet", "image-text-pair", "--dedup_index", index_file, "-w", workers)
+    convert(everything, tmp_path / "run2" / "out.parquet", "image-text-pair", "--dedup_index", index_file,
+            "-w", workers)
+    convert(everything, tmp_path / "run3" / "out.parquet", "image-text-pair", "--dedup_index", index_file,
+            "-w", workers)
+
+    def documents(run: str):
+        return sorted({row["实体ID"].split("-page-")[0] for row in read_output(tmp_path / run / "out.parquet")})
+
+    assert documents("run1") == ["doc0", "doc1"]
+    assert documents("run2") == ["doc2", "doc3"]
+    assert read_output(tmp_path / "run3" / "out.parquet") == []
+    with sqlite3.connect(index_file) as conn:
+        assert conn.execute("SELECT count(*) FROM content").fetchone()[0] == DOCS * PAGES
+        # 第三次运行只依据 files 表跳过, 不再读取图片
+        assert conn.execute("SELECT count(*) FROM files").fetchone()[0] == DOCS * PAGES
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_missing_pdf_is_skipped(corpus_copy: Path, tmp_path: Path, convert, dedup: bool, workers: int):
+    (corpus_copy / "doc1.pdf").unlink()
+    output_file = tmp_path / "out" / "out.parquet"
+    options = ["--dedup_index", tmp_path / "dedup.sqlite"] if dedup else []
+    convert(corpus_copy / "list.txt", output_file, "pdf", "-w", workers, *options)
+
+    assert [row["实体ID"] for row in read_output(output_file)] == ["doc0.pdf", "doc2.pdf", "doc3.pdf"]
+
+
+def test_pdf_payloads_are_stored_raw(corpus: Path, tmp_path: Path, convert):
+    output_file = tmp_path / "out" / "out.parquet"
+    convert(corpus / "list.txt", output_file, "pdf", "--json_check", "full")
+
+    for i, row in enumerate(read_output(output_file)):
+        docling_dir = corpus / f"doc{i}_docling_output"
+        assert row["图片"] == (corpus / f"doc{i}.pdf").read_bytes()
+        assert row["扩展字段"] == (docling_dir / f"doc{i}.json").read_text(encoding="utf-8")
+        assert row["文本"] == (docling_dir / f"doc{i}.md").read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("json_check, fails", [("none", False), ("structure", False), ("full", True)])
+def test_json_check(corpus_copy: Path, tmp_path: Path, convert, json_check: str, fails: bool):
+    # 首尾为对象括号但无法解析, 只有 full 能发现
+    (corpus_copy / "doc1_docling_output" / "doc1.json").write_text('{"a": [1, }', encoding="utf-8")
+    output_file = tmp_path / "out" / "out.parquet"
+    options = [corpus_copy / "list.txt", output_file, "pdf", "--json_check", json_check]
+    if fails:
+        with pytest.raises(ValueError, match="JSON 解析失败"):
+            convert(*options)
+    else:
+        convert(*options)
+        assert len(read_output(output_file)) == DOCS
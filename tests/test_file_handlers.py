@@ -0,0 +1,109 @@
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from src.mm_data.core.file_handlers import (check_json_text, get_img_bytes_and_size, get_img_size,
+                                            iter_img_bytes_and_size)
+
+
+def _encode(format: str, mode: str = "RGB", size=(173, 91), **options) -> bytes:
+    image = Image.new(mode, size, (200, 30, 60, 128)[:len(mode)])
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def _exif() -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "camera"
+    exif[0x0110] = "model " * 50
+    return exif.tobytes()
+
+
+IMAGES = {
+    "png": lambda: _encode("PNG"),
+    "png-rgba": lambda: _encode("PNG", "RGBA"),
+    "jpeg-baseline": lambda: _encode("JPEG"),
+    "jpeg-progressive": lambda: _encode("JPEG", progressive=True),
+    "jpeg-exif": lambda: _encode("JPEG", exif=_exif()),
+    "webp-vp8": lambda: _encode("WEBP", quality=80),
+    "webp-vp8l": lambda: _encode("WEBP", lossless=True),
+    "webp-vp8x": lambda: _encode("WEBP", "RGBA", exif=_exif()),
+    "gif": lambda: _encode("GIF", "P"),
+    "large-png": lambda: _encode("PNG", size=(5000, 3)),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+def test_header_size_matches_pil(name: str):
+    data = IMAGES[name]()
+    with Image.open(io.BytesIO(data)) as image:
+        assert get_img_size(data) == image.size
+    assert get_img_size(memoryview(data)) == image.size
+
+
+def test_webp_variants():
+    assert IMAGES["webp-vp8"]()[12:16] == b"VP8 "
+    assert IMAGES["webp-vp8l"]()[12:16] == b"VP8L"
+    assert IMAGES["webp-vp8x"]()[12:16] == b"VP8X"
+
+
+@pytest.mark.parametrize("name", IMAGES)
+def test_truncated_header(name: str):
+    data = IMAGES[name]()
+    with Image.open(io.BytesIO(data)) as image:
+        expected = image.size
+    for length in range(len(data)):
+        # 头部不完整时返回 None, 不抛出异常
+        assert get_img_size(data[:length]) in (None, expected)
+    assert get_img_size(data[:9]) is None
+
+
+def test_unknown_format():
+    assert get_img_size(b"") is None
+    assert get_img_size(b"not an image at all") is None
+    assert get_img_size(_encode("BMP")) is None
+
+
+def test_bytes_are_stored_untouched(tmp_path: Path):
+    for name in ("png", "jpeg-exif", "webp-vp8x"):
+        data = IMAGES[name]()
+        (tmp_path / name).write_bytes(data)
+        assert get_img_bytes_and_size(tmp_path / name) == (data, (173, 91))
+    # 头部无法解析的格式回退到 PIL
+    (tmp_path / "image.bmp").write_bytes(_encode("BMP"))
+    assert get_img_bytes_and_size(tmp_path / "image.bmp")[1] == (173, 91)
+
+
+def test_iter_skips_unreadable(tmp_path: Path):
+    good = tmp_path / "good.png"
+    good.write_bytes(IMAGES["png"]())
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"garbage")
+    assert get_img_bytes_and_size(broken) is None
+
+    items = list(iter_img_bytes_and_size([good, broken, tmp_path / "missing.png", good]))
+    assert [(path, size) for path, _, size in items] == [(good, (173, 91)), (good, (173, 91))]
+
+
+@pytest.mark.parametrize("text, structure, full", [
+    ('{"a": [1, 2]}', True, True),
+    ('  \n{"a": 1}\n  ', True, True),
+    ('{"a": [1, 2}', True, False),
+    ('{"a": ' + '"x", ' * 100 + '"b": 1', False, False),
+    ('[1, 2]', False, True),
+    ('truncated', False, False),
+    ('', False, False),
+])
+def test_check_json_text(text: str, structure: bool, full: bool):
+    check_json_text(text, "none")
+    for check, ok in (("structure", structure), ("full", full)):
+        if ok:
+            check_json_text(text, check)
+        else:
+            with pytest.raises(ValueError):
+                check_json_text(text, check)
+    with pytest.raises(ValueError, match="Invalid json check"):
+        check_json_text(text, "fast")
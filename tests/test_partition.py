@@ -0,0 +1,82 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+from conftest import DOCS, PAGES
+from src.mm_data import cli
+from src.mm_data.core.partition import input_shard, merge_manifests, node_output_file, partition_inputs
+from src.mm_data.core.reader import shard_files
+
+NAMES = [f"data/doc{i}.pdf" for i in range(200)]
+
+
+def test_partition_is_disjoint_and_ordered():
+    parts = [partition_inputs(NAMES, 4, i) for i in range(4)]
+    assert sorted(name for part in parts for name in part) == sorted(NAMES)
+    for i, part in enumerate(parts):
+        assert part == [name for name in NAMES if input_shard(name, 4) == i]
+        # 每个节点都分到一部分输入
+        assert 20 < len(part) < 80
+    assert partition_inputs(NAMES, 1, 0) == NAMES
+    # 只取决于路径原文, 与进程的 hash 随机化无关
+    assert input_shard("data/doc0.pdf", 8) == \
+        int.from_bytes(hashlib.md5(b"data/doc0.pdf").digest()[:8], "big") % 8
+
+
+@pytest.mark.parametrize("num_shards, shard_index", [(0, 0), (2, 2), (2, -1)])
+def test_invalid_node_shard(num_shards: int, shard_index: int):
+    with pytest.raises(ValueError):
+        partition_inputs(NAMES, num_shards, shard_index)
+
+
+def test_node_output_file():
+    assert node_output_file(Path("out/out.parquet"), 1, 0) == Path("out/out.parquet")
+    assert node_output_file(Path("out/out.parquet"), 8, 2) == Path("out/out-00002-of-00008.parquet")
+
+
+def _convert_nodes(corpus: Path, tmp_path: Path, convert, num_shards: int) -> list:
+    node_dirs = []
+    for i in range(num_shards):
+        node_dirs.append(tmp_path / f"node{i}")
+        convert(corpus / "list.txt", node_dirs[-1] / "out.parquet", "image-text-pair", "-s", 1,
+                "--num-shards", num_shards, "--shard-index", i)
+    return node_dirs
+
+
+def test_merge_manifest(corpus: Path, tmp_path: Path, convert):
+    node_dirs = _convert_nodes(corpus, tmp_path, convert, 3)
+    dataset = tmp_path / "dataset.manifest.json"
+    cli.main(["merge-manifest", *map(str, node_dirs), "-o", str(dataset)])
+
+    merged = json.loads(dataset.read_text(encoding="utf-8"))
+    assert (merged["nodes"], merged["missing_nodes"], merged["inputs"]) == ([0, 1, 2], [], DOCS)
+    assert merged["rows"] == merged["stats"]["rows"] == DOCS * PAGES
+    offsets = [shard["row_offset"] for shard in merged["shards"]]
+    assert offsets == [sum(shard["rows"] for shard in merged["shards"][:i]) for i in range(len(offsets))]
+    assert [shard["node"] for shard in merged["shards"]] == sorted(shard["node"] for shard in merged["shards"])
+    assert all((tmp_path / shard["file"]).is_file() for shard in merged["shards"])
+    # 合并清单同样可以作为读取的入口
+    assert shard_files(tmp_path) == [tmp_path / shard["file"] for shard in merged["shards"]]
+
+
+def test_merge_manifest_missing_or_inconsistent(corpus: Path, tmp_path: Path, convert, capsys):
+    node_dirs = _convert_nodes(corpus, tmp_path, convert, 2)
+    manifests = [node_dir / f"out-{i:05d}-of-00002.manifest.json" for i, node_dir in enumerate(node_dirs)]
+    dataset = tmp_path / "dataset.manifest.json"
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["merge-manifest", str(manifests[0]), "-o", str(dataset)])
+    assert exit_info.value.code == 1
+    assert "Missing node shards: [1]" in capsys.readouterr().err
+    assert merge_manifests(manifests[:1], dataset, allow_missing=True)["missing_nodes"] == [1]
+
+    with pytest.raises(ValueError, match="Duplicated node shards"):
+        merge_manifests([manifests[0], manifests[0], manifests[1]], dataset)
+
+    manifest = json.loads(manifests[1].read_text(encoding="utf-8"))
+    manifest["rows"] += 1
+    manifests[1].write_text(json.dumps(manifest), encoding="utf-8")
+    with pytest.raises(ValueError, match="Inconsistent manifest"):
+        merge_manifests(manifests, dataset)
@@ -0,0 +1,78 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.mm_data.core.prefetch import list_pages, prefetch
+
+
+def _tracked_load(sizes):
+    """返回 (load, 取出结果时的回调, 状态), 状态中记录已开始读取但尚未取出的字节数峰值"""
+    lock = threading.Lock()
+    state = {"inflight": 0, "peak": 0}
+
+    def load(item: int) -> int:
+        with lock:
+            state["inflight"] += sizes[item]
+            state["peak"] = max(state["peak"], state["inflight"])
+        return item * 2
+
+    def consume(item: int) -> None:
+        with lock:
+            state["inflight"] -= sizes[item]
+
+    return load, consume, state
+
+
+@pytest.mark.parametrize("workers", [0, 1, 4])
+def test_prefetch_keeps_order(workers: int):
+    sizes = [i % 7 + 1 for i in range(50)]
+    assert list(prefetch(range(50), lambda item: item * 2, sizes.__getitem__, workers, max_bytes=10)) == \
+        [(item, item * 2) for item in range(50)]
+
+
+@pytest.mark.parametrize("max_bytes", [1, 10, 25, 1000])
+def test_prefetch_byte_cap(max_bytes: int):
+    sizes = [i % 7 + 1 for i in range(50)]
+    load, consume, state = _tracked_load(sizes)
+    for item, _ in prefetch(range(50), load, sizes.__getitem__, workers=4, max_bytes=max_bytes):
+        consume(item)
+    # 单个超出上限的任务仍会提交
+    assert 0 < state["peak"] <= max(max_bytes, max(sizes))
+    assert state["inflight"] == 0
+
+
+def test_prefetch_consumes_input_lazily():
+    pulled = []
+
+    def items():
+        for item in range(100):
+            pulled.append(item)
+            yield item
+
+    stream = prefetch(items(), lambda item: item, lambda item: 10, workers=2, max_bytes=30)
+    assert next(stream) == (0, 0)
+    # 上限为 3 个任务, 交出第一个结果时至多再取一个输入
+    assert len(pulled) <= 4
+
+
+def _touch(file: Path, data: str) -> None:
+    file.write_text(data, encoding="utf-8")
+
+
+def test_list_pages_sorts_numerically(tmp_path: Path):
+    for page in (10, 2, 1):
+        _touch(tmp_path / f"doc-page-{page}.png", "x" * page)
+        _touch(tmp_path / f"doc-page-{page}.md", "y")
+    _touch(tmp_path / "notes.txt", "ignored")
+
+    assert list_pages(tmp_path) == [(tmp_path / f"doc-page-{page}.png", tmp_path / f"doc-page-{page}.md", page + 1)
+                                    for page in (1, 2, 10)]
+
+
+def test_list_pages_count_mismatch(tmp_path: Path):
+    _touch(tmp_path / "doc-page-1.png", "x")
+    _touch(tmp_path / "doc-page-1.md", "y")
+    _touch(tmp_path / "doc-page-2.png", "x")
+    with pytest.raises(ValueError, match="number of image files"):
+        list_pages(tmp_path)
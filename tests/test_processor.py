@@ -0,0 +1,30 @@
+from functools import partial
+from pathlib import Path
+
+from src.mm_data.core.processor import get_file_md5, get_md5, parallel_map, process_pool
+
+TEXTS = [f"text {i}" for i in range(20)]
+
+
+def test_parallel_map_keeps_input_order():
+    expected = [get_md5(text) for text in TEXTS]
+    assert list(parallel_map(get_md5, iter(TEXTS), 1)) == expected
+    assert list(parallel_map(get_md5, iter(TEXTS), 3, prefetch=2)) == expected
+
+
+def test_parallel_map_with_partial_and_shared_pool(tmp_path: Path):
+    files = []
+    for i in range(5):
+        files.append(tmp_path / f"{i}.bin")
+        files[-1].write_bytes(bytes(range(256)) * (i + 1))
+    expected = [get_file_md5(file) for file in files]
+    with process_pool(2) as executor:
+        assert list(parallel_map(partial(get_file_md5, chunk_size=7), files, 2, executor=executor)) == expected
+        assert list(parallel_map(get_file_md5, files, 2, executor=executor)) == expected
+
+
+def test_pool_does_not_fork():
+    """转换时主进程已有预读线程, worker 不能由 fork 启动"""
+    with process_pool(2) as executor:
+        assert executor._mp_context.get_start_method() != "fork"
+        assert list(parallel_map(get_md5, TEXTS, 2, executor=executor)) == [get_md5(text) for text in TEXTS]
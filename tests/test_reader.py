@@ -0,0 +1,55 @@
+import shutil
+from pathlib import Path
+
+from conftest import DOCS
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+from src.mm_data.core.reader import iter_blocks, shard_files
+from src.mm_data.core.validate import validate_shards
+from src.mm_data.core.writer import ShardWriter
+
+
+def _write_blocks(output_file: Path) -> list:
+    blocks = [mmDataBlock(实体ID=f"doc{i // 3}.pdf", md5="", 块ID=i % 3, 块类型="image-text-pair", 扩展字段=None,
+                          时间="2025-01-01", 文本=f"page {i}", 图片=bytes([i]) * (i + 1))
+              for i in range(9)]
+    with ShardWriter(output_file, split_size=2, row_group_size=4) as writer:
+        for i in range(0, len(blocks), 3):
+            writer.write_batch(blocks[i:i + 3])
+    return blocks
+
+
+def test_to_block_rereads_unprojected_columns(tmp_path: Path):
+    blocks = _write_blocks(tmp_path / "out.parquet")
+
+    for columns in (["文本"], ["块ID", "图片"], None):
+        lazy = list(iter_blocks(tmp_path, columns=columns))
+        assert [block.to_block() for block in lazy] == blocks
+
+
+def test_projection_and_lazy_binary(tmp_path: Path):
+    blocks = _write_blocks(tmp_path / "out.parquet")
+
+    lazy = list(iter_blocks(tmp_path, columns=["实体ID", "图片"], entity_ids=["doc1.pdf"]))
+    assert [block.实体ID for block in lazy] == ["doc1.pdf"] * 3
+    assert "图片" not in lazy[0].__dict__
+    assert [block.图片 for block in lazy] == [block.图片 for block in blocks[3:6]]
+
+
+def test_stale_shards_are_not_read(tmp_path: Path):
+    _write_blocks(tmp_path / "out.parquet")
+    # 之前运行遗留的分片不在合并索引中
+    shutil.copy(tmp_path / "out_0.parquet", tmp_path / "out_7.parquet")
+
+    assert shard_files(tmp_path) == [tmp_path / f"out_{i}.parquet" for i in range(2)]
+    assert shard_files(tmp_path / "out.parquet") == shard_files(tmp_path)
+    assert len(list(iter_blocks(tmp_path, columns=["实体ID"]))) == 9
+
+
+def test_journal_lists_shards(corpus: Path, tmp_path: Path, convert):
+    output_file = tmp_path / "out" / "out.parquet"
+    convert(corpus / "list.txt", output_file, "pdf", "-s", 1)
+    convert(corpus / "list.txt", output_file, "pdf", "-s", 3)
+
+    assert shard_files(output_file.parent) == [output_file.parent / f"out_{i}.parquet" for i in range(2)]
+    report = validate_shards([output_file.parent])
+    assert report["ok"] and (report["files"], report["rows"]) == (2, DOCS)
@@ -0,0 +1,82 @@
+import io
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from conftest import PAGES, read_output
+from src.mm_data.core.file_handlers import get_img_size
+from src.mm_data.core.processor import get_bytes_md5
+from src.mm_data.core.transcode import TranscodeOptions, Transcoder, transcode_row
+
+
+def _png(width: int, height: int, noise: bool = False) -> bytes:
+    image = Image.effect_noise((width, height), 60).convert("RGB") if noise else Image.new("RGB", (width, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _row(image: bytes, width: int, height: int) -> dict:
+    extends = {"page_id": 0, "page_image_size": {"width": width, "height": height}, "page_text_length": 0}
+    return {"实体ID": "page.png", "块ID": 0, "块类型": "image-text-pair", "扩展字段": json.dumps(extends),
+            "图片": image, "文本": "", "md5": get_bytes_md5(image)}
+
+
+@pytest.mark.parametrize("format", ["webp-lossless", "webp", "jpeg"])
+def test_transcode_row_downscales(format: str):
+    image = _png(400, 200, noise=True)
+    row = transcode_row((_row(image, 400, 200), TranscodeOptions(format, max_edge=100)))
+
+    extends = json.loads(row["扩展字段"])
+    assert get_img_size(row["图片"]) == (100, 50)
+    assert extends["page_image_size"] == {"width": 100, "height": 50}
+    assert extends["transcode"] == {"format": format, "original_size": {"width": 400, "height": 200},
+                                    "original_bytes": len(image), "bytes": len(row["图片"]),
+                                    "md5": get_bytes_md5(row["图片"])}
+    # md5 仍为原图哈希, 与去重索引一致
+    assert row["md5"] == get_bytes_md5(image)
+
+
+def test_transcode_row_keeps_smaller_original():
+    image = _png(8, 8)
+    row = transcode_row((_row(image, 8, 8), TranscodeOptions("jpeg", quality=100)))
+    assert row["图片"] == image
+    assert json.loads(row["扩展字段"])["transcode"]["format"] == "original"
+
+
+def test_transcoder_pool_matches_in_process():
+    rows = [_row(_png(64, 48 + i, noise=True), 64, 48 + i) for i in range(6)]
+    options = TranscodeOptions("webp", max_edge=32)
+    with Transcoder(options) as serial, Transcoder(options, workers=2) as pool:
+        # 转换时已有预读线程, 进程池不能由 fork 启动
+        assert pool._executor._mp_context.get_start_method() != "fork"
+        assert list(pool.map_rows(iter(rows))) == list(serial.map_rows(iter(rows)))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_single_file_transcoded_with_any_workers(corpus: Path, tmp_path: Path, convert, workers: int):
+    output_file = tmp_path / "out" / "out.parquet"
+    convert(corpus / "doc1.pdf", output_file, "image-text-pair", "-w", workers, "--transcode", "webp",
+            "--transcode_workers", 2)
+
+    rows = read_output(output_file)
+    assert len(rows) == PAGES
+    transcoded = [json.loads(row["扩展字段"])["transcode"] for row in rows]
+    assert {item["format"] for item in transcoded} <= {"webp", "original"}
+    assert [item["md5"] for item in transcoded] == [get_bytes_md5(row["图片"]) for row in rows]
+
+
+def test_failed_run_rolls_back_dedup(corpus_copy: Path, tmp_path: Path, convert):
+    (corpus_copy / "doc2_docling_output" / "doc2.json").write_text("truncated", encoding="utf-8")
+    index_file = tmp_path / "dedup.sqlite"
+    with pytest.raises(ValueError):
+        convert(corpus_copy / "list.txt", tmp_path / "out" / "out.parquet", "pdf", "-s", 1,
+                "--dedup_index", index_file)
+
+    with sqlite3.connect(index_file) as conn:
+        entities = [row[0] for row in conn.execute("SELECT entity_id FROM content ORDER BY entity_id")]
+    # doc2 已记入索引但其分片未提交
+    assert entities == ["doc0.pdf", "doc1.pdf"]
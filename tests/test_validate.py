@@ -0,0 +1,64 @@
+import io
+import json
+from pathlib import Path
+
+import pyarrow.parquet as parquet
+from PIL import Image
+
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+from src.mm_data.core.processor import get_bytes_md5
+from src.mm_data.core.validate import validate_shards
+from src.mm_data.core.writer import ShardWriter
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _page_block(i: int, image: bytes, width: int = 40, height: int = 30) -> mmDataBlock:
+    text = f"page {i}"
+    extends = {"page_id": i, "page_image_size": {"width": width, "height": height}, "page_text_length": len(text)}
+    return mmDataBlock(实体ID=f"doc-page-{i}.png", md5=get_bytes_md5(image), 块ID=0, 块类型="image-text-pair",
+                       扩展字段=json.dumps(extends), 时间="2025-01-01", 图片=image, 文本=text)
+
+
+def _write(output_file: Path, blocks) -> Path:
+    with ShardWriter(output_file, split_size=10, row_group_size=2, build_index=False) as writer:
+        writer.write_batch(blocks)
+    return output_file.parent / f"{output_file.stem}_0.parquet"
+
+
+def test_valid_shard(tmp_path: Path):
+    _write(tmp_path / "out.parquet", [_page_block(i, _png(40, 30)) for i in range(4)])
+
+    report = validate_shards([tmp_path])
+    assert report["ok"], report["issues"]
+    assert (report["files"], report["row_groups"], report["rows"]) == (1, 2, 4)
+
+
+def test_truncated_image_is_reported(tmp_path: Path):
+    image = _png(40, 30)
+    blocks = [_page_block(0, image), _page_block(1, image[:20]), _page_block(2, image[:4]), _page_block(3, image)]
+    _write(tmp_path / "out.parquet", blocks)
+
+    report = validate_shards([tmp_path])
+    assert report["rows"] == 4
+    assert report["by_check"] == {"image_header": 2}
+    assert sorted(issue["实体ID"] for issue in report["issues"]) == ["doc-page-1.png", "doc-page-2.png"]
+
+
+def test_corrupted_row_group_is_reported(tmp_path: Path):
+    shard_file = _write(tmp_path / "out.parquet", [_page_block(i, _png(40, 30)) for i in range(4)])
+    metadata = parquet.ParquetFile(shard_file).metadata
+    column = metadata.row_group(0).column(0)
+    start = column.dictionary_page_offset or column.data_page_offset
+    with open(shard_file, "r+b") as file:
+        file.seek(start)
+        file.write(b"\xff" * 64)
+
+    report = validate_shards([tmp_path], workers=2)
+    assert report["row_groups"] == 2 and report["rows"] == 4
+    assert report["by_check"] == {"unreadable_row_group": 1}
+    assert report["issues"][0]["row_group"] == 0
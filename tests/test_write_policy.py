@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as parquet
+import pytest
+
+from src.mm_data.core.models.mmdata_block import mmDataBlock
+from src.mm_data.core.write_policy import row_group_bounds, row_nbytes
+from src.mm_data.core.writer import ShardWriter
+
+
+def test_bounds_by_bytes():
+    sizes = np.full(10, 10, dtype=np.int64)
+    # 行组包含使其达到字节上限的那一行
+    assert row_group_bounds(sizes, 100, 25) == [(0, 3), (3, 6), (6, 9)]
+    assert row_group_bounds(sizes, 100, 25, final=True) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+
+
+def test_bounds_by_rows():
+    sizes = np.ones(10, dtype=np.int64)
+    assert row_group_bounds(sizes, 4, 1 << 20) == [(0, 4), (4, 8)]
+    assert row_group_bounds(sizes, 4, 1 << 20, final=True) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_oversized_row_closes_its_row_group():
+    sizes = np.array([1, 100, 1, 1, 200], dtype=np.int64)
+    assert row_group_bounds(sizes, 10, 50, final=True) == [(0, 2), (2, 5)]
+    assert row_group_bounds(np.array([], dtype=np.int64), 10, 50, final=True) == []
+
+
+def _incremental_bounds(chunks, row_group_size: int, row_group_bytes: int):
+    """模拟写入器: 每次追加一批行, 只切出已满的行组, 最后一批时切出剩余部分"""
+    bounds, offset = [], 0
+    pending = np.zeros(0, dtype=np.int64)
+    for i, chunk in enumerate(chunks):
+        pending = np.concatenate([pending, chunk])
+        new = row_group_bounds(pending, row_group_size, row_group_bytes, final=i == len(chunks) - 1)
+        bounds += [(offset + start, offset + end) for start, end in new]
+        consumed = new[-1][1] if new else 0
+        pending, offset = pending[consumed:], offset + consumed
+    return bounds
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bounds_independent_of_batches(seed: int):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 1000, size=500)
+    expected = row_group_bounds(sizes, 32, 4000, final=True)
+    cuts = np.sort(rng.choice(np.arange(1, len(sizes)), size=20, replace=False))
+    assert _incremental_bounds(np.split(sizes, cuts), 32, 4000) == expected
+    assert _incremental_bounds([sizes[i:i + 1] for i in range(len(sizes))], 32, 4000) == expected
+
+
+def test_writer_row_groups_follow_bounds(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    blocks = [mmDataBlock(实体ID=f"page-{i}.png", md5="", 块ID=0, 块类型="image-text-pair", 扩展字段=None,
+                          时间="2025-01-01", 图片=rng.bytes(int(size)))
+              for i, size in enumerate(rng.integers(100, 3000, size=60))]
+    output_file = tmp_path / "out.parquet"
+    with ShardWriter(output_file, split_size=100, row_group_size=8, row_group_bytes=5000) as writer:
+        for start, end in [(0, 1), (1, 20), (20, 23), (23, 60)]:
+            writer.write_batch(blocks[start:end])
+
+    source = parquet.ParquetFile(tmp_path / "out_0.parquet")
+    bounds = row_group_bounds(row_nbytes(source.read()), 8, 5000, final=True)
+    assert [source.metadata.row_group(i).num_rows for i in range(source.num_row_groups)] == \
+        [end - start for start, end in bounds]
+    assert len(bounds) > 60 // 8 + 1